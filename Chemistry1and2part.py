@@ -1,96 +1,86 @@
-import pymupdf
-import pandas as pd
+import pdf_pages
 import re
+import functools
+
+import answer_keys
+import cleanup
+import figures
+import keywords
+import layout
+import metrics
+import question_ids
+import questions
+import stages
+import tokenizer
 
 
 # ---------------------
+SUBJECT = "Chem"  # answer keys and question ids are kept per subject
 PDF_FILE = "egzai/Chem/2017.pdf"
 ANSWER_FILE = "egzai/Chem/2017_ats.pdf"
 OUTPUT_EXCEL = "surinkti/Chem/2017.xlsx"
 REMOVE = "171CHVU0"
+PARSER = "text"  # "layout" reads Part I from word positions instead of the flattened text
 LASTPAGE = 10
-questionNum = 1658
+TITLE = "2017 M. CHEMIJOS VALSTYBINIO BRANDOS EGZAMINO UŽDUOTIS "
+questionNum = 1658  # lowest id to hand out; ids come from question_ids.py and stay the same on re-runs
+CROP_FIGURES = True  # cut the figures of image questions out of the PDF into figures.FIGURE_DIR
 # ---------------------
 
+IMAGE_URL = "https://exvpdduqmfmvkvpmbpvp.supabase.co/storage/v1/object/public/task-pictures//"
+
+# Excel columns, in order
+FIELDS = ("number", "category", "question", "correct", "wrong1", "wrong2", "wrong3", "fa_check", "image", "temp_num")
+
 
 image_keywords = [
     "žr. pav", "pav.", "paveiksl", "Paveiksl", "lentel", "pavaizduot", "eiga", "piktogram",
     "Grafik", "grafik", "tašką", "šaltinis", "schema", "nuotraukoje", "lentelėje", "Schemoje", "schemoje", "diagrama", "pažymėta"
 ]
+image_matcher = keywords.KeywordMatcher({"image": [keyword.lower() for keyword in image_keywords]})
 
 
 def clean_answer(text):
     return re.sub(r'[.;]', '', text)
 
-def remove_header_footer_noise(text):
-    # Remove blocks starting with a line like: 1 word – word – word
-    text = re.sub(
-        r"""
-        ^\d+\s+[^\n–]+(?:\s+–\s+[^\n–]+)+   # first line like "1 stiebagumbis – bulwocebula – ..."
-        (?:\n[^\n]*){1,2}                   # up to 2 lines that follow (junk)
-        """,
-        "",
-        text,
-        flags=re.MULTILINE | re.VERBOSE
-    )
-
-    text = re.sub(r"^[A-ZĄČĘĖĮŠŲŪŽ\s]{10,}$", "", text, flags=re.MULTILINE)
-
-    text = re.sub(r"^[A-Z0-9]{6,}$", "", text, flags=re.MULTILINE)
-    text = re.sub(r"^\d{1,3}$", "", text, flags=re.MULTILINE)
-
-    text = re.sub(r'^\s*\d{1,3}\s*$', '', text, flags=re.MULTILINE)
-
-    text = text.replace(REMOVE, '')
-    text = text.replace("Juodraštis", '')
-    text = text.replace("2017 M. CHEMIJOS VALSTYBINIO BRANDOS EGZAMINO UŽDUOTIS ", '')
-    text = text.replace('Ats.:', '')
-    text = text.replace('      ml', '')
-    text = text.replace('      %', '')
-    # text = text.replace("B",'')
-    text = text.replace("*", '')
-    # Remove excess blank lines
-    text = re.sub(r'\n\s*\n+', '\n\n', text)
-
-    text = re.sub(r'(?<=[a-zA-Z])(\d+)(?!\.)', '', text)
-
-
-    return text.strip()
-
-
-
-
-
-def get_mcq_answers(pdf_path):
-    doc = pymupdf.open(pdf_path)
-    first_page_text = doc[0].get_text()
-
-    part1_answer, part2_answer = first_page_text, ""
-    split_match_answer = re.search(r"\bII DALIS\b", first_page_text, flags=re.IGNORECASE)
-    if split_match_answer:
-        part1_answer = first_page_text[:split_match_answer.start()]
-        part2_answer = first_page_text[split_match_answer.start():]
-    else:
-        print("⚠️ Could not find 'II dalis'. Using full text as Part I.")
-
-
-    with open("outputAnswer.txt", "w", encoding="utf-8") as f:
-        f.write(first_page_text)
-
-    # Find all standalone capital letters A–D (answer choices)
-    answers = re.findall(r"\b([ABCD])\b", part1_answer)
-    mcq_answers = {str(i + 1).zfill(2): answers[i] for i in range(min(30, len(answers)))}
-
-    part2_answer = part2_answer.replace('1 Vertinami ir kiti teisingi atsakymai, nenurodyti vertinimo instrukcijoje. ', '')
-
-    part2_blocks = re.split(r"\n(?=\d{1,2}\s)", part2_answer)
-    part2_answers = {}
-    for block in part2_blocks:
-        match = re.match(r"(?P<num>\d{1,2})\s+(?P<answer>.+)", block.strip(), flags=re.DOTALL)
-        if match:
-            num = match.group("num").zfill(2)
-            answer = re.sub(r'\s+', ' ', match.group("answer").strip())
-            part2_answers[num] = answer
+@functools.lru_cache(maxsize=None)
+def noise_rules(remove=REMOVE, title=TITLE):
+    return cleanup.CleanupRules([
+        # Remove blocks starting with a line like: 1 word – word – word
+        cleanup.rule("glossary block", r"""
+            ^\d+\s+[^\n–]+(?:\s+–\s+[^\n–]+)+   # first line like "1 stiebagumbis – bulwocebula – ..."
+            (?:\n[^\n]*){1,2}                   # up to 2 lines that follow (junk)
+            """, "", re.MULTILINE | re.VERBOSE),
+        cleanup.rule("uppercase line", r"^[A-ZĄČĘĖĮŠŲŪŽ\s]{10,}$", "", re.MULTILINE),
+        cleanup.rule("code line", r"^[A-Z0-9]{6,}$", "", re.MULTILINE),
+        cleanup.rule("number line", r"^\d{1,3}$", "", re.MULTILINE),
+        cleanup.rule("padded number line", r"^\s*\d{1,3}\s*$", "", re.MULTILINE),
+        cleanup.literal("exam code", remove),
+        cleanup.literal("Juodraštis", "Juodraštis"),
+        cleanup.literal("title", title),
+        cleanup.literal("Ats.:", "Ats.:"),
+        cleanup.literal("ml blank", "      ml"),
+        cleanup.literal("% blank", "      %"),
+        # cleanup.literal("B symbol", "B"),
+        cleanup.literal("*", "*"),
+        # Remove excess blank lines
+        cleanup.rule("blank lines", r"\n\s*\n+", "\n\n"),
+        cleanup.rule("reference digits", r"(?<=[a-zA-Z])(\d+)(?!\.)"),
+    ])
+
+
+def remove_header_footer_noise(text, remove=REMOVE, title=TITLE):
+    return noise_rules(remove, title).apply(text).strip()
+
+
+
+
+
+# Answers come from the answer-key index; the PDF is only parsed the first time it is seen
+def get_mcq_answers(pdf_path, dump_file="outputAnswer.txt", subject=SUBJECT, year=None):
+    mcq_answers, part2_answers = answer_keys.lookup(pdf_path, subject, year)
+    if dump_file:
+        answer_keys.dump(mcq_answers, part2_answers, dump_file)
 
     print(f" Found {len(mcq_answers)} MCQ answers and {len(part2_answers)} open-ended answers.")
     return mcq_answers, part2_answers
@@ -130,14 +120,7 @@ def extract_open_questions_from_part_ii(text):
             num = "10"
         qtext = re.sub(r'\s+', ' ', match_local.group("question")).strip()
 
-        open_questions.append({
-            "Question No.": num,
-            "Category": "",
-            "Question": qtext,
-            "fa_check": "TRUE",
-            "image": "",
-            "tempNum": num
-        })
+        open_questions.append(questions.Question(question=qtext, fa_check="TRUE", temp_num=num))
 
     return open_questions
 
@@ -147,132 +130,190 @@ def extract_open_questions_from_part_ii(text):
 
 
 
-def extract_clean_text_from_pdf(pdf_path, start_page=2, end_page=LASTPAGE):
-    doc = pymupdf.open(pdf_path)
-    text = "\n".join(doc[i].get_text() for i in range(start_page - 1, end_page))
+PAGE_RULES = cleanup.CleanupRules([
     # Remove common headers/footers
-    text = re.sub(
-        r"RIBOTO NAUDOJIMO.*?\)\s*|CHEMIJA\s+●.*?sesija|NEPAMIRŠKITE.*?LAPĄ",
-        "", text, flags=re.IGNORECASE | re.DOTALL
-    )
+    cleanup.rule("page header/footer", r"RIBOTO NAUDOJIMO.*?\)\s*|CHEMIJA\s+●.*?sesija|NEPAMIRŠKITE.*?LAPĄ", "",
+                 re.IGNORECASE | re.DOTALL),
     # Normalize multiple blank lines
-    text = re.sub(r'\n\s*\n+', '\n\n', text)
-    return text
+    cleanup.rule("blank lines", r"\n\s*\n+", "\n\n"),
+])
+
+
+def extract_clean_text_from_pdf(pdf_path, start_page=2, end_page=LASTPAGE):
+    end_page = min(end_page, pdf_pages.page_count(pdf_path))
+    text = "\n".join(pdf_pages.page_texts(pdf_path, range(start_page - 1, end_page)))
+    return PAGE_RULES.apply(text)
+
+
+def image_url(num, suffix):
+    return IMAGE_URL + str(num) + "-" + str(suffix) + ".png"
+
+
+# Part I as (number, question text, [(letter, option text), ...]) from the flattened, cleaned text
+def text_blocks(part1_text):
+    return tokenizer.question_blocks(part1_text)
+
+
+# Extract + clean: the exam pages as one cleaned text
+@stages.stage(files=("pdf_file",), outputs=("dump_file",))
+def exam_text(pdf_file, remove=REMOVE, title=TITLE, last_page=LASTPAGE, dump_file="output.txt"):
+    raw_text = extract_clean_text_from_pdf(pdf_file, end_page=last_page)
+    raw_text = remove_header_footer_noise(raw_text, remove, title)
+    if dump_file:
+        with open(dump_file, "w", encoding="utf-8") as f:
+            f.write(raw_text)
+    return raw_text
+
+
+# Split + parse: Part I as a list of (number, question text, [(letter, option text), ...])
+@stages.stage(files=("pdf_file",))
+def part1_blocks(pdf_file, part1_text, parser=PARSER, remove=REMOVE, title=TITLE, last_page=LASTPAGE):
+    with metrics.timer("split", parser=parser):
+        if parser == "layout":
+            def clean(text):
+                return remove_header_footer_noise(PAGE_RULES.apply(text), remove, title)
+
+            return list(layout.mcq_blocks(pdf_file, 2, last_page, clean))
+        return list(text_blocks(part1_text))
+
+
+# Answer-join: question records for the parsed blocks, with the correct option from the key
+@stages.stage
+def mcq_rows(blocks, mcq_answers):
+    data = []
+    questionsWithImages = []
+    for qnum, question_text, options in blocks:
+
+        if image_matcher.find(question_text.lower()):
+            questionsWithImages.append(qnum)
+
+        if len(options) < 4:
+            print(f" Skipping question {qnum} — not enough options found ({len(options)}).")
+            # Question No. and the option image links are filled in by number_questions
+            data.append(questions.Question(
+                question=question_text,
+                correct=mcq_answers.get(qnum, ""),
+                wrong1=None,
+                wrong2=None,
+                wrong3=None,
+                temp_num=qnum,
+            ))
+            continue
+
+        options_dict = {letter: text.strip() for letter, text in options}
+        correct_letter = mcq_answers.get(qnum, "")
+        correct_answer = options_dict.get(correct_letter, "")
+        wrong_answers = [ans for key, ans in options_dict.items() if key != correct_letter]
+        correct_answer = correct_answer.replace(';', '')
+        correct_answer = clean_answer(correct_answer)
+        wrong_answers = [clean_answer(ans) for ans in wrong_answers]
+        question_text = re.sub(r'\s+', ' ', question_text).strip()
+        correct_answer = re.sub(r'\s+', ' ', correct_answer).strip()
+        wrong_answers = [re.sub(r'\s+', ' ', ans).strip() for ans in wrong_answers]
+        # Extract options
+        data.append(questions.Question(
+            question=question_text,
+            correct=correct_answer,
+            wrong1=wrong_answers[0],
+            wrong2=wrong_answers[1],
+            wrong3=wrong_answers[2],
+            temp_num=qnum,
+        ))
+
+    return data, questionsWithImages
+
+
+def extract_exam(pdf_file, answer_file, remove=REMOVE, title=TITLE, last_page=LASTPAGE,
+                 dump_file="output.txt", answer_dump_file="outputAnswer.txt", parser=PARSER, subject=SUBJECT, year=None):
+    print(" Reading exam content from PDF...")
+    raw_text = exam_text(pdf_file, remove, title, last_page, dump_file)
+
+    print("getting answers...")
+    mcq_answers, open_answers = get_mcq_answers(answer_file, answer_dump_file, subject, year)
+
+    print(" Parsing questions...")
+    part1_text, part2_text = raw_text, ""
+    split_match = re.search(r"\bII dalis\b", raw_text, flags=re.IGNORECASE)
+    if split_match:
+        part1_text = raw_text[:split_match.start()]
+        part2_text = raw_text[split_match.start():]
+    else:
+        print(" Could not find 'II dalis'. Using full text as Part I.")
+
+    blocks = part1_blocks(pdf_file, part1_text, parser, remove, title, last_page)
+    data, questionsWithImages = mcq_rows(blocks, mcq_answers)
+
+    print(" Extracting open-ended questions from Part II...")
+    open_questions = extract_open_questions_from_part_ii(raw_text)
+
+    for q in open_questions:
+        q.correct = open_answers.get(q.temp_num.zfill(2), "")
+
+    return data + open_questions, questionsWithImages
+
+
+# Gives every question its global id (by subject, year and tempNum, so a re-run gets the same ones)
+# and names the option images after it
+def number_questions(rows, subject, year, floor=questionNum):
+    keys = question_ids.row_keys(rows)
+    ids = question_ids.assign(subject, year, keys, floor)
+    for row, key in zip(rows, keys):
+        if row.wrong1 is None:
+            row.wrong1 = image_url(ids[key], 2)
+            row.wrong2 = image_url(ids[key], 3)
+            row.wrong3 = image_url(ids[key], 4)
+        row.number = ids[key]
+
+
+# What figures.crop should cut out: the figure of each image question, and for questions whose
+# options are pictures one image per option, named like number_questions links them
+# ({id}-1.png for the correct option, -2 to -4 for the wrong ones)
+def figure_requests(rows, questions_with_images, pdf_file, last_page=LASTPAGE):
+    flagged = set(questions_with_images)
+    requests = []
+    for row in rows:
+        if row.fa_check == "TRUE":
+            continue  # Part II numbers start again at 1
+        options = {}
+        if str(row.wrong1).startswith(IMAGE_URL):
+            wrong = [letter for letter in "ABCD" if letter != row.correct]
+            options = {row.correct: 1, **{letter: n for n, letter in enumerate(wrong[:3], 2)}}
+        if row.temp_num in flagged or options:
+            requests.append(figures.Request(pdf_file, 2, last_page, row.temp_num, row.number, row.temp_num in flagged, options))
+    return requests
+
+
+# Links each cropped question figure in the image column; returns the image questions left without one
+def link_figures(rows, questions_with_images, written):
+    missing = []
+    for row in rows:
+        if f"{row.number}.png" in written.get(row.number, ()):
+            row.image = IMAGE_URL + f"{row.number}.png"
+        elif row.temp_num in questions_with_images and row.fa_check != "TRUE":
+            missing.append(row.temp_num)
+    return missing
+
+
+@stages.stage(outputs=("output_excel",))
+def save_questions(rows, output_excel):
+    # === Export to Excel ===
+    print(f" Saving {len(rows)} questions to Excel...")
+    questions.save(rows, FIELDS, output_excel, pad_numbers=True)
+    print(f" Done! File saved to: {output_excel}")
 
 
 # === Main workflow ===
-print(" Reading exam content from PDF...")
-raw_text = extract_clean_text_from_pdf(PDF_FILE)
-raw_text = remove_header_footer_noise(raw_text)
-with open("output.txt", "w", encoding="utf-8") as f:
-    f.write(raw_text)
-
-
-print("getting answers...")
-mcq_answers, open_answers = get_mcq_answers(ANSWER_FILE)
-
-print(" Parsing questions...")
-part1_text, part2_text = raw_text, ""
-split_match = re.search(r"\bII dalis\b", raw_text, flags=re.IGNORECASE)
-if split_match:
-    part1_text = raw_text[:split_match.start()]
-    part2_text = raw_text[split_match.start():]
-else:
-    print(" Could not find 'II dalis'. Using full text as Part I.")
-
-question_blocks = re.split(r"(?=\d{2}\.\s)", part1_text)
-
-data = []
-questionsWithImages = []
-for block in question_blocks:
-    block = block.strip()
-    # print('\n')
-    # print(block)
-    # print('\n')
-    if not block:
-        continue
-    match = re.match(r"(?P<num>\d{2})\.\s(?P<question>.+?)(?=(\nA\s|$))", block, flags=re.DOTALL)
-    if not match:
-        continue
-
-    q = match.groupdict()
-    qnum = q["num"]
-    question_text = re.sub(r"\s+", " ", q["question"].strip())
-
-
-    options = re.findall(r"(?:^|\n)([A-D])\s+(.*?)(?=(?:\n[A-D]\s|$))", block, flags=re.DOTALL)
-
-    if any(keyword.lower() in question_text.lower() for keyword in image_keywords):
-        questionsWithImages.append(qnum)
-
-    if len(options) < 4:
-        print(f" Skipping question {qnum} — not enough options found ({len(options)}).")
-        data.append({
-            "Question No.": questionNum,
-            "Category": "",
-            "Question": question_text,
-            "Correct Answer": mcq_answers.get(qnum, ""),
-            "Wrong Option 1": "https://exvpdduqmfmvkvpmbpvp.supabase.co/storage/v1/object/public/task-pictures//" + str(questionNum) + "-2.png",
-            "Wrong Option 2": "https://exvpdduqmfmvkvpmbpvp.supabase.co/storage/v1/object/public/task-pictures//" + str(questionNum) + "-3.png",
-            "Wrong Option 3": "https://exvpdduqmfmvkvpmbpvp.supabase.co/storage/v1/object/public/task-pictures//" + str(questionNum) + "-4.png",
-            "fa_check": "FALSE",
-            "image": "",
-            "tempNum": qnum
-        })
-        questionNum += 1
-        continue
-
-    options_dict = {letter: text.strip() for letter, text in options}
-    correct_letter = mcq_answers.get(qnum, "")
-    correct_answer = options_dict.get(correct_letter, "")
-    wrong_answers = [ans for key, ans in options_dict.items() if key != correct_letter]
-    correct_answer = correct_answer.replace(';', '')
-    correct_answer = clean_answer(correct_answer)
-    wrong_answers = [clean_answer(ans) for ans in wrong_answers]
-    question_text = re.sub(r'\s+', ' ', question_text).strip()
-    correct_answer = re.sub(r'\s+', ' ', correct_answer).strip()
-    wrong_answers = [re.sub(r'\s+', ' ', ans).strip() for ans in wrong_answers]
-    # Extract options
-    data.append({
-        "Question No.": questionNum,
-        "Category": "",
-        "Question": question_text,
-        "Correct Answer": correct_answer,
-        "Wrong Option 1": wrong_answers[0],
-        "Wrong Option 2": wrong_answers[1],
-        "Wrong Option 3": wrong_answers[2],
-        "fa_check": "FALSE",
-        "image": "",
-        "tempNum": qnum
-    })
-    questionNum += 1
-
-
-print(" Extracting open-ended questions from Part II...")
-open_questions = extract_open_questions_from_part_ii(raw_text)
-
-
-
-
-
-for q in open_questions:
-    qnum = q["Question No."].zfill(2)
-    q["Correct Answer"] = open_answers.get(qnum, "")
-    q["Wrong Option 1"] = ""
-    q["Wrong Option 2"] = ""
-    q["Wrong Option 3"] = ""
-    q["Question No."] = questionNum
-    questionNum += 1
-
-# === Combine with MCQs
-mcq_df = pd.DataFrame(data)
-open_df = pd.DataFrame(open_questions)
-combined_df = pd.concat([mcq_df, open_df], ignore_index=True)
-combined_df["Question No."] = combined_df["Question No."].astype(str).str.zfill(2)
-
-# === Export to Excel ===
-print(f" Saving {len(combined_df)} questions to Excel...")
-df = pd.DataFrame(combined_df)
-df.to_excel(OUTPUT_EXCEL, index=False)
-print(f" Done! File saved to: {OUTPUT_EXCEL}")
-print(f" Questions with images: {questionsWithImages}")
\ No newline at end of file
+if __name__ == "__main__":
+    rows, questionsWithImages = extract_exam(PDF_FILE, ANSWER_FILE)
+    number_questions(rows, SUBJECT, answer_keys.exam_year(PDF_FILE))
+    if CROP_FIGURES:
+        written = figures.crop(figure_requests(rows, questionsWithImages, PDF_FILE))
+        missing = link_figures(rows, questionsWithImages, written)
+        print(f" Cropped {sum(map(len, written.values()))} figures to {figures.FIGURE_DIR}; no figure found for {missing}")
+    save_questions(rows, OUTPUT_EXCEL)
+    print(f" Questions with images: {questionsWithImages}")
+    print(" Cleanup rule hits:")
+    PAGE_RULES.report()
+    noise_rules(REMOVE, TITLE).report()
+    print(" Stage cache:")
+    stages.report()
@@ -0,0 +1,242 @@
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import threading
+
+import layout
+import pdf_pages
+import stages
+
+# ---------------------
+INDEX_FILE = ".cache/answers.sqlite"
+MCQ_COUNT = 30           # Part I questions per exam
+COLUMN_TOLERANCE = 15.0  # points between a table's question number and the answer letter under it
+MAX_GAPS = 2             # Part I questions a layout key may lack (cancelled ones) and still be trusted
+# ---------------------
+
+# Every *_ats.pdf is parsed once into a sqlite index keyed by (subject, year, part, question),
+# with how many answers each part gave. Extractors look their key up here; the PDF is only read
+# again when the file changes (checked by size and mtime, then content hash).
+#
+# Part I comes from word positions on the first page: a number followed by a letter on the same
+# row ("1 C"), or a row of numbers with the row of letters under it (the usual NEC table). Part II
+# is read from the page text: each line starting with a question number begins an answer.
+
+PART_II = re.compile(r"\bII DALIS\b", re.IGNORECASE)
+LETTERS = frozenset("ABCD")
+PART_II_NOISE = {"Chem": ["1 Vertinami ir kiti teisingi atsakymai, nenurodyti vertinimo instrukcijoje. "]}
+
+_connection = None
+_lock = threading.Lock()
+
+
+def _db():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(INDEX_FILE) or ".", exist_ok=True)
+        _connection = sqlite3.connect(INDEX_FILE, timeout=30, check_same_thread=False)
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, subject TEXT NOT NULL, year TEXT NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " size INTEGER NOT NULL, sha256 TEXT NOT NULL, mcq_found INTEGER NOT NULL, open_found INTEGER NOT NULL,"
+            " missing TEXT NOT NULL, method TEXT NOT NULL)"
+        )
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " subject TEXT NOT NULL, year TEXT NOT NULL, part INTEGER NOT NULL, question TEXT NOT NULL,"
+            " answer TEXT NOT NULL, PRIMARY KEY (subject, year, part, question))"
+        )
+        _connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # Answers parsed by older parsing code are dropped, so every key is parsed again on its next lookup
+        parser = stages.fingerprint(parse)
+        stored = _connection.execute("SELECT value FROM meta WHERE key = 'parser'").fetchone()
+        if stored != (parser,):
+            _connection.execute("DELETE FROM files")
+            _connection.execute("DELETE FROM answers")
+            _connection.execute("INSERT OR REPLACE INTO meta VALUES ('parser', ?)", (parser,))
+        _connection.commit()
+    return _connection
+
+
+# <year>_ats.pdf -> year
+def exam_year(pdf_path):
+    match = re.search(r"\d{4}", os.path.basename(pdf_path))
+    return match.group() if match else os.path.splitext(os.path.basename(pdf_path))[0]
+
+
+def _question_number(word):
+    token = word.rstrip(".)")
+    return token.zfill(2) if token.isdecimal() and 1 <= int(token) <= 99 else None
+
+
+def part1_answers(rows):
+    answers = {}
+    header = []  # (x centre, number) of the last row that held only numbers
+    for row in rows:
+        numbers = []
+        letters = []
+        pending = None
+        for x0, _, x1, _, word in row:
+            number = _question_number(word)
+            if number:
+                numbers.append(((x0 + x1) / 2, number))
+                pending = number
+            elif word in LETTERS:
+                letters.append(((x0 + x1) / 2, word))
+                if pending:
+                    answers.setdefault(pending, word)  # "1 C" on one row
+                    pending = None
+        if numbers and not letters:
+            header = numbers
+        elif letters and not numbers and header:
+            for x, letter in letters:
+                distance, number = min((abs(x - column), number) for column, number in header)
+                if distance <= COLUMN_TOLERANCE:
+                    answers.setdefault(number, letter)
+    return dict(sorted(answers.items()))
+
+
+# What the extractors used to do: the n-th standalone capital A-D is the answer to question n
+def _positional_answers(part1_text):
+    letters = re.findall(r"\b([ABCD])\b", part1_text)
+    return {str(i + 1).zfill(2): letters[i] for i in range(min(MCQ_COUNT, len(letters)))}
+
+
+def part2_answers(part2_text, subject):
+    for noise in PART_II_NOISE.get(subject, ()):
+        part2_text = part2_text.replace(noise, "")
+    answers = {}
+    for block in re.split(r"\n(?=\d{1,2}\s)", part2_text):
+        match = re.match(r"(?P<num>\d{1,2})\s+(?P<answer>.+)", block.strip(), flags=re.DOTALL)
+        if match:
+            answers[match.group("num").zfill(2)] = re.sub(r"\s+", " ", match.group("answer").strip())
+    return answers
+
+
+# Parses one answer PDF: ({question: letter}, {question: answer text}, method)
+def parse(pdf_path, subject):
+    text = pdf_pages.page_text(pdf_path, 0)
+    split_match = PART_II.search(text)
+    part1_text, part2_text = (text[:split_match.start()], text[split_match.start():]) if split_match else (text, "")
+
+    part1_rows = []
+    for row in layout.rows(pdf_path, [0]):
+        if PART_II.search(" ".join(word[4] for word in row)):
+            break
+        part1_rows.append(row)
+    mcq, method = choose_part1(part1_answers(part1_rows), _positional_answers(part1_text), os.path.basename(pdf_path))
+    return mcq, part2_answers(part2_text, subject), method
+
+
+# Layout pairing is trusted unless it is clearly broken: nothing found, numbers past MCQ_COUNT, or
+# more holes than cancelled questions explain. Positional letters shift after any cancelled
+# question, so they only step in then; disagreements are reported, never silently resolved.
+def choose_part1(layout_answers, text_answers, source):
+    numbers = [str(n).zfill(2) for n in range(1, MCQ_COUNT + 1)]
+    holes = sum(1 for number in numbers if number not in layout_answers)
+    broken = not layout_answers or holes > MAX_GAPS or any(number not in numbers for number in layout_answers)
+    chosen, method = (text_answers, "text") if broken and text_answers else (layout_answers, "layout")
+    differ = [number for number in numbers if layout_answers.get(number) != text_answers.get(number)]
+    if differ:
+        print(f" ⚠️ {source}: layout and text answers differ on {','.join(differ)}; using {method}")
+    return chosen, method
+
+
+def _store(db, path, stat, digest, subject, year, mcq, open_answers, method):
+    missing = [str(n).zfill(2) for n in range(1, MCQ_COUNT + 1) if str(n).zfill(2) not in mcq]
+    db.execute("DELETE FROM answers WHERE subject = ? AND year = ?", (subject, year))
+    db.executemany("INSERT INTO answers VALUES (?, ?, ?, ?, ?)",
+                   [(subject, year, 1, q, a) for q, a in mcq.items()] +
+                   [(subject, year, 2, q, a) for q, a in open_answers.items()])
+    db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+               (path, subject, year, stat.st_mtime_ns, stat.st_size, digest, len(mcq), len(open_answers),
+                ",".join(missing), method))
+
+
+# Makes sure the index holds this answer PDF; returns (subject, year, parsed now?). The subject
+# always comes from the caller: answer PDFs of different subjects can share a folder and a year.
+def index(pdf_path, subject, year=None, rebuild=False):
+    year = year or exam_year(pdf_path)
+    path = os.path.abspath(pdf_path)
+    stat = os.stat(pdf_path)
+    with _lock:
+        db = _db()
+        row = db.execute("SELECT subject, year, mtime_ns, size, sha256 FROM files WHERE path = ?", (path,)).fetchone()
+        if not rebuild and row and row[:4] == (subject, year, stat.st_mtime_ns, stat.st_size):
+            return subject, year, False
+        digest = pdf_pages.file_hash(pdf_path)
+        if not rebuild and row and row[:2] == (subject, year) and row[4] == digest:
+            db.execute("UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?", (stat.st_mtime_ns, stat.st_size, path))
+            db.commit()
+            return subject, year, False
+
+    mcq, open_answers, method = parse(pdf_path, subject)
+    with _lock:
+        db = _db()
+        _store(db, path, stat, digest, subject, year, mcq, open_answers, method)
+        db.commit()
+    return subject, year, True
+
+
+def validation(subject, year):
+    with _lock:
+        return _db().execute("SELECT mcq_found, open_found, missing, method FROM files WHERE subject = ? AND year = ?",
+                             (subject, year)).fetchone()
+
+
+# ({question: letter}, {question: answer text}) for an answer PDF, parsed only if not indexed yet
+def lookup(pdf_path, subject, year=None):
+    subject, year, _ = index(pdf_path, subject, year)
+    with _lock:
+        rows = _db().execute("SELECT part, question, answer FROM answers WHERE subject = ? AND year = ? ORDER BY part, question",
+                             (subject, year)).fetchall()
+    parts = {1: {}, 2: {}}
+    for part, question, answer in rows:
+        parts[part][question] = answer
+    return parts[1], parts[2]
+
+
+def dump(mcq, open_answers, dump_file):
+    with open(dump_file, "w", encoding="utf-8") as f:
+        f.write("I DALIS\n")
+        f.writelines(f"{q} {a}\n" for q, a in mcq.items())
+        f.write("II DALIS\n")
+        f.writelines(f"{q} {a}\n" for q, a in open_answers.items())
+
+
+def report(subject, year):
+    mcq_found, open_found, missing, method = validation(subject, year)
+    mark = "✅" if mcq_found == MCQ_COUNT else "⚠️"
+    line = f" {mark} {subject} {year}: {mcq_found}/{MCQ_COUNT} MCQ ({method}), {open_found} open-ended"
+    print(line + (f", missing {missing}" if missing else ""))
+
+
+# Indexes every (subject, year, answer_file); only new or changed PDFs are parsed
+def build(answer_files, rebuild=False, verbose=True):
+    parsed = 0
+    for subject, year, answer_file in answer_files:
+        parsed += index(answer_file, subject, year, rebuild)[2]
+        if verbose:
+            report(subject, year)
+    print(f" Answer keys: {parsed} parsed, {len(answer_files) - parsed} from {INDEX_FILE}")
+    return parsed
+
+
+def find_answer_files(exam_dir, subjects=None):
+    files = []
+    for pdf_file in sorted(glob.glob(os.path.join(exam_dir, "*", "*_ats.pdf"))):
+        subject = os.path.basename(os.path.dirname(pdf_file))
+        if not subjects or subject in subjects:
+            files.append((subject, exam_year(pdf_file), pdf_file))
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index every egzai/<subject>/<year>_ats.pdf answer key")
+    parser.add_argument("--exam-dir", default="egzai")
+    parser.add_argument("--subjects", nargs="*")
+    parser.add_argument("--rebuild", action="store_true", help="parse every answer PDF again")
+    args = parser.parse_args()
+    build(find_answer_files(args.exam_dir, args.subjects), args.rebuild)
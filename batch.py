@@ -0,0 +1,248 @@
+import argparse
+import glob
+import importlib
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import answer_keys
+import checkpoints
+import dedup
+import figures
+import metrics
+import pdf_pages
+import question_ids
+import questions
+import stages
+
+# ---------------------
+EXAM_DIR = "egzai"
+OUTPUT_DIR = "surinkti"
+MERGED_EXCEL = "surinkti/visi.xlsx"  # .csv / .jsonl / .parquet also work
+FORMAT = "xlsx"  # per-exam output files
+START_NUM = 1658  # lowest question id to hand out (see question_ids.py)
+DEDUP = True  # mark repeated questions in the merged file's "Duplicate Of" column
+FIGURES = True  # crop the figures of image questions into figures.FIGURE_DIR
+WORKERS = os.cpu_count()
+# ---------------------
+
+# egzai/<subject>/ folder -> extractor script and the per-year strings it used to have hand-edited
+SUBJECTS = {
+    "Chem": {"module": "Chemistry1and2part", "code": "CH", "title": "CHEMIJOS", "last_page": 10},
+    "Bio": {"module": "biology1and2part", "code": "BI", "title": "BIOLOGIJOS", "last_page": 8},
+    "Fiz": {"module": "physics1part"},
+}
+
+
+# The merged file is only rewritten when some exam's questions (or the file itself) changed
+save_merged = stages.stage(outputs=("output_file",))(questions.save)
+
+
+def find_exams(exam_dir=EXAM_DIR, subjects=None, years=None):
+    exams = []
+    for pdf_file in sorted(glob.glob(os.path.join(exam_dir, "*", "*.pdf"))):
+        subject = os.path.basename(os.path.dirname(pdf_file))
+        match = re.fullmatch(r"(\d{4})\.pdf", os.path.basename(pdf_file))
+        if not match or subject not in SUBJECTS:
+            continue
+        if subjects and subject not in subjects:
+            continue
+        year = match.group(1)
+        if years and year not in years:
+            continue
+
+        answer_file = os.path.join(os.path.dirname(pdf_file), f"{year}_ats.pdf")
+        if not os.path.exists(answer_file):
+            print(f"⚠️ No answer key for {pdf_file}, skipping.")
+            continue
+        exams.append((subject, year, pdf_file, answer_file))
+    return exams
+
+
+def exam_options(subject, year, output_dir=OUTPUT_DIR, parser=None):
+    config = SUBJECTS[subject]
+    prefix = os.path.join(output_dir, subject, year)
+    if config["module"] == "physics1part":
+        return {"dump_file": prefix + "_output.txt", "subject": subject, "year": year}
+    options = {
+        "remove": f"{year[2:]}1{config['code']}VU0",
+        "title": f"{year} M. {config['title']} VALSTYBINIO BRANDOS EGZAMINO UŽDUOTIS ",
+        "last_page": config["last_page"],
+        "dump_file": prefix + "_output.txt",
+        "answer_dump_file": prefix + "_outputAnswer.txt",
+        "subject": subject,
+        "year": year,
+    }
+    if parser:
+        options["parser"] = parser
+    return options
+
+
+# Runs in a worker process: one exam per call, its pages spread over page_workers more processes.
+# Question ids come from the shared id store, so workers can number their exams at the same time.
+# With metrics on, the exam's timers and counters come back with its rows (labelled
+# exam="<subject> <year>") and are added up in the main process.
+def run_exam(subject, year, pdf_file, answer_file, output_dir=OUTPUT_DIR, parser=None, start_num=START_NUM,
+             page_workers=None):
+    if page_workers:
+        pdf_pages.WORKERS = page_workers
+    module = importlib.import_module(SUBJECTS[subject]["module"])
+    try:
+        with metrics.context(exam=f"{subject} {year}"), metrics.timer("exam"):
+            rows, questions_with_images = module.extract_exam(pdf_file, answer_file, **exam_options(subject, year, output_dir, parser))
+            if hasattr(module, "number_questions"):
+                module.number_questions(rows, subject, year, start_num)
+    finally:
+        pdf_pages.shutdown()  # pool workers exit without running exit hooks, so nothing else would stop it
+    exam_metrics = None
+    if metrics.ENABLED:
+        exam_metrics = metrics.snapshot()
+        metrics.reset()
+    return subject, year, rows, questions_with_images, exam_metrics
+
+
+# Same exam files, options and extractor code (parsers, cleanup rules, keywords) -> the rows a
+# finished run saved for it (see --resume)
+def exam_key(subject, year, pdf_file, answer_file, output_dir=OUTPUT_DIR, parser=None, start_num=START_NUM):
+    module = importlib.import_module(SUBJECTS[subject]["module"])
+    code = [stages.fingerprint(getattr(module, name)) for name in ("extract_exam", "number_questions") if hasattr(module, name)]
+    options = {**exam_options(subject, year, output_dir, parser), "start_num": start_num, "code": code}
+    return checkpoints.exam_key(subject, year, [pdf_file, answer_file], options)
+
+
+# Every finished exam is checkpointed as soon as it comes back; with resume, exams finished by an
+# earlier run with the same inputs are taken from there instead of being run again
+def run_batch(exams, workers=WORKERS, output_dir=OUTPUT_DIR, merged_excel=MERGED_EXCEL, start_num=START_NUM,
+              output_format=FORMAT, parser=None, dedup_threshold=dedup.THRESHOLD if DEDUP else None, crop_figures=FIGURES,
+              resume=False):
+    for subject in {exam[0] for exam in exams}:
+        os.makedirs(os.path.join(output_dir, subject), exist_ok=True)
+
+    # Parse new answer PDFs once up front; the workers then only read the index
+    answer_keys.build([(subject, year, answer_file) for subject, year, _, answer_file in exams], verbose=False)
+
+    # Cores left over when there are fewer exams than workers go to the pages of each exam
+    page_workers = max(1, pdf_pages.WORKERS // max(1, min(workers, len(exams))))
+    results = {}
+    keys = {exam[:2]: exam_key(*exam, output_dir, parser, start_num) for exam in exams}
+    if resume:
+        for subject, year in keys:
+            saved = checkpoints.exam_result(keys[(subject, year)])
+            if saved is not None:
+                results[(subject, year)] = saved
+                print(f"↩️ {subject} {year}: {len(saved[2])} questions (finished in an earlier run)")
+    failed = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_exam, *exam, output_dir, parser, start_num, page_workers): exam
+                   for exam in exams if exam[:2] not in results}
+        for future in as_completed(futures):
+            subject, year = futures[future][:2]
+            try:
+                results[(subject, year)] = future.result()
+            except Exception as e:
+                print(f"❌ {subject} {year} failed: {e}")
+                failed[(subject, year)] = e
+                continue
+            if results[(subject, year)][4]:
+                metrics.merge(results[(subject, year)][4])
+            checkpoints.save_exam(keys[(subject, year)], subject, year, results[(subject, year)][:4] + (None,))
+            print(f"✅ {subject} {year}: {len(results[(subject, year)][2])} questions")
+    if failed:
+        print(f"⚠️ {len(failed)} of {len(exams)} exams outstanding; finished exams are saved, "
+              f"run again with --resume to do only these:")
+        for (subject, year), e in sorted(failed.items()):
+            print(f"   {subject} {year}: {e}")
+
+    if results and crop_figures:
+        # One pool over the pages of every exam, once all questions have their ids
+        pdf_files = {(subject, year): pdf_file for subject, year, pdf_file, _ in exams}
+        requests = []
+        for subject, year in sorted(results):
+            module = importlib.import_module(SUBJECTS[subject]["module"])
+            if hasattr(module, "figure_requests"):
+                _, _, rows, questions_with_images, _ = results[(subject, year)]
+                last_page = exam_options(subject, year, output_dir)["last_page"]
+                requests += module.figure_requests(rows, questions_with_images, pdf_files[(subject, year)], last_page)
+        written = figures.crop(requests)
+        for subject, year in sorted(results):
+            module = importlib.import_module(SUBJECTS[subject]["module"])
+            if hasattr(module, "link_figures"):
+                _, _, rows, questions_with_images, _ = results[(subject, year)]
+                missing = module.link_figures(rows, questions_with_images, written)
+                if missing:
+                    print(f" {subject} {year}: no figure found for {missing}")
+        print(f" Figures: {sum(map(len, written.values()))} cropped to {figures.FIGURE_DIR}")
+
+    # Save in a fixed order so the merged file doesn't depend on which worker finished first
+    merged = []
+    merged_fields = ["subject", "year"]
+    for key in sorted(results):
+        subject, year, rows, questions_with_images, _ = results[key]
+        module = importlib.import_module(SUBJECTS[subject]["module"])
+        module.save_questions(rows, os.path.join(output_dir, subject, f"{year}.{output_format}"))
+        if questions_with_images:
+            print(f" {subject} {year} questions with images: {questions_with_images}")
+
+        for row in rows:
+            row.subject, row.year = subject, year
+        merged.extend(rows)
+        merged_fields += [field for field in module.FIELDS if field not in merged_fields]
+
+    if merged and dedup_threshold:
+        # Against every exam indexed so far, not only this run's
+        exact, near = dedup.flag([(subject, year, results[(subject, year)][2]) for subject, year in sorted(results)], dedup_threshold)
+        print(f" Duplicates: {exact} exact, {near} near (similarity >= {dedup_threshold})")
+        merged_fields.append("duplicate_of")
+
+    if merged:
+        print(f" Saving {len(merged)} questions from {len(results)} exams to {merged_excel}...")
+        save_merged(merged, merged_fields, merged_excel, pad_numbers=True)
+    return question_ids.next_free()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract every egzai/<subject>/<year>.pdf exam in parallel")
+    parser.add_argument("--subjects", nargs="*", choices=sorted(SUBJECTS))
+    parser.add_argument("--years", nargs="*")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--start-num", type=int, default=START_NUM, help="lowest question id to hand out")
+    parser.add_argument("--exam-dir", default=EXAM_DIR)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--merged", default=MERGED_EXCEL)
+    parser.add_argument("--format", default=FORMAT, choices=[sink[1:] for sink in questions.SINKS])
+    parser.add_argument("--parser", choices=["text", "layout"], help="Part I parser for Chem/Bio (default: the script's PARSER)")
+    parser.add_argument("--dedup-threshold", type=float, default=dedup.THRESHOLD, help="similarity for near duplicates")
+    parser.add_argument("--no-dedup", action="store_true", help="do not index questions or mark duplicates")
+    parser.add_argument("--no-figures", action="store_true", help="do not crop the figures of image questions")
+    parser.add_argument("--no-cache", action="store_true", help="recompute every stage instead of reusing .cache/stages")
+    parser.add_argument("--resume", action="store_true", help="reuse the exams an earlier run finished with the same inputs and code")
+    parser.add_argument("--metrics", help="collect timers and counters and write them to this .json or .prom file")
+    parser.add_argument("--profile", metavar="SUBJECT/YEAR", help="profile this one exam in-process instead of running the batch")
+    parser.add_argument("--profiler", default="cprofile", choices=["cprofile", "pyinstrument"])
+    args = parser.parse_args()
+    if args.no_cache:
+        os.environ["STAGE_CACHE"] = "0"  # inherited by the worker processes
+        stages.ENABLED = False
+    if args.metrics:
+        os.environ["METRICS"] = "1"  # workers collect; only this process writes the file
+        metrics.ENABLED = True
+
+    exams = find_exams(args.exam_dir, args.subjects, args.years)
+    print(f" Found {len(exams)} exams.")
+    if args.profile:
+        exam = [exam for exam in exams if f"{exam[0]}/{exam[1]}" == args.profile]
+        if not exam:
+            raise SystemExit(f"❌ No exam {args.profile} in {args.exam_dir}")
+        os.makedirs(os.path.join(args.output_dir, exam[0][0]), exist_ok=True)
+        extension = "html" if args.profiler == "pyinstrument" else "prof"
+        with metrics.profile(f"profile-{exam[0][0]}-{exam[0][1]}.{extension}", args.profiler):
+            run_exam(*exam[0], args.output_dir, args.parser, args.start_num)
+    else:
+        next_num = run_batch(exams, args.workers, args.output_dir, args.merged, args.start_num, args.format, args.parser,
+                             None if args.no_dedup or not DEDUP else args.dedup_threshold, FIGURES and not args.no_figures,
+                             args.resume)
+        print(f" Done! Next free question number: {next_num}")
+    if args.metrics:
+        metrics.write(args.metrics)
+        if not metrics.METRICS:  # otherwise the METRICS exit hook prints it
+            metrics.report()
@@ -0,0 +1,152 @@
+import argparse
+import random
+import re
+import sys
+import time
+
+import latex
+
+# Throughput of the single-pass LaTeX converter against the chain of re.sub / str.replace calls
+# it replaced, on question and option text like a physics exam's, plus a random check that both
+# give the same output. The texts are short, so per-call overhead is what is being measured.
+
+
+def legacy_convert(text):
+    # m/s²
+    text = re.sub(r"(\d+)\s*m/s2", r"$$\1\\ \\mathrm{m/s^{2}}$$", text)
+    text = re.sub(r"(\d+)\s*m/s\^2", r"$$\1\\ \\mathrm{m/s^{2}}$$", text)
+
+    # m³
+    text = re.sub(r"(\d+(?:[.,]\d+)?)\s*m3", r"$$\1\\ \\mathrm{m^{3}}$$", text)
+    text = re.sub(r"(\d+(?:[.,]\d+)?)\s*m\^3", r"$$\1\\ \\mathrm{m^{3}}$$", text)
+
+    # Celsius
+    text = re.sub(r"(\d+)\s*°C", r"$$\1\\,^{\\circ}\\mathrm{C}$$", text)
+
+    unicode_map = {
+        "𝑃": "P", "𝑡": "t", "𝑐": "c", "ℎ": "h", "λ": "\\lambda",
+        "𝑄": "Q", "𝑣": "v", "𝑚": "m", "𝑉": "V",
+    }
+    for k, v in unicode_map.items():
+        text = text.replace(k, v)
+
+    text = re.sub(r"\balfa\b", r"$$\\alpha$$", text, flags=re.IGNORECASE)
+    text = re.sub(r"\bbeta\b", r"$$\\beta$$", text, flags=re.IGNORECASE)
+    text = re.sub(r"\blambda\b", r"$$\\lambda$$", text, flags=re.IGNORECASE)
+
+    text = text.replace("α", "$$\\alpha$$")
+    text = text.replace("β", "$$\\beta$$")
+    text = text.replace("λ", "$$\\lambda$$")
+    text = text.replace("\uf06c", "$$\\lambda$$")
+
+    text = text.replace("°", "$$^{\\circ}$$")
+    text = text.replace("\uf0b0", "$$^{\\circ}$$")
+    text = text.replace("Ω", "$$\\Omega$$")
+
+    isotope_pattern_1 = re.compile(r"(\d{2,3})\s*([A-Z][a-z]?)\s*(\d{1,3})")
+    text = isotope_pattern_1.sub(r"$$^{\1}_{\3}\\mathrm{\2}$$", text)
+
+    isotope_pattern_2 = re.compile(r"([A-Z][a-z]?)\s*(\d{2,3})\s*/\s*(\d{1,3})")
+    text = isotope_pattern_2.sub(r"$$^{\2}_{\3}\\mathrm{\1}$$", text)
+
+    isotope_pattern_3 = re.compile(r"\b([A-Z][a-z]?)\s+(\d{1,3})\s+(\d{1,3})\b")
+
+    def repl_isotope(m):
+        symbol, val1, val2 = m.group(1), int(m.group(2)), int(m.group(3))
+        if val1 < val2:
+            return f"$$^{{{val2}}}_{{{val1}}}\\mathrm{{{symbol}}}$$"
+        else:
+            return f"$$^{{{val1}}}_{{{val2}}}\\mathrm{{{symbol}}}$$"
+    text = isotope_pattern_3.sub(repl_isotope, text)
+
+    text = re.sub(r"\b(\d+)\s+(\d+)\b", r"\1/\2", text)
+    text = re.sub(r"\b(\d+)\s*/\s*(\d+)\b", r"$$\\frac{\1}{\2}$$", text)
+    return text
+
+
+QUESTIONS = [
+    "Kūnas juda tolygiai greitėdamas, jo pagreitis {n} m/s2. Kokį kelią jis nueis per {n} s?",
+    "Į indą, kurio tūris {d} m3, pripilta vandens, kurio temperatūra {n} °C.",
+    "Branduolys {a} Pu {z} skyla. Kiek neutronų yra branduolyje U {a}/{z}?",
+    "Šviesos bangos ilgis λ = {n} nm, dažnis 𝑣. Kam lygi fotono energija ℎ𝑣?",
+    "Spinduliuotė alfa ir beta dalelių pavidalu: kuri iš jų turi didesnę skvarbą?",
+    "Rezistoriaus varža {n} Ω, per jį teka {n} A srovė. Kokia galia 𝑃 išsiskiria?",
+    "Kampas tarp spindulio ir normalės yra {n}°, lūžio rodiklis {n}/{n}.",
+    "Dujos, kurių slėgis {n} kPa, o tūris 𝑉, izotermiškai suspaudžiamos {n} kartus.",
+]
+OPTIONS = ["{n} m/s2", "{n} m/s^2", "{d} m3", "{n} °C", "{n} {n}", "{n}/{n}", "{n} J", "{n} Ω", "λ/{n}",
+           "{a} Pu {z}", "Pu {z} {a}", "2𝑚𝑔ℎ", "𝑄 = 𝑐𝑚Δ𝑡", "didėja", "nesikeičia", "{n} kg·m/s"]
+FUZZ_PIECES = ["1", "12", "239", "94", "1234", ".", ",", " ", "  ", "\n", "/", " / ", "m/s2", "m/s^2", "m3",
+               "m^3", "°C", "°", "C", "Pu", "U", "Mg", "alfa", "BETA", "be𝑡a", "lambda", "la𝑚bda", "λ", "α",
+               "β", "Ω", "\uf06c", "\uf0b0", "𝑃", "𝑡", "𝑚", "𝑉", "ℎ", "kg", "x", "ž", "_", "m", "$", "٣"]
+
+
+def fill(template, rng):
+    return template.format_map({"n": rng.randint(1, 400), "d": f"{rng.randint(0, 9)},{rng.randint(1, 9)}",
+                                "a": rng.randint(200, 240), "z": rng.randint(80, 95)})
+
+
+def corpus(questions, rng):
+    # What a physics year sends through the converter: each question and its four options
+    texts = []
+    for _ in range(questions):
+        texts.append(fill(rng.choice(QUESTIONS), rng))
+        texts.extend(fill(rng.choice(OPTIONS), rng) for _ in range(4))
+    return texts
+
+
+def throughput(convert, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            convert(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def check(texts):
+    wrong = [text for text in texts if latex.convert(text) != legacy_convert(text)]
+    for text in wrong[:5]:
+        print(f"   ❌ {text!r}\n      old {legacy_convert(text)!r}\n      new {latex.convert(text)!r}")
+    return wrong
+
+
+def fallbacks(texts):
+    chained = latex.convert_chained
+    used = []
+    latex.convert_chained = lambda text: used.append(text) or chained(text)
+    try:
+        for text in texts:
+            latex.convert(text)
+    finally:
+        latex.convert_chained = chained
+    return len(used)
+
+
+def run(questions, repeat, fuzz, seed):
+    rng = random.Random(seed)
+    texts = corpus(questions, rng)
+    characters = sum(map(len, texts))
+    print(f" {len(texts)} texts, {characters} characters")
+    print(f"   {'converter':<12}{'ms':>10}{'texts/s':>12}{'MB/s':>8}")
+    for name, convert in (("old", legacy_convert), ("chained", latex.convert_chained), ("single pass", latex.convert)):
+        seconds = throughput(convert, texts, repeat)
+        print(f"   {name:<12}{seconds * 1000:>10.1f}{len(texts) / seconds:>12.0f}{characters / seconds / 1e6:>8.2f}")
+    print(f"   {fallbacks(texts)} of {len(texts)} texts went through the chain")
+
+    failed = bool(check(texts))
+    fuzzed = ["".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(0, 12))) for _ in range(fuzz)]
+    wrong = check(fuzzed)
+    print(f" Random texts: {len(fuzzed) - len(wrong)}/{len(fuzzed)} identical, {fallbacks(fuzzed)} through the chain")
+    return not failed and not wrong
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Single-pass vs chained LaTeX conversion: speed and identical output")
+    parser.add_argument("--questions", type=int, default=3000, help="questions in the corpus (each with 4 options)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fuzz", type=int, default=100000, help="random texts compared against the old converter")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.questions, args.repeat, args.fuzz, args.seed) else 1)
@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pdf_pages
+
+# Page-level extraction and rendering of whole exams with 1, 2, 4, ... page pool workers: time
+# per pass, speed-up over one process, and a check that text and PNG bytes are the same for every
+# worker count. Extraction runs against an empty page cache each time; the pool is started (and
+# warmed up) before timing, as it is kept for the whole run in the scripts.
+
+
+def extract_all(pdf_files):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        pdf_pages.CACHE_DIR = cache_dir
+        pdf_pages._entries.clear()
+        return [pdf_pages.page_texts(pdf_file, range(pdf_pages.page_count(pdf_file))) for pdf_file in pdf_files]
+
+
+def render_all(pdf_files, zoom):
+    return [pdf_pages.render_pngs(pdf_file, range(pdf_pages.page_count(pdf_file)), zoom) for pdf_file in pdf_files]
+
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(pdf_files, worker_counts, zoom, repeat):
+    pages = sum(pdf_pages.page_count(pdf_file) for pdf_file in pdf_files)
+    print(f" {len(pdf_files)} PDFs, {pages} pages, zoom {zoom}, {os.cpu_count()} cores")
+    print(f"   {'workers':>7}{'extract ms':>12}{'speed-up':>10}{'render ms':>11}{'speed-up':>10}{'pages/s':>9}")
+    baseline = None
+    same = True
+    for workers in worker_counts:
+        pdf_pages.shutdown()
+        pdf_pages.WORKERS = workers
+        if workers > 1:
+            pdf_pages.map_pages(pdf_pages.page_count, [(pdf_files[0],)] * max(workers, pdf_pages.PARALLEL_PAGES))
+        extract_time, texts = best_time(lambda: extract_all(pdf_files), repeat)
+        render_time, pngs = best_time(lambda: render_all(pdf_files, zoom), repeat)
+        if baseline is None:
+            baseline = extract_time, render_time, texts, pngs
+        same = same and texts == baseline[2] and pngs == baseline[3]
+        print(f"   {workers:>7}{extract_time * 1000:>12.1f}{baseline[0] / extract_time:>10.2f}"
+              f"{render_time * 1000:>11.1f}{baseline[1] / render_time:>10.2f}{pages / render_time:>9.1f}")
+    pdf_pages.shutdown()
+    print(" Same text and PNGs for every worker count" if same else " ❌ Output differs between worker counts")
+    return same
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Page pool scaling: extraction and rendering with 1..N workers")
+    parser.add_argument("pdfs", nargs="*", default=["egzai/Fiz/2017.pdf"])
+    parser.add_argument("--workers", type=int, nargs="*",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--zoom", type=float, default=4.0, help="render scale; 4.0 is 288 DPI")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.pdfs, args.workers, args.zoom, args.repeat) else 1)
@@ -0,0 +1,76 @@
+import argparse
+import importlib
+import re
+import time
+
+import batch
+import layout
+
+# Compares the two Part I parsers on the same PDFs: time per exam (pages already cached, so only
+# parsing is measured), questions found, questions with all four options, and disagreements.
+
+
+def text_questions(module, pdf_file, options):
+    raw_text = module.extract_clean_text_from_pdf(pdf_file, end_page=options["last_page"])
+    raw_text = module.remove_header_footer_noise(raw_text, options["remove"], options["title"])
+    split_match = re.search(r"\bII dalis\b", raw_text, flags=re.IGNORECASE)
+    part1_text = raw_text[:split_match.start()] if split_match else raw_text
+    return list(module.text_blocks(part1_text))
+
+
+def layout_questions(module, pdf_file, options):
+    def clean(text):
+        return module.remove_header_footer_noise(module.PAGE_RULES.apply(text), options["remove"], options["title"])
+
+    return list(layout.mcq_blocks(pdf_file, 2, options["last_page"], clean))
+
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def normalized(blocks):
+    return {num: (question, [(letter, re.sub(r"\s+", " ", text).strip()) for letter, text in options])
+            for num, question, options in blocks}
+
+
+def compare(exams, repeat=5):
+    print(f" {'exam':<12}{'parser':<8}{'ms':>8}{'found':>7}{'full':>6}{'skip':>6}")
+    totals = {"text": [0.0, 0, 0], "layout": [0.0, 0, 0]}
+    for subject, year, pdf_file, _ in exams:
+        module = importlib.import_module(batch.SUBJECTS[subject]["module"])
+        options = batch.exam_options(subject, year)
+        results = {}
+        for name, parse in (("text", text_questions), ("layout", layout_questions)):
+            parse(module, pdf_file, options)  # warm the page cache
+            elapsed, blocks = best_time(lambda: parse(module, pdf_file, options), repeat)
+            full = sum(len(block[2]) >= 4 for block in blocks)
+            print(f" {subject + ' ' + year:<12}{name:<8}{elapsed * 1000:>8.2f}{len(blocks):>7}{full:>6}{len(blocks) - full:>6}")
+            totals[name][0] += elapsed
+            totals[name][1] += full
+            totals[name][2] += len(blocks) - full
+            results[name] = normalized(blocks)
+
+        differ = [num for num in results["text"] if num in results["layout"]
+                  and len(results["text"][num][1]) >= 4 and results["text"][num] != results["layout"][num]]
+        if differ:
+            print(f"   questions parsed differently: {', '.join(differ)}")
+
+    for name, (elapsed, full, skipped) in totals.items():
+        print(f" {name}: {elapsed * 1000:.1f} ms total, {full} complete, {skipped} skipped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the text and layout Part I parsers")
+    parser.add_argument("--exam-dir", default=batch.EXAM_DIR)
+    parser.add_argument("--subjects", nargs="*", default=["Chem", "Bio"], choices=["Chem", "Bio"])
+    parser.add_argument("--years", nargs="*")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    compare(batch.find_exams(args.exam_dir, args.subjects, args.years), args.repeat)
@@ -0,0 +1,311 @@
+import argparse
+import base64
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+import batch
+
+# ---------------------
+HISTORY_FILE = "bench_history.json"
+OCR_LATENCY = 0.5           # seconds the Mathpix stand-in takes per request
+REGRESSION_THRESHOLD = 0.10  # a run this much slower than the last recorded one is flagged
+# ---------------------
+
+# Runs each pipeline on the sample exams and reports, per stage, time, peak RSS and throughput in
+# pages/s and questions/s. Every run is a fresh process with empty caches (stage cache off, page
+# cache, answer index and Mathpix cache in a temp dir), so the numbers are cold-start costs and
+# the peak RSS is that pipeline's own. Results are appended to bench_history.json and compared
+# with the previous run of the same pipeline and exam.
+#
+# Stage times are self times: a timed call made inside another one is not counted twice. Physics
+# renders and OCRs pages on several threads, so its stage times can add up to more than the wall
+# (and render includes waiting for the render lock).
+
+PIPELINES = ("text", "physics", "latex")
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    # Replaces owner.name with a timed version for the rest of this (throwaway) process
+    def wrap(self, owner, name, stage):
+        original = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            stack = self.local.__dict__.setdefault("stack", [])
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self.lock:
+                    entry = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0, "peak_rss_mb": None})
+                    entry["seconds"] += elapsed - nested
+                    entry["calls"] += 1
+                    entry["peak_rss_mb"] = peak_rss_mb()
+
+        setattr(owner, name, timed)
+
+
+def isolate_caches(cache_dir):
+    import answer_keys
+    import checkpoints
+    import dedup
+    import mathpix
+    import pdf_pages
+    import question_ids
+    import stages
+
+    stages.ENABLED = False
+    pdf_pages.CACHE_DIR = os.path.join(cache_dir, "pages")
+    pdf_pages.WORKERS = 1  # the stage timers wrap functions in this process; bench_pages.py times the pool
+    answer_keys.INDEX_FILE = os.path.join(cache_dir, "answers.sqlite")
+    mathpix.CACHE_FILE = os.path.join(cache_dir, "mathpix.sqlite")
+    question_ids.ID_FILE = os.path.join(cache_dir, "question_ids.sqlite")
+    checkpoints.CHECKPOINT_FILE = os.path.join(cache_dir, "checkpoints.sqlite")
+    dedup.INDEX_FILE = os.path.join(cache_dir, "duplicates.sqlite")
+
+
+# Local Mathpix stand-in: answers after `latency` seconds with a few questions made from the PNG hash
+def start_mathpix_stub(latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            png = base64.b64decode(payload["src"].split(",", 1)[1])
+            digest = hashlib.sha256(png).hexdigest()
+            time.sleep(latency)
+            text = "\n".join(f"{n:02d}. Kūnas {digest[n:n + 6]} juda 3 m/s2 pagreičiu.\nA 1\nB 2\nC 3\nD 4"
+                             for n in range(int(digest[0], 16) % 4 + 2))
+            body = json.dumps({"text": text, "data": []}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/"
+
+
+def run_text(timer, subject, year, pdf_file, answer_file, output_dir):
+    import pdf_pages
+
+    module = importlib.import_module(batch.SUBJECTS[subject]["module"])
+    timer.wrap(pdf_pages, "page_texts", "extract")
+    timer.wrap(module.PAGE_RULES, "apply", "clean")
+    timer.wrap(module, "remove_header_footer_noise", "clean")
+    timer.wrap(module, "part1_blocks", "split+parse")
+    timer.wrap(module, "get_mcq_answers", "answers")
+    timer.wrap(module, "mcq_rows", "answer-join")
+    timer.wrap(module, "extract_open_questions_from_part_ii", "part II")
+    timer.wrap(module, "save_questions", "export")
+
+    options = batch.exam_options(subject, year, output_dir)
+    os.makedirs(os.path.join(output_dir, subject), exist_ok=True)
+    rows, _ = module.extract_exam(pdf_file, answer_file, **options)
+    if hasattr(module, "number_questions"):
+        module.number_questions(rows, subject, year, batch.START_NUM)
+    module.save_questions(rows, os.path.join(output_dir, f"{subject}{year}.xlsx"))
+    return min(options["last_page"], pdf_pages.page_count(pdf_file)) - 1, len(rows)
+
+
+def run_physics(timer, subject, year, pdf_file, answer_file, output_dir, ocr_latency=OCR_LATENCY):
+    import mathpix
+    import pdf_pages
+    import physics1part as physics
+
+    mathpix.MATHPIX_URL = start_mathpix_stub(ocr_latency)
+    physics.PAGES = [n for n in physics.PAGES if n < pdf_pages.page_count(pdf_file)]
+    timer.wrap(pdf_pages, "render_png", "render")
+    timer.wrap(mathpix, "ocr_png", "ocr")
+    timer.wrap(physics.OCR_RULES, "apply", "clean")
+    timer.wrap(physics, "get_mcq_answers", "answers")
+    timer.wrap(physics, "ocr_questions", "split+parse+join")
+    timer.wrap(physics, "save_questions", "export")
+
+    rows, _ = physics.extract_exam(pdf_file, answer_file, dump_file=None, subject=subject, year=year)
+    physics.save_questions(rows, os.path.join(output_dir, f"{subject}{year}.xlsx"))
+    return len(physics.PAGES), len(rows)
+
+
+def run_latex(timer, subject, year, pdf_file, answer_file, output_dir):
+    import pdf_pages
+    import test
+    import tokenizer
+
+    timer.wrap(pdf_pages, "page_texts", "extract")
+    timer.wrap(test.noise_rules, "apply", "clean")
+    timer.wrap(tokenizer, "paragraph_questions", "split")
+    timer.wrap(test, "extract_questions", "parse")
+    timer.wrap(test, "convert_to_latex", "latex")
+    timer.wrap(test, "save_questions", "export")
+
+    questions = test.extract_questions(test.read_exam_text(pdf_file))
+    test.save_questions(questions, os.path.join(output_dir, f"{subject}{year}_latex.xlsx"))
+    return pdf_pages.page_count(pdf_file) - 1, len(questions)
+
+
+RUNNERS = {"text": run_text, "physics": run_physics, "latex": run_latex}
+
+
+def pipeline_modules(pipeline, subject):
+    if pipeline == "text":
+        return [batch.SUBJECTS[subject]["module"]]
+    return {"physics": ["physics1part"], "latex": ["test"]}[pipeline]
+
+
+# Runs in a fresh worker process
+def measure(pipeline, exam, options):
+    with tempfile.TemporaryDirectory() as work_dir:
+        isolate_caches(os.path.join(work_dir, "cache"))
+        timer = StageTimer()
+        start = time.perf_counter()
+        for module in pipeline_modules(pipeline, exam[0]):
+            importlib.import_module(module)  # timed on its own, not part of the wall time
+        imports = time.perf_counter() - start
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # the scripts' progress output
+            pages, questions = RUNNERS[pipeline](timer, *exam, work_dir, **options)
+        wall = time.perf_counter() - start
+    return {"wall_seconds": wall, "import_seconds": imports, "pages": pages, "questions": questions, "peak_rss_mb": peak_rss_mb(),
+            "stages": timer.stages}
+
+
+def run_once(pipeline, exam, options):
+    # spawn, not fork: the child must not inherit this process's imports, caches or peak RSS
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(measure, pipeline, exam, options).result()
+
+
+def pipeline_exams(pipeline, exams):
+    if pipeline == "text":
+        return [exam for exam in exams if exam[0] in ("Chem", "Bio")]
+    return [exam for exam in exams if exam[0] == "Fiz"]
+
+
+def rate(count, seconds):
+    return f"{count / seconds:.1f}" if seconds > 0 else "-"
+
+
+def print_result(pipeline, exam, result):
+    label = f"{pipeline} {exam[0]} {exam[1]}"
+    pages, questions = result["pages"], result["questions"]
+    print(f" {label}: {result['wall_seconds'] * 1000:.0f} ms, {pages} pages, {questions} questions, "
+          f"peak RSS {result['peak_rss_mb'] or 0:.0f} MB (+{result['import_seconds'] * 1000:.0f} ms imports)")
+    print(f"   {'stage':<18}{'ms':>9}{'calls':>7}{'share':>7}{'pages/s':>10}{'q/s':>10}{'RSS MB':>8}")
+    for stage, entry in result["stages"].items():
+        seconds = entry["seconds"]
+        print(f"   {stage:<18}{seconds * 1000:>9.1f}{entry['calls']:>7}{seconds / result['wall_seconds']:>7.0%}"
+              f"{rate(pages, seconds):>10}{rate(questions, seconds):>10}{entry['peak_rss_mb'] or 0:>8.0f}")
+    print(f"   {'total (wall)':<18}{result['wall_seconds'] * 1000:>9.1f}{'':>7}{'':>7}"
+          f"{rate(pages, result['wall_seconds']):>10}{rate(questions, result['wall_seconds']):>10}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def load_history(history_file):
+    if not os.path.exists(history_file):
+        return []
+    with open(history_file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(history, results):
+    previous = {}
+    for run in history:
+        for entry in run["results"]:
+            previous[(entry["pipeline"], entry["subject"], entry["year"])] = (run, entry)
+    for entry in results:
+        key = (entry["pipeline"], entry["subject"], entry["year"])
+        if key not in previous:
+            continue
+        run, before = previous[key]
+        change = entry["wall_seconds"] / before["wall_seconds"] - 1
+        mark = "⚠️" if change > REGRESSION_THRESHOLD else "  "
+        print(f" {mark} {' '.join(key)}: {before['wall_seconds'] * 1000:.0f} -> {entry['wall_seconds'] * 1000:.0f} ms "
+              f"({change:+.0%} vs {run['commit'] or run['time']})")
+
+
+def bench(exams, pipelines=PIPELINES, repeat=3, history_file=HISTORY_FILE, ocr_latency=OCR_LATENCY):
+    results = []
+    for pipeline in pipelines:
+        for exam in pipeline_exams(pipeline, exams):
+            options = {"ocr_latency": ocr_latency} if pipeline == "physics" else {}
+            runs = [run_once(pipeline, exam, options) for _ in range(repeat)]
+            best = min(runs, key=lambda run: run["wall_seconds"])
+            print_result(pipeline, exam, best)
+            results.append({"pipeline": pipeline, "subject": exam[0], "year": exam[1], **best})
+
+    history = load_history(history_file)
+    print(" Compared with the last recorded run:")
+    compare(history, results)
+    history.append({
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "ocr_latency": ocr_latency,
+        "results": results,
+    })
+    with open(history_file, "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=1)
+    print(f" Results appended to {history_file}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage timings of every pipeline on the sample exams")
+    parser.add_argument("--exam-dir", default=batch.EXAM_DIR)
+    parser.add_argument("--pipelines", nargs="*", default=list(PIPELINES), choices=PIPELINES)
+    parser.add_argument("--subjects", nargs="*", choices=sorted(batch.SUBJECTS))
+    parser.add_argument("--years", nargs="*")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per exam; the fastest is kept")
+    parser.add_argument("--ocr-latency", type=float, default=OCR_LATENCY)
+    parser.add_argument("--history", default=HISTORY_FILE)
+    args = parser.parse_args()
+    bench(batch.find_exams(args.exam_dir, args.subjects, args.years), args.pipelines, args.repeat,
+          args.history, args.ocr_latency)
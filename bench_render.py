@@ -0,0 +1,57 @@
+import argparse
+import io
+import sys
+import time
+
+import pymupdf
+from PIL import Image
+
+import pdf_pages
+import physics1part
+
+# The physics OCR pages rendered the way they used to be (full page -> PNG -> PIL -> crop -> PNG
+# file -> read back) against the clipped render that goes straight to PNG bytes: time and bytes
+# moved per page, and a check that both give a picture of the same size.
+
+
+def render_via_pil(doc, page_num, zoom):
+    left, top, bottom = physics1part.CROP
+    pix = doc.load_page(page_num).get_pixmap(matrix=pymupdf.Matrix(zoom, zoom))
+    full_png = pix.tobytes("png")
+    img = Image.open(io.BytesIO(full_png))
+    width, height = img.size
+    buffered = io.BytesIO()
+    img.crop((left, top, width, height - bottom)).save(buffered, format="PNG")
+    cropped_png = buffered.getvalue()
+    # full PNG + decoded RGB + cropped PNG written to disk and read back
+    moved = len(full_png) + width * height * 3 + 2 * len(cropped_png)
+    return cropped_png, moved
+
+
+def run(pdf_file, zoom):
+    doc = pdf_pages.open_pdf(pdf_file)
+    same = True
+    for page_num in physics1part.PAGES:
+        start = time.perf_counter()
+        legacy_png, legacy_bytes = render_via_pil(doc, page_num, zoom)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        png = pdf_pages.render_png(pdf_file, page_num, zoom, physics1part.page_clip(doc[page_num], zoom))
+        stream_time = time.perf_counter() - start
+
+        legacy_size, size = Image.open(io.BytesIO(legacy_png)).size, Image.open(io.BytesIO(png)).size
+        same = same and abs(legacy_size[0] - size[0]) <= 1 and abs(legacy_size[1] - size[1]) <= 1
+        print(f"   Page {page_num + 1}: saved {(legacy_time - stream_time) * 1000:.0f} ms "
+              f"and {(legacy_bytes - len(png)) // 1024} KB "
+              f"({legacy_time * 1000:.0f} -> {stream_time * 1000:.0f} ms, {legacy_size} -> {size} px)")
+    print(" Same picture size on every page" if same else " ❌ Picture sizes differ")
+    return same
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Physics page rendering: PIL crop round trip vs clipped render")
+    parser.add_argument("pdf", nargs="?", default=physics1part.PDF_FILE)
+    parser.add_argument("--zoom", type=float, default=2.0)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.pdf, args.zoom) else 1)
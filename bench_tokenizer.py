@@ -0,0 +1,91 @@
+import argparse
+import re
+import sys
+import time
+
+import tokenizer
+
+# Regression benchmark for the question tokenizer against the regexes it replaced, on inputs that
+# make lazy DOTALL matching backtrack: numbered table rows with no blank line after them, long
+# formulas broken over many lines, and option letters that never get their whitespace.
+# Each input is doubled in size a few times; a linear splitter's time roughly doubles with it.
+
+
+def legacy_blocks(text):
+    blocks = []
+    for block in re.split(r"(?=\d{2}\.\s)", text):
+        block = block.strip()
+        match = re.match(r"(?P<num>\d{2})\.\s(?P<question>.+?)(?=(\nA\s|$))", block, flags=re.DOTALL)
+        if not match:
+            continue
+        options = re.findall(r"(?:^|\n)([A-D])\s+(.*?)(?=(?:\n[A-D]\s|$))", block, flags=re.DOTALL)
+        blocks.append((match.group("num"), re.sub(r"\s+", " ", match.group("question").strip()), options))
+    return blocks
+
+
+def legacy_paragraphs(text):
+    return re.findall(r"(\d{2})\.\s(.+?)(?=(?:\n\d{2}\.\s)|(?:\n{2,}))", text, flags=re.DOTALL)
+
+
+def table_rows(n):
+    # A table of measurements after the last question: every row looks like a question start
+    return "01. Lentelėje pateikti matavimai.\n\n" + "".join(f"| {i % 90 + 10}. {i * 0.37:.2f} | {i % 7}.5 |\n" for i in range(n))
+
+
+def long_formula(n):
+    # One question whose formula is broken over many lines starting with capital letters
+    lines = "".join(f"\nA{i}=\\frac{{{i}}}{{x+{i}}}" for i in range(n))
+    return f"07. Apskaičiuokite reiškinį {lines}\nA 1\nB 2\nC 3\nD 4"
+
+
+def bare_letters(n):
+    # Many lines starting with an option letter but no whitespace after it
+    return "12. Klausimas\n" + "\nB,C,D".join("x" * 20 for _ in range(n)) + "\nA ats"
+
+
+CASES = {
+    "table rows": (table_rows, legacy_paragraphs, tokenizer.paragraph_questions),
+    "long formula": (long_formula, legacy_blocks, lambda text: list(tokenizer.question_blocks(text))),
+    "bare letters": (bare_letters, legacy_blocks, lambda text: list(tokenizer.question_blocks(text))),
+}
+
+
+def timed(fn, text):
+    start = time.perf_counter()
+    result = fn(text)
+    return time.perf_counter() - start, result
+
+
+def run(sizes, max_legacy_seconds=20.0):
+    failed = False
+    for name, (make, legacy, new) in CASES.items():
+        print(f" {name}")
+        print(f"   {'size':>8}{'chars':>10}{'regex ms':>12}{'tokenizer ms':>14}")
+        legacy_slow = False
+        previous = None
+        for size in sizes:
+            text = make(size)
+            new_time, new_result = timed(new, text)
+            if legacy_slow:
+                legacy_column = "skipped"
+            else:
+                legacy_time, legacy_result = timed(legacy, text)
+                legacy_column = f"{legacy_time * 1000:.1f}"
+                legacy_slow = legacy_time > max_legacy_seconds / 4
+                if [tuple(item) for item in legacy_result] != [tuple(item) for item in new_result]:
+                    print(f"   ❌ results differ at size {size}")
+                    failed = True
+            print(f"   {size:>8}{len(text):>10}{legacy_column:>12}{new_time * 1000:>14.1f}")
+            # Doubling the input should not much more than double the tokenizer's time
+            if previous and new_time > 4 * previous and new_time > 0.05:
+                print(f"   ❌ tokenizer time grew {new_time / previous:.1f}x for 2x input")
+                failed = True
+            previous = new_time
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tokenizer vs regex question splitting on pathological inputs")
+    parser.add_argument("--sizes", nargs="*", type=int, default=[500, 1000, 2000, 4000, 8000, 16000])
+    args = parser.parse_args()
+    sys.exit(0 if run(args.sizes) else 1)
@@ -1,15 +1,31 @@
-import pymupdf  # PyMuPDF
-import pandas as pd
+import pdf_pages
 import re
+import functools
+
+import answer_keys
+import cleanup
+import keywords
+import layout
+import metrics
+import question_ids
+import questions
+import stages
+import tokenizer
 
 # ---------------------
+SUBJECT = "Bio"  # answer keys and question ids are kept per subject
 PDF_FILE = "egzai/2019.pdf"
 ANSWER_FILE = "egzai/2019_ats.pdf"
 OUTPUT_EXCEL = "surinkti/2019.xlsx"
 REMOVE = "101BIVU0"
+PARSER = "text"  # "layout" reads Part I from word positions instead of the flattened text
 LASTPAGE = 8
+TITLE = "2010 M. BIOLOGIJOS VALSTYBINIO BRANDOS EGZAMINO UŽDUOTIS "
 # ---------------------
 
+# Excel columns, in order
+FIELDS = ("number", "category", "question", "correct", "wrong1", "wrong2", "wrong3", "fa_check", "temp_num")
+
 skip_keywords = [
     "žr. pav", "pav.", "paveiksl", "Paveiksl", "lentel", "pavaizduot", "eiga",
     "Grafik", "grafik", "tašką", "šaltinis", "schema", "nuotraukoje", "lentelėje", "Schemoje", "schemoje", "diagrama", "pažymėta"
@@ -28,85 +44,62 @@ category_keywords = {
     32: ["aplinkosaug", "apsaugoti", "ekosistem", "ekologin", "populiacij", ],
 }
 
-def assign_category(text):
-    text_lower = text.lower()
-    for category, keywords in category_keywords.items():
-        if any(kw in text_lower for kw in keywords):
-            return category
-    return "null"  # No category matched
-
-
-def clean_answer(text):
-    return re.sub(r'[.;]', '', text)
-
-def remove_header_footer_noise(text):
-    # Remove blocks starting with a line like: 1 word – word – word
-    text = re.sub(
-        r"""
-        ^\d+\s+[^\n–]+(?:\s+–\s+[^\n–]+)+   # first line like "1 stiebagumbis – bulwocebula – ..."
-        (?:\n[^\n]*){1,5}                   # up to 5 lines that follow (junk)
-        """,
-        "",
-        text,
-        flags=re.MULTILINE | re.VERBOSE
-    )
-
-    # Remove uppercase titles
-    text = re.sub(r"^[A-ZĄČĘĖĮŠŲŪŽ\s]{10,}$", "", text, flags=re.MULTILINE)
-
-    # Remove codes or short standalone numbers (e.g., "231BIVU0", "3")
-    text = re.sub(r"^[A-Z0-9]{6,}$", "", text, flags=re.MULTILINE)
-    text = re.sub(r"^\d{1,3}$", "", text, flags=re.MULTILINE)
-
-    text = re.sub(r'^\s*\d{1,3}\s*$', '', text, flags=re.MULTILINE)
+# One scan finds the image/diagram markers and every category hit; categories keep their listed priority
+question_keywords = keywords.KeywordMatcher({"skip": skip_keywords, **category_keywords})
 
-    text = text.replace(REMOVE, '')
-    text = text.replace("Juodraštis", '')
-    text = text.replace("2010 M. BIOLOGIJOS VALSTYBINIO BRANDOS EGZAMINO UŽDUOTIS ", '')
-    text = text.replace("B",'')
-    text = text.replace("*", '')
-    # Remove excess blank lines
-    text = re.sub(r'\n\s*\n+', '\n\n', text)
 
-    # Remove reference marks
-    # Step 1: remove digits after letters but not if followed by dot
-    text = re.sub(r'(?<=[a-zA-Z])(\d+)(?!\.)', '', text)
+def classify(text):
+    found = question_keywords.find(text.lower())
+    category = next((label for label in found if label != "skip"), "null")  # "null": no category matched
+    return "skip" in found, category
 
 
-    return text.strip()
-
-
-
-
-
-def get_mcq_answers(pdf_path):
-    doc = pymupdf.open(pdf_path)
-    first_page_text = doc[0].get_text()
-
-    part1_answer, part2_answer = first_page_text, ""
-    split_match_answer = re.search(r"\bII DALIS\b", first_page_text, flags=re.IGNORECASE)
-    if split_match_answer:
-        part1_answer = first_page_text[:split_match_answer.start()]
-        part2_answer = first_page_text[split_match_answer.start():]
-    else:
-        print("⚠️ Could not find 'II dalis'. Using full text as Part I.")
-
+def assign_category(text):
+    return classify(text)[1]
 
-    with open("outputAnswer.txt", "w", encoding="utf-8") as f:
-        f.write(first_page_text)
 
-    # Find all standalone capital letters A–D (answer choices)
-    answers = re.findall(r"\b([ABCD])\b", part1_answer)
-    mcq_answers = {str(i + 1).zfill(2): answers[i] for i in range(min(30, len(answers)))}
+def clean_answer(text):
+    return re.sub(r'[.;]', '', text)
 
-    part2_blocks = re.split(r"\n(?=\d{1,2}\s)", part2_answer)
-    part2_answers = {}
-    for block in part2_blocks:
-        match = re.match(r"(?P<num>\d{1,2})\s+(?P<answer>.+)", block.strip(), flags=re.DOTALL)
-        if match:
-            num = match.group("num").zfill(2)
-            answer = re.sub(r'\s+', ' ', match.group("answer").strip())
-            part2_answers[num] = answer
+@functools.lru_cache(maxsize=None)
+def noise_rules(remove=REMOVE, title=TITLE):
+    return cleanup.CleanupRules([
+        # Remove blocks starting with a line like: 1 word – word – word
+        cleanup.rule("glossary block", r"""
+            ^\d+\s+[^\n–]+(?:\s+–\s+[^\n–]+)+   # first line like "1 stiebagumbis – bulwocebula – ..."
+            (?:\n[^\n]*){1,5}                   # up to 5 lines that follow (junk)
+            """, "", re.MULTILINE | re.VERBOSE),
+        # Remove uppercase titles
+        cleanup.rule("uppercase line", r"^[A-ZĄČĘĖĮŠŲŪŽ\s]{10,}$", "", re.MULTILINE),
+        # Remove codes or short standalone numbers (e.g., "231BIVU0", "3")
+        cleanup.rule("code line", r"^[A-Z0-9]{6,}$", "", re.MULTILINE),
+        cleanup.rule("number line", r"^\d{1,3}$", "", re.MULTILINE),
+        cleanup.rule("padded number line", r"^\s*\d{1,3}\s*$", "", re.MULTILINE),
+        cleanup.literal("exam code", remove),
+        cleanup.literal("Juodraštis", "Juodraštis"),
+        cleanup.literal("title", title),
+        cleanup.literal("B symbol", "B"),
+        cleanup.literal("*", "*"),
+        # Remove excess blank lines
+        cleanup.rule("blank lines", r"\n\s*\n+", "\n\n"),
+        # Remove reference marks
+        # Step 1: remove digits after letters but not if followed by dot
+        cleanup.rule("reference digits", r"(?<=[a-zA-Z])(\d+)(?!\.)"),
+    ])
+
+
+def remove_header_footer_noise(text, remove=REMOVE, title=TITLE):
+    return noise_rules(remove, title).apply(text).strip()
+
+
+
+
+
+# Answers come from the answer-key index; the PDF is only parsed the first time it is seen
+def get_mcq_answers(pdf_path, dump_file="outputAnswer.txt", subject=SUBJECT, year=None):
+    mcq_answers, part2_answers = answer_keys.lookup(pdf_path, subject, year)
+    if dump_file:
+        answer_keys.dump(mcq_answers, part2_answers, dump_file)
 
     print(f" Found {len(mcq_answers)} MCQ answers and {len(part2_answers)} open-ended answers.")
     return mcq_answers, part2_answers
@@ -147,16 +140,12 @@ def extract_open_questions_from_part_ii(text):
         qtext = re.sub(r'\s+', ' ', match_local.group("question")).strip()
 
         # Skip if it contains image/table indicators
-        if any(kw in qtext.lower() for kw in skip_keywords):
+        skip, category = classify(qtext)
+        if skip:
             print(f" Skipping Part II Q{num} — image or diagram referenced")
             continue
 
-        open_questions.append({
-            "Question No.": num,
-            "Category": assign_category(qtext),
-            "Question": qtext,
-            "fa_check": "TRUE"
-        })
+        open_questions.append(questions.Question(number=num, category=category, question=qtext, fa_check="TRUE"))
 
     return open_questions
 
@@ -166,114 +155,146 @@ def extract_open_questions_from_part_ii(text):
 
 
 
-def extract_clean_text_from_pdf(pdf_path, start_page=2, end_page=LASTPAGE):
-    doc = pymupdf.open(pdf_path)
-    text = "\n".join(doc[i].get_text() for i in range(start_page - 1, end_page))
+PAGE_RULES = cleanup.CleanupRules([
     # Remove common headers/footers
-    text = re.sub(
-        r"RIBOTO NAUDOJIMO.*?\)\s*|BIOLOGIJA\s+●.*?sesija|NEPAMIRŠKITE.*?LAPĄ",
-        "", text, flags=re.IGNORECASE | re.DOTALL
-    )
+    cleanup.rule("page header/footer", r"RIBOTO NAUDOJIMO.*?\)\s*|BIOLOGIJA\s+●.*?sesija|NEPAMIRŠKITE.*?LAPĄ", "",
+                 re.IGNORECASE | re.DOTALL),
     # Normalize multiple blank lines
-    text = re.sub(r'\n\s*\n+', '\n\n', text)
-    return text
+    cleanup.rule("blank lines", r"\n\s*\n+", "\n\n"),
+])
+
+
+def extract_clean_text_from_pdf(pdf_path, start_page=2, end_page=LASTPAGE):
+    end_page = min(end_page, pdf_pages.page_count(pdf_path))
+    text = "\n".join(pdf_pages.page_texts(pdf_path, range(start_page - 1, end_page)))
+    return PAGE_RULES.apply(text)
+
+
+# Part I as (number, question text, [(letter, option text), ...]) from the flattened, cleaned text
+def text_blocks(part1_text):
+    for block in tokenizer.split_questions(part1_text):
+        yield from tokenizer.question_blocks(block)
+
+
+# Extract + clean: the exam pages as one cleaned text
+@stages.stage(files=("pdf_file",), outputs=("dump_file",))
+def exam_text(pdf_file, remove=REMOVE, title=TITLE, last_page=LASTPAGE, dump_file="output.txt"):
+    raw_text = extract_clean_text_from_pdf(pdf_file, end_page=last_page)
+    raw_text = remove_header_footer_noise(raw_text, remove, title)
+    if dump_file:
+        with open(dump_file, "w", encoding="utf-8") as f:
+            f.write(raw_text)
+    return raw_text
+
+
+# Split + parse: Part I as a list of (number, question text, [(letter, option text), ...])
+@stages.stage(files=("pdf_file",))
+def part1_blocks(pdf_file, part1_text, parser=PARSER, remove=REMOVE, title=TITLE, last_page=LASTPAGE):
+    with metrics.timer("split", parser=parser):
+        if parser == "layout":
+            def clean(text):
+                return remove_header_footer_noise(PAGE_RULES.apply(text), remove, title)
+
+            return list(layout.mcq_blocks(pdf_file, 2, last_page, clean))
+        return list(text_blocks(part1_text))
+
+
+# Answer-join: question records for the parsed blocks, with the correct option from the key
+@stages.stage
+def mcq_rows(blocks, mcq_answers):
+    data = []
+    questionsWithImages = []
+    for qnum, question_text, options in blocks:
+        skip, category = classify(question_text)
+        if skip:
+            print(f" Skipping {qnum} (image-based)")
+            questionsWithImages.append(qnum)
+            continue
+
+
+        if len(options) < 4:
+            print(f" Skipping question {qnum} — not enough options found ({len(options)}).")
+            continue
+
+        options_dict = {letter: text.strip() for letter, text in options}
+        correct_letter = mcq_answers.get(qnum, "")
+        correct_answer = options_dict.get(correct_letter, "")
+        wrong_answers = [ans for key, ans in options_dict.items() if key != correct_letter]
+        correct_answer = correct_answer.replace(';', '')
+        correct_answer = clean_answer(correct_answer)
+        wrong_answers = [clean_answer(ans) for ans in wrong_answers]
+        question_text = re.sub(r'\s+', ' ', question_text).strip()
+        correct_answer = re.sub(r'\s+', ' ', correct_answer).strip()
+        wrong_answers = [re.sub(r'\s+', ' ', ans).strip() for ans in wrong_answers]
+        # Extract options
+        data.append(questions.Question(
+            number=qnum,
+            category=category,
+            question=question_text,
+            correct=correct_answer,
+            wrong1=wrong_answers[0],
+            wrong2=wrong_answers[1],
+            wrong3=wrong_answers[2],
+        ))
+
+    return data, questionsWithImages
+
+
+def extract_exam(pdf_file, answer_file, remove=REMOVE, title=TITLE, last_page=LASTPAGE,
+                 dump_file="output.txt", answer_dump_file="outputAnswer.txt", parser=PARSER, subject=SUBJECT, year=None):
+    print(" Reading exam content from PDF...")
+    raw_text = exam_text(pdf_file, remove, title, last_page, dump_file)
+
+    print("getting answers...")
+    mcq_answers, open_answers = get_mcq_answers(answer_file, answer_dump_file, subject, year)
+
+    print(" Parsing questions...")
+    part1_text, part2_text = raw_text, ""
+    split_match = re.search(r"\bII dalis\b", raw_text, flags=re.IGNORECASE)
+    if split_match:
+        part1_text = raw_text[:split_match.start()]
+        part2_text = raw_text[split_match.start():]
+    else:
+        print(" Could not find 'II dalis'. Using full text as Part I.")
+
+    blocks = part1_blocks(pdf_file, part1_text, parser, remove, title, last_page)
+    data, questionsWithImages = mcq_rows(blocks, mcq_answers)
+
+    print(" Extracting open-ended questions from Part II...")
+    open_questions = extract_open_questions_from_part_ii(raw_text)
+
+    for q in open_questions:
+        q.correct = open_answers.get(q.number.zfill(2), "")
+
+    return data + open_questions, questionsWithImages
+
+
+# Gives every question its global id (by subject, year and tempNum, so a re-run gets the same ones);
+# the number it has in the exam moves to tempNum
+def number_questions(rows, subject, year, floor=question_ids.FIRST_ID):
+    for row in rows:
+        row.temp_num = row.temp_num or str(row.number)
+    keys = question_ids.row_keys(rows)
+    ids = question_ids.assign(subject, year, keys, floor)
+    for row, key in zip(rows, keys):
+        row.number = ids[key]
+
+
+@stages.stage(outputs=("output_excel",))
+def save_questions(rows, output_excel):
+    # === Export to Excel ===
+    print(f" Saving {len(rows)} questions to Excel...")
+    questions.save(rows, FIELDS, output_excel, pad_numbers=True)
+    print(f" Done! File saved to: {output_excel}")
 
 
 # === Main workflow ===
-print(" Reading exam content from PDF...")
-raw_text = extract_clean_text_from_pdf(PDF_FILE)
-raw_text = remove_header_footer_noise(raw_text)
-with open("output.txt", "w", encoding="utf-8") as f:
-    f.write(raw_text)
-
-print("getting answers...")
-mcq_answers, open_answers = get_mcq_answers(ANSWER_FILE)
-
-print(" Parsing questions...")
-part1_text, part2_text = raw_text, ""
-split_match = re.search(r"\bII dalis\b", raw_text, flags=re.IGNORECASE)
-if split_match:
-    part1_text = raw_text[:split_match.start()]
-    part2_text = raw_text[split_match.start():]
-else:
-    print(" Could not find 'II dalis'. Using full text as Part I.")
-
-question_blocks = re.split(r"(?=\d{2}\.\s)", part1_text)
-
-data = []
-
-for block in question_blocks:
-    block = block.strip()
-    print('\n')
-    print(block)
-    print('\n')
-    if not block:
-        continue
-
-    match = re.match(r"(?P<num>\d{2})\.\s(?P<question>.+?)(?=(\nA\s|$))", block, flags=re.DOTALL)
-    if not match:
-        continue
-
-    q = match.groupdict()
-    qnum = q["num"]
-    question_text = re.sub(r"\s+", " ", q["question"].strip())
-
-    if any(kw in question_text.lower() for kw in skip_keywords):
-        print(f" Skipping {qnum} (image-based)")
-        continue
-
-
-    options = re.findall(r"(?:^|\n)([A-D])\s+(.*?)(?=(?:\n[A-D]\s|$))", block, flags=re.DOTALL)
-
-    if len(options) < 4:
-        print(f" Skipping question {qnum} — not enough options found ({len(options)}).")
-        continue
-
-    options_dict = {letter: text.strip() for letter, text in options}
-    correct_letter = mcq_answers.get(qnum, "")
-    correct_answer = options_dict.get(correct_letter, "")
-    wrong_answers = [ans for key, ans in options_dict.items() if key != correct_letter]
-    correct_answer = correct_answer.replace(';', '')
-    correct_answer = clean_answer(correct_answer)
-    wrong_answers = [clean_answer(ans) for ans in wrong_answers]
-    question_text = re.sub(r'\s+', ' ', question_text).strip()
-    correct_answer = re.sub(r'\s+', ' ', correct_answer).strip()
-    wrong_answers = [re.sub(r'\s+', ' ', ans).strip() for ans in wrong_answers]
-    # Extract options
-    data.append({
-        "Question No.": qnum,
-        "Category": assign_category(question_text),
-        "Question": question_text,
-        "Correct Answer": correct_answer,
-        "Wrong Option 1": wrong_answers[0],
-        "Wrong Option 2": wrong_answers[1],
-        "Wrong Option 3": wrong_answers[2],
-        "fa_check": "FALSE"
-    })
-
-
-print(" Extracting open-ended questions from Part II...")
-open_questions = extract_open_questions_from_part_ii(raw_text)
-
-
-
-
-
-for q in open_questions:
-    qnum = q["Question No."].zfill(2)
-    q["Correct Answer"] = open_answers.get(qnum, "")
-    q["Wrong Option 1"] = ""
-    q["Wrong Option 2"] = ""
-    q["Wrong Option 3"] = ""
-
-# === Combine with MCQs
-mcq_df = pd.DataFrame(data)
-open_df = pd.DataFrame(open_questions)
-combined_df = pd.concat([mcq_df, open_df], ignore_index=True)
-combined_df["Question No."] = combined_df["Question No."].astype(str).str.zfill(2)
-
-# === Export to Excel ===
-print(f" Saving {len(combined_df)} questions to Excel...")
-df = pd.DataFrame(combined_df)
-df.to_excel(OUTPUT_EXCEL, index=False)
-print(f" Done! File saved to: {OUTPUT_EXCEL}")
+if __name__ == "__main__":
+    rows, questionsWithImages = extract_exam(PDF_FILE, ANSWER_FILE)
+    number_questions(rows, SUBJECT, answer_keys.exam_year(PDF_FILE))
+    save_questions(rows, OUTPUT_EXCEL)
+    print(" Cleanup rule hits:")
+    PAGE_RULES.report()
+    noise_rules(REMOVE, TITLE).report()
+    print(" Stage cache:")
+    stages.report()
@@ -0,0 +1,134 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import pdf_pages
+
+# ---------------------
+CHECKPOINT_FILE = ".cache/checkpoints.sqlite"
+# ---------------------
+
+# Work that costs money or minutes is written down as soon as each piece is done, so a run that
+# dies halfway continues where it stopped instead of starting over:
+#   - pages: every page Mathpix has read, keyed by the exam PDF's content hash, page number and
+#     render settings, with the rendered PNG's hash and the full OCR JSON. Kept until cleared, so
+#     unlike the Mathpix response cache (size-limited) a page once paid for stays read.
+#   - exams: the last exam a batch finished for each subject and year (its rows), keyed by its
+#     input files, options and extractor code, for batch.py --resume. A newer run of the same
+#     exam replaces it, so rows from an older parser never linger.
+
+_connection = None
+_lock = threading.Lock()
+
+
+def _db():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(CHECKPOINT_FILE) or ".", exist_ok=True)
+        _connection = sqlite3.connect(CHECKPOINT_FILE, timeout=30, check_same_thread=False)
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " pdf TEXT NOT NULL, page INTEGER NOT NULL, settings TEXT NOT NULL, png TEXT NOT NULL,"
+            " result TEXT NOT NULL, saved REAL NOT NULL, PRIMARY KEY (pdf, page, settings))"
+        )
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS exams ("
+            " key TEXT PRIMARY KEY, subject TEXT NOT NULL, year TEXT NOT NULL, result BLOB NOT NULL, saved REAL NOT NULL)"
+        )
+        _connection.commit()
+    return _connection
+
+
+def _settings(zoom, clip):
+    return json.dumps([zoom, [round(value, 3) for value in clip] if clip else None])
+
+
+# The OCR JSON saved for this page, or None if it has not been read yet
+def page_result(pdf_path, page_number, zoom, clip):
+    with _lock:
+        row = _db().execute("SELECT result FROM pages WHERE pdf = ? AND page = ? AND settings = ?",
+                            (pdf_pages.file_hash(pdf_path), page_number, _settings(zoom, clip))).fetchone()
+    return None if row is None else json.loads(row[0])
+
+
+def save_page(pdf_path, page_number, zoom, clip, png_bytes, result):
+    with _lock:
+        db = _db()
+        db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                   (pdf_pages.file_hash(pdf_path), page_number, _settings(zoom, clip),
+                    hashlib.sha256(png_bytes).hexdigest(), json.dumps(result, ensure_ascii=False), time.time()))
+        db.commit()
+
+
+# (done, outstanding) page numbers of an exam, for the given render settings per page
+def page_status(pdf_path, page_numbers, zoom, clips):
+    with _lock:
+        saved = set(_db().execute("SELECT page, settings FROM pages WHERE pdf = ?", (pdf_pages.file_hash(pdf_path),)))
+    done = [n for n, clip in zip(page_numbers, clips) if (n, _settings(zoom, clip)) in saved]
+    return done, [n for n in page_numbers if n not in done]
+
+
+def clear_pages(pdf_path):
+    with _lock:
+        db = _db()
+        db.execute("DELETE FROM pages WHERE pdf = ?", (pdf_pages.file_hash(pdf_path),))
+        db.commit()
+
+
+# Pages as people count them ("3-5, 8"), from 0-based page numbers
+def page_ranges(page_numbers):
+    ranges = []
+    for n in sorted(page_numbers):
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ", ".join(f"{a + 1}" if a == b else f"{a + 1}-{b + 1}" for a, b in ranges)
+
+
+# Same input files (by content) and options -> same exam result
+def exam_key(subject, year, files, options):
+    hashes = [pdf_pages.file_hash(path) for path in files]
+    return hashlib.sha256(json.dumps([subject, year, hashes, options], sort_keys=True).encode()).hexdigest()
+
+
+def exam_result(key):
+    with _lock:
+        row = _db().execute("SELECT result FROM exams WHERE key = ?", (key,)).fetchone()
+    return None if row is None else pickle.loads(row[0])
+
+
+def save_exam(key, subject, year, result):
+    with _lock:
+        db = _db()
+        db.execute("DELETE FROM exams WHERE subject = ? AND year = ?", (subject, year))
+        db.execute("INSERT INTO exams VALUES (?, ?, ?, ?, ?)",
+                   (key, subject, year, pickle.dumps(result, pickle.HIGHEST_PROTOCOL), time.time()))
+        db.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or clear saved OCR pages and finished batch exams")
+    parser.add_argument("--clear", nargs="*", metavar="PDF", help="forget the OCR pages of these PDFs")
+    parser.add_argument("--clear-exams", action="store_true", help="forget every finished batch exam")
+    args = parser.parse_args()
+    for pdf_file in args.clear or []:
+        clear_pages(pdf_file)
+        print(f" Forgot the OCR pages of {pdf_file}")
+    with _lock:
+        db = _db()
+        if args.clear_exams:
+            db.execute("DELETE FROM exams")
+            db.commit()
+        pages = db.execute("SELECT pdf, COUNT(*), MAX(saved) FROM pages GROUP BY pdf ORDER BY MAX(saved)").fetchall()
+        exams = db.execute("SELECT subject, year, COUNT(*) FROM exams GROUP BY subject, year ORDER BY subject, year").fetchall()
+    for digest, count, saved in pages:
+        print(f" {digest[:12]}: {count} pages read, last {time.strftime('%Y-%m-%d %H:%M', time.localtime(saved))}")
+    for subject, year, count in exams:
+        print(f" {subject} {year}: finished")
+    print(f" {sum(row[1] for row in pages)} OCR pages, {sum(row[2] for row in exams)} batch exams saved")
@@ -0,0 +1,150 @@
+import re
+import time
+
+import keywords
+import metrics
+
+# Cleanup rules are a declarative table applied top to bottom. Regex rules are compiled once
+# when the table is built; a run of consecutive literal rules is applied as a single step of
+# chained str.replace calls, which for the handful of literals a table holds is faster than
+# one regex scan over the alternation.
+
+
+def rule(name, pattern, replacement="", flags=0):
+    return "regex", name, pattern, replacement, flags
+
+
+def literal(name, text, replacement=""):
+    return "literal", name, text, replacement, 0
+
+
+class CleanupRules:
+    def __init__(self, rules):
+        self.steps = []
+        self.hits = {}
+        literals = []
+        for kind, name, pattern, replacement, flags in rules:
+            if not pattern:
+                continue  # an empty literal (e.g. no exam code) removes nothing
+            self.hits.setdefault(name, 0)
+            if kind == "literal":
+                literals.append((name, pattern, replacement))
+                continue
+            self._add_literals(literals)
+            literals = []
+            # Replacements are plain text, never templates
+            self.steps.append(("regex", re.compile(pattern, flags), name, replacement.replace("\\", "\\\\")))
+        self._add_literals(literals)
+
+    def _add_literals(self, literals):
+        if literals:
+            self.steps.append(("literals", literals, None, None))
+
+    def apply(self, text):
+        hits = self.hits
+        for kind, step, name, replacement in self.steps:
+            if metrics.ENABLED:
+                start = time.perf_counter()
+            if kind == "regex":
+                text, count = step.subn(replacement, text)
+                hits[name] += count
+            else:
+                for literal_name, old, new in step:
+                    if len(old) == len(new):
+                        hits[literal_name] += text.count(old)
+                        text = text.replace(old, new)
+                    else:
+                        length = len(text)
+                        text = text.replace(old, new)
+                        hits[literal_name] += (length - len(text)) // (len(old) - len(new))
+            if metrics.ENABLED:
+                # A run of literals is one step; it is reported under its first literal's name
+                label = name if kind == "regex" else step[0][0]
+                metrics.observe("cleanup_rule", time.perf_counter() - start, rule=label)
+        return text
+
+    # What the rules do, without the hit counters, for stage cache keys
+    def cache_key(self):
+        return self.steps
+
+    def unused(self):
+        return [name for name, count in self.hits.items() if count == 0]
+
+    def report(self):
+        width = max(map(len, self.hits), default=0)
+        for name, count in sorted(self.hits.items(), key=lambda item: -item[1]):
+            print(f"   {name:<{width}}  {count}")
+
+
+def _overlaps(x, y):
+    # Offsets d at which y, shifted by d, overlaps x without disagreeing on any character
+    for d in range(1 - len(y), len(x)):
+        lo, hi = max(0, d), min(len(x), d + len(y))
+        if x[lo:hi] == y[lo - d:hi - d]:
+            yield d
+
+
+def _wrap(x, y, d, middle):
+    # The parts of y (placed at offset d) sticking out either side of x, around `middle`
+    left = y[:-d] if d < 0 else ""
+    right = y[len(x) - d:] if d + len(y) > len(x) else ""
+    return left + middle + right
+
+
+class _Cascade(Exception):
+    pass
+
+
+# Compiles an ordered {wrong: correct} table into one leftmost-longest regex pass that gives the
+# same result as calling str.replace for each entry in order. A fix can only feed or break another
+# through the text around it, so the single pass is used where every match stands alone: the
+# pattern also contains every string where a key, or anything it passes through on its way down
+# the chain, overlaps another key, or where a removal joins the halves of one; and two matches
+# closer than the longest key may feed each other. Any of these (rare in OCR text) sends the
+# text through the ordered chain instead.
+def compile_replacements(mapping):
+    pairs = [(old, new) for old, new in mapping.items() if old]
+    reach = max((len(old) for old, _ in pairs), default=0)
+
+    def sequential(text):
+        for old, new in pairs:
+            text = text.replace(old, new)
+        return text
+
+    table = {old: sequential(old) for old, _ in pairs}
+    for a in list(table):
+        steps = {a}
+        text = a
+        for old, new in pairs:
+            text = text.replace(old, new)
+            steps.add(text)
+        for b, _ in pairs:
+            for step in steps:
+                if step:
+                    interactions = {_wrap(step, b, d, a) for d in _overlaps(step, b)}
+                else:
+                    interactions = {b[:k] + a + b[k:] for k in range(1, len(b))}
+                for key in interactions:
+                    table.setdefault(key, None)
+
+    pattern = re.compile(keywords.trie_pattern(table))
+
+    def fix(text):
+        last_end = -reach
+
+        def substitute(match):
+            nonlocal last_end
+            value = table[match.group()]
+            if value is None or match.start() - last_end < reach:
+                raise _Cascade
+            last_end = match.end()
+            return value
+
+        try:
+            return pattern.sub(substitute, text)
+        except _Cascade:
+            metrics.count("char_fix_fallbacks")
+            return sequential(text)
+
+    fix.cache_key = lambda: pairs  # the ordered table decides the output; the compiled form follows from it
+    return fix
@@ -0,0 +1,274 @@
+import argparse
+import csv
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+import zlib
+
+import numpy as np
+
+import questions
+
+# ---------------------
+INDEX_FILE = ".cache/duplicates.sqlite"
+THRESHOLD = 0.8   # estimated Jaccard similarity from which two questions count as near duplicates
+SHINGLE = 5       # characters per shingle
+PERMUTATIONS = 128
+BANDS = 32        # LSH bands of PERMUTATIONS // BANDS rows: pairs above ~0.5 similarity almost always meet
+# ---------------------
+
+# Every exported question is indexed by a MinHash signature of its normalized text (question plus
+# options, in any order) and stored in sqlite under (subject, year, position in the exam), so the
+# index grows year by year and only questions whose text changed are hashed again. Candidates come
+# from LSH buckets (questions agreeing on every row of some band), never from comparing all pairs;
+# a candidate is a duplicate when the texts are equal, or a near duplicate when its signatures
+# agree on at least THRESHOLD of the permutations.
+
+OPTION_FIELDS = ("correct", "wrong1", "wrong2", "wrong3")
+ROWS = PERMUTATIONS // BANDS
+PRIME = (1 << 61) - 1
+
+_random = np.random.RandomState(1658)  # fixed: signatures in the index must stay comparable
+_A = _random.randint(1, PRIME, PERMUTATIONS, dtype=np.uint64)
+_B = _random.randint(0, PRIME, PERMUTATIONS, dtype=np.uint64)
+
+_connection = None
+_lock = threading.Lock()
+_entries = {}   # (subject, year, position) -> (digest, signature, number, text)
+_digests = {}   # digest -> {key}
+_buckets = {}   # (band, band bytes) -> {key}
+
+
+def _db():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(INDEX_FILE) or ".", exist_ok=True)
+        _connection = sqlite3.connect(INDEX_FILE, timeout=30, check_same_thread=False)
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            " subject TEXT NOT NULL, year TEXT NOT NULL, position INTEGER NOT NULL, number TEXT NOT NULL,"
+            " text TEXT NOT NULL, digest TEXT NOT NULL, signature BLOB NOT NULL, PRIMARY KEY (subject, year, position))"
+        )
+        _connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # Signatures from another hash (seed, permutations, shingles) can't be compared with new ones
+        probe = signature("signature probe").tobytes().hex()
+        stored = _connection.execute("SELECT value FROM meta WHERE key = 'probe'").fetchone()
+        if stored != (probe,):
+            if _connection.execute("DELETE FROM questions").rowcount:
+                print(f" {INDEX_FILE} was built with another MinHash; index the banks again")
+            _connection.execute("INSERT OR REPLACE INTO meta VALUES ('probe', ?)", (probe,))
+        _connection.commit()
+        for subject, year, position, number, text, digest, blob in _connection.execute("SELECT * FROM questions"):
+            _remember((subject, year, position), digest, np.frombuffer(blob, dtype=np.uint32), number, text)
+    return _connection
+
+
+# Lower case, letters and digits only; options sorted, since years reshuffle them. Image links
+# stand for options that could not be read, so they are left out.
+def normalize(row):
+    options = sorted(_clean(getattr(row, field)) for field in OPTION_FIELDS
+                     if getattr(row, field) and not str(getattr(row, field)).startswith("http"))
+    return " | ".join([_clean(row.question)] + options)
+
+
+def _clean(value):
+    text = unicodedata.normalize("NFKC", str(value or "")).lower()
+    return " ".join(re.findall(r"\w+", text))
+
+
+def signature(text):
+    grams = {text[i:i + SHINGLE] for i in range(max(1, len(text) - SHINGLE + 1))}
+    hashes = np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+    # One universal hash per permutation: (a * h + b) mod p, keeping the minimum over the shingles
+    permuted = (_mulmod(_A, hashes[:, None]) + _B) % PRIME & 0xFFFFFFFF
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+# a * h mod PRIME without leaving uint64, for a < PRIME and h < 2**32 (a crc32): a is split into
+# 32-bit halves, and the high product moved up 32 bits folds back using 2**61 = 1 (mod PRIME)
+def _mulmod(a, h):
+    high = (a >> np.uint64(32)) * h            # < 2**61
+    low = (a & np.uint64(0xFFFFFFFF)) * h      # < 2**64
+    folded = ((high >> np.uint64(29)) + ((high & np.uint64(0x1FFFFFFF)) << np.uint64(32))
+              + (low & np.uint64(PRIME)) + (low >> np.uint64(61)))  # < 2**63
+    return folded % np.uint64(PRIME)
+
+
+def _bands(signature):
+    raw = signature.tobytes()
+    width = ROWS * signature.itemsize
+    return [(band, raw[band * width:(band + 1) * width]) for band in range(BANDS)]
+
+
+def _remember(key, digest, signature, number, text):
+    _entries[key] = (digest, signature, number, text)
+    _digests.setdefault(digest, set()).add(key)
+    for bucket in _bands(signature):
+        _buckets.setdefault(bucket, set()).add(key)
+
+
+def _forget(key):
+    digest, signature, _, _ = _entries.pop(key)
+    _digests[digest].discard(key)
+    for bucket in _bands(signature):
+        _buckets[bucket].discard(key)
+
+
+# Puts one exam's questions in the index, replacing what it held for that exam; returns how many
+# were hashed (new or changed text)
+def index_exam(subject, year, rows):
+    hashed = 0
+    with _lock:
+        db = _db()
+        old = {key: _entries[key] for key in _entries if key[:2] == (subject, year)}
+        for key in old:
+            _forget(key)
+        db.execute("DELETE FROM questions WHERE subject = ? AND year = ?", (subject, year))
+        reuse = {entry[0]: entry[1] for entry in old.values()}
+        for position, row in enumerate(rows):
+            text = normalize(row)
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            if digest not in reuse:
+                reuse[digest] = signature(text)
+                hashed += 1
+            key = (subject, year, position)
+            number = str(row.number if row.number is not None else row.temp_num or position + 1)
+            _remember(key, digest, reuse[digest], number, row.question[:200])
+            db.execute("INSERT INTO questions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (subject, year, position, number, row.question[:200], digest, reuse[digest].tobytes()))
+        db.commit()
+    return hashed
+
+
+# [(other key, similarity, exact?)] for every indexed question that duplicates this one
+def matches(key, threshold=THRESHOLD):
+    with _lock:
+        _db()
+        digest, signature, _, _ = _entries[key]
+        candidates = set(_digests[digest])
+        for bucket in _bands(signature):
+            candidates |= _buckets[bucket]
+        candidates.discard(key)
+        found = []
+        for other in candidates:
+            other_digest, other_signature, _, _ = _entries[other]
+            if other_digest == digest:
+                found.append((other, 1.0, True))
+                continue
+            similarity = float(np.count_nonzero(signature == other_signature)) / PERMUTATIONS
+            if similarity >= threshold:
+                found.append((other, similarity, False))
+    return sorted(found, key=lambda match: _order(match[0]))
+
+
+def label(key):
+    return f"{key[0]} {key[1]} {_entries[key][2]}"
+
+
+# Indexes every (subject, year, rows) and marks each question that repeats an earlier one (by
+# year, then subject, then position; the whole archive counts) in its duplicate_of field.
+# Returns (exact, near) counts.
+def flag(exams, threshold=THRESHOLD):
+    for subject, year, rows in exams:
+        index_exam(subject, year, rows)
+    exact = near = 0
+    for subject, year, rows in exams:
+        for position, row in enumerate(rows):
+            key = (subject, year, position)
+            earlier = [match for match in matches(key, threshold) if _order(match[0]) < _order(key)]
+            row.duplicate_of = ""
+            if not earlier:
+                continue
+            # Exact copies before near ones, then the most similar, then the oldest
+            other, similarity, is_exact = min(earlier, key=lambda match: (not match[2], -match[1], _order(match[0])))
+            row.duplicate_of = label(other) if is_exact else f"{label(other)} (~{similarity:.2f})"
+            exact += is_exact
+            near += not is_exact
+    return exact, near
+
+
+def _order(key):
+    return key[1], key[0], key[2]
+
+
+# Groups of two or more questions that duplicate each other, oldest first
+def clusters(threshold=THRESHOLD):
+    with _lock:
+        _db()
+        keys = sorted(_entries, key=_order)
+    parent = {key: key for key in keys}
+
+    def root(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for key in keys:
+        for other, _, _ in matches(key, threshold):
+            a, b = root(key), root(other)
+            if a != b:
+                parent[max(a, b, key=_order)] = min(a, b, key=_order)
+    groups = {}
+    for key in keys:
+        groups.setdefault(root(key), []).append(key)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def write_report(groups, output_file):
+    with open(output_file, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Group", "Subject", "Year", "Question No.", "Similarity", "Question"])
+        for number, group in enumerate(groups, 1):
+            first = _entries[group[0]][1]
+            for key in group:
+                similarity = float(np.count_nonzero(first == _entries[key][1])) / PERMUTATIONS
+                writer.writerow([number, key[0], key[1], _entries[key][2], f"{similarity:.2f}", _entries[key][3]])
+
+
+# Rows of an exported bank (.xlsx / .csv / .jsonl), grouped into (subject, year, rows) by its
+# Subject and Year columns, or by file name for single-exam files
+def read_bank(path):
+    import pandas as pd
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".xlsx":
+        table = pd.read_excel(path, dtype=str)
+    elif extension == ".csv":
+        table = pd.read_csv(path, dtype=str)
+    elif extension == ".jsonl":
+        table = pd.read_json(path, lines=True, dtype=str)
+    else:
+        raise ValueError(f"Unsupported bank format {extension!r}; use .xlsx, .csv or .jsonl")
+    table = table.fillna("")
+    fields = {header: field for field, header in questions.HEADERS.items() if header in table.columns}
+    default_subject = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    default_year = os.path.splitext(os.path.basename(path))[0]
+    exams = {}
+    for record in table.to_dict("records"):
+        row = questions.Question(**{field: record[header] for header, field in fields.items()})
+        exam = (row.subject or default_subject, row.year or default_year)
+        exams.setdefault(exam, []).append(row)
+    return [(subject, year, rows) for (subject, year), rows in sorted(exams.items())]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find repeated questions across every indexed exam")
+    parser.add_argument("banks", nargs="*", help="exported question files to add to the index first")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--report", default="surinkti/duplicates.csv", help="CSV with one line per duplicated question")
+    parser.add_argument("--rebuild", action="store_true", help="empty the index before adding the banks")
+    args = parser.parse_args()
+    if args.rebuild and os.path.exists(INDEX_FILE):
+        os.remove(INDEX_FILE)
+    for bank in args.banks:
+        for subject, year, rows in read_bank(bank):
+            print(f" {subject} {year}: {len(rows)} questions, {index_exam(subject, year, rows)} hashed")
+    groups = clusters(args.threshold)
+    print(f" {len(_entries)} questions indexed, {sum(map(len, groups))} in {len(groups)} groups of duplicates")
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    write_report(groups, args.report)
+    print(f" Report written to {args.report}")
@@ -0,0 +1,219 @@
+import functools
+import os
+
+import pymupdf
+
+import layout
+import metrics
+import pdf_pages
+
+# ---------------------
+FIGURE_DIR = "images"  # where math.py's snips went; Supabase names: {id}.png, {id}-N.png
+ZOOM = 2.0
+MARGIN = 4.0       # points of white space kept around a figure
+MERGE_GAP = 6.0    # points; drawings and images closer than this belong to one figure
+LABEL_GAP = 12.0   # points; text blocks this close to a figure and no larger are its labels
+MIN_SIZE = 20.0    # points; smaller regions are rules, underlines and answer blanks
+# ---------------------
+
+# Figures of image questions are cut straight from the exam PDF instead of being snipped by hand.
+# A figure is a cluster of embedded images (get_images) and vector paths (get_drawings), grown by
+# the text blocks that fit around it (axis labels, table cells). Each question owns the part of
+# its page between its number and the next question's number; a figure there that sits above the
+# first option letter is the question's ({id}.png), one at or below it goes to the nearest option
+# letter ({id}-N.png). Pages are handled in the page pool, each worker rendering only the clips.
+
+# One question to crop: the id its files are named after, and {option letter: N} for options that
+# are pictures ({id}-N.png); question says whether the question itself needs {id}.png
+class Request:
+    __slots__ = ("pdf_file", "first_page", "last_page", "temp_num", "qid", "question", "options")
+
+    def __init__(self, pdf_file, first_page, last_page, temp_num, qid, question=True, options=None):
+        self.pdf_file = pdf_file
+        self.first_page = first_page
+        self.last_page = last_page
+        self.temp_num = temp_num
+        self.qid = qid
+        self.question = question
+        self.options = options or {}
+
+
+# {number: (page number, top, {letter: (x0, top)}, bottom)} for Part I, from word positions like
+# layout.mcq_blocks. A question ends where the next one (or Part II) starts on its page; bottom is
+# None when it runs to the end of the page. Only its first page is looked at.
+def question_spans(pdf_path, first_page, last_page):
+    last_page = min(last_page, pdf_pages.page_count(pdf_path))
+    spans = {}
+    bottoms = {}  # number -> top of whatever ends it on its page
+    number_x = None
+    current = None
+    for page_number in range(first_page - 1, last_page):
+        for row in layout.page_rows(pdf_path, page_number):
+            first = row[0]
+            top = min(word[1] for word in row)
+            if layout.PART_II.search(" ".join(word[4] for word in row)):
+                if current and spans[current][0] == page_number:
+                    bottoms[current] = top
+                return {number: (*span, bottoms.get(number)) for number, span in spans.items()}
+            if layout.QUESTION_NUMBER.fullmatch(first[4]) and (number_x is None or abs(first[0] - number_x) <= layout.NUMBER_TOLERANCE):
+                if current and spans[current][0] == page_number:
+                    bottoms[current] = top
+                number_x = first[0]
+                current = first[4][:2]
+                spans[current] = (page_number, top, {})
+                row = row[1:]
+            if current is None or spans[current][0] != page_number:
+                continue
+            letters = spans[current][2]
+            previous_x1 = None
+            for x0, y0, x1, _, word in row:
+                gap = previous_x1 is None or x0 - previous_x1 >= layout.OPTION_GAP
+                previous_x1 = x1
+                if gap and len(letters) < len(layout.LETTERS) and word == layout.LETTERS[len(letters)]:
+                    letters[word] = (x0, y0)
+    return {number: (*span, bottoms.get(number)) for number, span in spans.items()}
+
+
+def _near(a, b, gap):
+    # Plain coordinates: MuPDF treats a line's zero-height rect as empty and never intersecting
+    return a[0] - gap <= b[2] and b[0] <= a[2] + gap and a[1] - gap <= b[3] and b[1] <= a[3] + gap
+
+
+def _union(a, b):
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def _merge(rects, gap):
+    regions = []
+    for rect in rects:
+        for i, region in enumerate(regions):
+            if _near(rect, region, gap):
+                regions[i] = _union(region, rect)
+                break
+        else:
+            regions.append(rect)
+    # Two clusters can meet through a path added after both started
+    while True:
+        merged = []
+        for region in regions:
+            for i, other in enumerate(merged):
+                if _near(region, other, gap):
+                    merged[i] = _union(other, region)
+                    break
+            else:
+                merged.append(region)
+        if len(merged) == len(regions):
+            return merged
+        regions = merged
+
+
+# (x0, y0, x1, y1) of the figures drawn on one page, top to bottom, and the page's rect
+def page_figures(pdf_path, page_number):
+    page = pdf_pages.open_pdf(pdf_path)[page_number]
+    rects = [tuple(rect) for image in page.get_images(full=True) for rect in page.get_image_rects(image[0])]
+    rects += [tuple(drawing["rect"]) for drawing in page.get_drawings()]
+    width, height = page.rect.width, page.rect.height
+    figures = []
+    for region in _merge(rects, MERGE_GAP):
+        if region[2] - region[0] < MIN_SIZE or region[3] - region[1] < MIN_SIZE:
+            continue
+        if region[2] - region[0] > 0.9 * width and region[3] - region[1] > 0.9 * height:
+            continue  # a page frame
+        for block in pdf_pages.page_blocks(pdf_path, page_number):
+            if _near(region, block[:2] * 2, LABEL_GAP) and _near(region, block[2:4] * 2, LABEL_GAP):
+                region = _union(region, block[:4])
+        figures.append(region)
+    return sorted(figures, key=lambda rect: (rect[1], rect[0])), page.rect
+
+
+def _nearest_letter(figure, letters):
+    # Option letters stand left of or above their picture
+    def distance(item):
+        x, y = item[1]
+        dx = max(0.0, x - figure[2], figure[0] - x)
+        dy = max(0.0, y - figure[3], figure[1] - y)
+        return dx * dx + dy * dy
+    return min(letters.items(), key=distance)[0]
+
+
+def _inside(figure, top, bottom):
+    return top <= (figure[1] + figure[3]) / 2 < (bottom if bottom is not None else float("inf"))
+
+
+# (qid, file name, clip) for each figure of the page's questions;
+# page_questions: [(qid, top, bottom or None, letters, wants the question figure, {letter: N})];
+# first_top: where the page's first question starts
+def page_clips(pdf_path, page_number, page_questions, first_top):
+    figures, page_rect = page_figures(pdf_path, page_number)
+    spans = [(top, bottom if bottom is not None else page_rect.y1) for _, top, bottom, _, _, _ in page_questions]
+    owned = [[figure for figure in figures if _inside(figure, top, bottom)] for top, bottom in spans]
+    # Figures above the page's first question (the end of one started on the page before) belong
+    # to no question; an image question with no figure of its own takes the nearest of them
+    loose = [figure for figure in figures if _inside(figure, page_rect.y0, first_top)]
+    clips = []
+    for (qid, top, _, letters, question, options), (_, bottom), own in zip(page_questions, spans, owned):
+        first_letter = min((y for _, y in letters.values()), default=None)
+        parts = {}
+        for figure in own:
+            if options and first_letter is not None and figure[3] > first_letter:
+                letter = _nearest_letter(figure, letters)
+                if letter in options:
+                    parts.setdefault(f"{qid}-{options[letter]}.png", []).append(figure)
+                    continue
+            if question and (first_letter is None or figure[1] < first_letter):
+                parts.setdefault(f"{qid}.png", []).append(figure)
+        if question and f"{qid}.png" not in parts and (own or loose):
+            middle = (top + bottom) / 2
+            parts[f"{qid}.png"] = [min(own or loose, key=lambda figure: abs((figure[1] + figure[3]) / 2 - middle))]
+        for name, rects in parts.items():
+            x0, y0, x1, y1 = functools.reduce(_union, rects)
+            clip = pymupdf.Rect(x0 - MARGIN, y0 - MARGIN, x1 + MARGIN, y1 + MARGIN) & page_rect
+            clips.append((qid, name, tuple(clip)))
+    return clips
+
+
+# Runs in a pool worker: finds and renders one page's figures; returns (qid, file name) written
+def _crop_page(pdf_path, page_number, page_questions, first_top, output_dir, zoom):
+    written = []
+    for qid, name, clip in page_clips(pdf_path, page_number, page_questions, first_top):
+        path = os.path.join(output_dir, name)
+        tmp_file = path + f".{os.getpid()}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(pdf_pages.render_png(pdf_path, page_number, zoom, clip))
+        os.replace(tmp_file, path)
+        written.append((qid, name))
+    return written
+
+
+# Crops every request's figures into output_dir; returns {qid: [file names written]}. A request
+# whose question could not be found on the pages, or has no figure near it, gets nothing.
+def crop(requests, output_dir=FIGURE_DIR, zoom=ZOOM):
+    jobs = {}
+    exams = {}
+    first_tops = {}  # (pdf file, page number) -> top of the page's first question
+    for request in requests:
+        exam = (request.pdf_file, request.first_page, request.last_page)
+        if exam not in exams:
+            exams[exam] = question_spans(*exam)
+            for page_number, top, _, _ in exams[exam].values():
+                key = (request.pdf_file, page_number)
+                first_tops[key] = min(top, first_tops.get(key, top))
+        if request.temp_num not in exams[exam]:
+            continue
+        page_number, top, letters, bottom = exams[exam][request.temp_num]
+        jobs.setdefault((request.pdf_file, page_number), []).append(
+            (request.qid, top, bottom, letters, request.question, request.options))
+
+    written = {}
+    if not jobs:
+        return written
+    os.makedirs(output_dir, exist_ok=True)
+    with metrics.timer("figures"):
+        results = pdf_pages.map_pages(_crop_page, [
+            (pdf_file, page_number, page_questions, first_tops[pdf_file, page_number], output_dir, zoom)
+            for (pdf_file, page_number), page_questions in sorted(jobs.items())])
+    for names in results:
+        for qid, name in names:
+            written.setdefault(qid, []).append(name)
+    metrics.count("figures_cropped", sum(map(len, written.values())))
+    return written
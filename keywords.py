@@ -0,0 +1,59 @@
+import re
+
+# A keyword set is compiled into one prefix-factored regex (a trie), so the text is scanned once
+# in C no matter how many keywords there are.
+
+
+def trie_pattern(keys):
+    # Alternation factored by common prefix, so each position costs one character test, not one per key
+    trie = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        ends = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Longer keys are tried first, so the longest key matching at a position wins
+        return "(?:" + body + ")?" if ends else body
+
+    return build(trie)
+
+
+# Finds which keyword groups occur in a text. Groups are {label: [keywords]} in priority order;
+# find() returns the labels present, highest priority first. Matching is plain substring search,
+# so callers lowercase the text (and keywords) themselves when they want case-insensitive matches.
+class KeywordMatcher:
+    def __init__(self, groups):
+        self.priority = {label: i for i, label in enumerate(groups)}
+        labels = {}
+        for label, words in groups.items():
+            for word in words:
+                if word:
+                    labels.setdefault(word, set()).add(label)
+
+        # The scan reports the longest keyword starting at each position; shorter keywords that
+        # start there too are its prefixes, so their labels are folded in up front
+        self.labels = {}
+        for word in labels:
+            self.labels[word] = set().union(*(labels[word[:k]] for k in range(1, len(word) + 1) if word[:k] in labels))
+
+        # Zero-width lookahead: every start position is tried, so overlapping keywords are all seen
+        self.pattern = re.compile("(?=(" + trie_pattern(labels) + "))") if labels else None
+
+    def find(self, text):
+        if self.pattern is None:
+            return []
+        found = set()
+        for word in set(self.pattern.findall(text)):
+            found |= self.labels[word]
+        return sorted(found, key=self.priority.__getitem__)
+
+    def first(self, text, default=None):
+        found = self.find(text)
+        return found[0] if found else default
@@ -0,0 +1,178 @@
+import re
+
+import metrics
+
+# Plain exam text -> text with $$...$$ LaTeX for units, Greek letters, isotopes and fractions.
+#
+# RULES is the conversion as an ordered chain: each rule runs over the whole text in turn, and
+# a later rule sees what the earlier ones wrote ("λ" becomes "\lambda", which the Greek-name rule
+# then wraps; "1 2" becomes "1/2", which the fraction rule then turns into \frac). convert() gets
+# the same result from one tokenizing pass: every rule is an alternative of a single regex, listed
+# in chain order so that at any position the earlier rule wins. A token whose neighbours could let
+# rules interact in a way one pass cannot see (an isotope or fraction touching more digits, a
+# unit's last digit starting another unit, a Greek symbol glued to a number) sends that text
+# through the ordered chain instead. Those are rare; bench_latex.py checks both give the same.
+
+UNICODE_LETTERS = {
+    "𝑃": "P", "𝑡": "t", "𝑐": "c", "ℎ": "h", "λ": "\\lambda",
+    "𝑄": "Q", "𝑣": "v", "𝑚": "m", "𝑉": "V",
+}
+SYMBOLS = {
+    "α": "$$\\alpha$$", "β": "$$\\beta$$", "λ": "$$\\lambda$$", "\uf06c": "$$\\lambda$$",
+    "°": "$$^{\\circ}$$", "\uf0b0": "$$^{\\circ}$$", "Ω": "$$\\Omega$$",
+}
+
+
+def _isotope_sorted(symbol, first, second):
+    # "Pu 94 239": the smaller number is the atomic number, the larger the mass
+    first, second = int(first), int(second)
+    mass, atomic = (second, first) if first < second else (first, second)
+    return f"$$^{{{mass}}}_{{{atomic}}}\\mathrm{{{symbol}}}$$"
+
+
+RULES = [
+    ("m/s2", r"(\d+)\s*m/s2", r"$$\1\\ \\mathrm{m/s^{2}}$$"),
+    ("m/s^2", r"(\d+)\s*m/s\^2", r"$$\1\\ \\mathrm{m/s^{2}}$$"),
+    ("m3", r"(\d+(?:[.,]\d+)?)\s*m3", r"$$\1\\ \\mathrm{m^{3}}$$"),
+    ("m^3", r"(\d+(?:[.,]\d+)?)\s*m\^3", r"$$\1\\ \\mathrm{m^{3}}$$"),
+    ("celsius", r"(\d+)\s*°C", r"$$\1\\,^{\\circ}\\mathrm{C}$$"),
+    ("unicode letters", UNICODE_LETTERS, None),
+    ("alfa", r"(?i)\balfa\b", r"$$\\alpha$$"),
+    ("beta", r"(?i)\bbeta\b", r"$$\\beta$$"),
+    ("lambda", r"(?i)\blambda\b", r"$$\\lambda$$"),
+    ("symbols", SYMBOLS, None),
+    # Isotopes before fractions, so "239 Pu 94" is not read as numbers
+    ("isotope", r"(\d{2,3})\s*([A-Z][a-z]?)\s*(\d{1,3})", r"$$^{\1}_{\3}\\mathrm{\2}$$"),
+    ("isotope slash", r"([A-Z][a-z]?)\s*(\d{2,3})\s*/\s*(\d{1,3})", r"$$^{\2}_{\3}\\mathrm{\1}$$"),
+    ("isotope pair", r"\b([A-Z][a-z]?)\s+(\d{1,3})\s+(\d{1,3})\b", lambda match: _isotope_sorted(*match.groups())),
+    ("fraction pair", r"\b(\d+)\s+(\d+)\b", r"\1/\2"),
+    ("fraction", r"\b(\d+)\s*/\s*(\d+)\b", r"$$\\frac{\1}{\2}$$"),
+]
+
+_CHAIN = [(re.compile(pattern), replacement) if replacement is not None else (None, pattern)
+          for _, pattern, replacement in RULES]
+
+
+# The rules one after another over the whole text
+def convert_chained(text):
+    for pattern, replacement in _CHAIN:
+        if pattern is None:
+            for old, new in replacement.items():
+                text = text.replace(old, new)
+        else:
+            text = pattern.sub(replacement, text)
+    return text
+
+
+# ---- single pass ----
+
+_UPPER = "A-Z𝑃𝑄𝑉"    # [A-Z] once the Unicode letters are replaced
+_LOWER = "a-z𝑡𝑐𝑣𝑚ℎ"
+_GREEK = "(?i:alfa|be[t𝑡]a|la[m𝑚]bda)"  # after the Unicode letters, "be𝑡a" is "beta" too
+
+TOKEN = re.compile("|".join([
+    r"(?P<speed>(?P<speed_n>\d+)\s*m/s\^?2)",
+    r"(?P<volume>(?P<volume_n>\d+(?:[.,]\d+)?)\s*m\^?3)",
+    r"(?P<celsius>(?P<celsius_n>\d+)\s*°C)",
+    # \b on the right, except that "λ" after the word is about to become "\lambda"
+    rf"(?P<greek>(?<!\w){_GREEK}(?=\W|λ|\Z))",
+    rf"(?P<greek_digit>(?<!\w){_GREEK}(?=\d))",
+    rf"(?P<isotope>(?P<isotope_a>\d{{2,3}})\s*(?P<isotope_s>[{_UPPER}][{_LOWER}]?)\s*(?P<isotope_z>\d{{1,3}}))",
+    rf"(?P<isotope_slash>(?P<slash_s>[{_UPPER}][{_LOWER}]?)\s*(?P<slash_a>\d{{2,3}})\s*/\s*(?P<slash_z>\d{{1,3}}))",
+    rf"(?P<isotope_pair>\b(?P<pair_s>[{_UPPER}][{_LOWER}]?)\s+(?P<pair_1>\d{{1,3}})\s+(?P<pair_2>\d{{1,3}})\b)",
+    r"(?P<fraction>\b(?P<numerator>\d+)(?:\s+|\s*/\s*)(?P<denominator>\d+)\b)",
+    r"(?P<lambda>λ)",
+    "(?P<char>[" + "".join(sorted(set(UNICODE_LETTERS) | set(SYMBOLS))) + "])",
+]))
+
+_UNIT_AFTER = re.compile(r"(?:[.,]\d+)?\s*(?:m/s\^?2|m\^?3|°C)")
+_UNIT_TAIL = re.compile(r"\d*(?:[.,]\d+)?\s*(?:m|°C)")
+_ISOTOPE_CHARS = frozenset("/" + "".join(chr(c) for c in range(ord("A"), ord("Z") + 1)) + "𝑃𝑄𝑉")
+_LETTERS = frozenset("".join(chr(c) for c in range(ord("a"), ord("z") + 1)) + "𝑡𝑐𝑣𝑚ℎ") | _ISOTOPE_CHARS - {"/"}
+_CHAR_MAP = {**SYMBOLS, **UNICODE_LETTERS}
+_CHAR_MAP.pop("λ")
+
+
+class _Cascade(Exception):
+    pass
+
+
+def _letters(symbol):
+    return "".join(UNICODE_LETTERS.get(char, char) for char in symbol)
+
+
+def _touches(text, start, end):
+    # A token turning word characters into "$$": its neighbours see a \b they did not have before
+    before = text[start - 1] if start else ""
+    after = text[end] if end < len(text) else ""
+    return any(char.isdecimal() or char in _LETTERS for char in (before, after))
+
+
+def _isolated(text, start, end):
+    # An isotope or fraction: nothing next to it (across spaces) that another rule could join
+    if end < len(text):
+        after = end
+        while after < len(text) and text[after].isspace():
+            after += 1
+        if after < len(text) and (text[after].isdecimal() or text[after] in _ISOTOPE_CHARS):
+            return False
+        if _UNIT_AFTER.match(text, end):
+            return False  # the last number is a unit's value, converted first
+    if start:
+        before = start - 1
+        while before >= 0 and text[before].isspace():
+            before -= 1
+        if before >= 0:
+            char = text[before]
+            if char.isdecimal() or char in _ISOTOPE_CHARS:
+                return False
+            if char in _LETTERS and before and text[before - 1] in _ISOTOPE_CHARS:
+                return False  # "Pu 12 34": the element of an isotope pair
+    return True
+
+
+def _token(match):
+    kind = match.lastgroup
+    text = match.string
+    start, end = match.span()
+    if kind == "char":
+        char = match.group()
+        if char in "αβΩ" and _touches(text, start, end):
+            raise _Cascade
+        return _CHAR_MAP[char]
+    if kind == "lambda":
+        if start and (text[start - 1].isdecimal() or text[start - 1] in _LETTERS):
+            raise _Cascade
+        after = text[end] if end < len(text) else ""
+        if after.isdecimal():
+            raise _Cascade
+        return "\\$$\\lambda$$" if not after or after == "λ" or not (after.isalnum() or after == "_") else "\\lambda"
+    if kind in ("speed", "volume", "celsius"):
+        if _touches(text, start, end) or kind != "celsius" and _UNIT_TAIL.match(text, end):
+            raise _Cascade  # "5 m3 m/s2": the 3 is also the value of the next unit
+        if kind == "celsius":
+            return f"$${match.group('celsius_n')}\\,^{{\\circ}}\\mathrm{{C}}$$"
+        if kind == "speed":
+            return f"$${match.group('speed_n')}\\ \\mathrm{{m/s^{{2}}}}$$"
+        return f"$${match.group('volume_n')}\\ \\mathrm{{m^{{3}}}}$$"
+    if kind == "greek":
+        return "$$\\" + {"a": "alpha", "b": "beta", "l": "lambda"}[match.group()[0].lower()] + "$$"
+    if kind == "greek_digit":
+        raise _Cascade
+    if not _isolated(text, start, end):
+        raise _Cascade
+    if kind == "fraction":
+        return f"$$\\frac{{{match.group('numerator')}}}{{{match.group('denominator')}}}$$"
+    if kind == "isotope":
+        return f"$$^{{{match.group('isotope_a')}}}_{{{match.group('isotope_z')}}}\\mathrm{{{_letters(match.group('isotope_s'))}}}$$"
+    if kind == "isotope_slash":
+        return f"$$^{{{match.group('slash_a')}}}_{{{match.group('slash_z')}}}\\mathrm{{{_letters(match.group('slash_s'))}}}$$"
+    return _isotope_sorted(_letters(match.group("pair_s")), match.group("pair_1"), match.group("pair_2"))
+
+
+def convert(text):
+    try:
+        return TOKEN.sub(_token, text)
+    except _Cascade:
+        metrics.count("latex_fallbacks")
+        return convert_chained(text)
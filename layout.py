@@ -0,0 +1,99 @@
+import re
+
+import pdf_pages
+
+# ---------------------
+ROW_TOLERANCE = 3.0  # points; words whose baselines are this close are on the same row
+OPTION_GAP = 12.0    # points of empty space before a letter that starts an option mid-row
+NUMBER_TOLERANCE = 6.0  # points; question numbers sit in one column
+# ---------------------
+
+# Part I questions read from word coordinates instead of flattened text: question numbers, option
+# letters and the column each option sits in come from the page layout, so options laid out
+# side by side, in a grid or with their letters drawn apart from their text are still found.
+
+QUESTION_NUMBER = re.compile(r"\d{2}\.")
+PART_II = re.compile(r"\bII dalis\b", re.IGNORECASE)
+LETTERS = "ABCD"
+
+
+# Words of one page grouped into rows, top to bottom, each row left to right
+def page_rows(pdf_path, page_number):
+    words = sorted(pdf_pages.page_words(pdf_path, page_number), key=lambda word: (word[3], word[0]))
+    row = []
+    for word in words:
+        if row and word[3] - row[0][3] > ROW_TOLERANCE:
+            yield sorted(row)
+            row = []
+        row.append(word)
+    if row:
+        yield sorted(row)
+
+
+def rows(pdf_path, page_numbers):
+    for page_number in page_numbers:
+        yield from page_rows(pdf_path, page_number)
+
+
+SEPARATOR = "\n\ue000\n"  # a line no cleanup rule touches, so one question is cleaned in one call
+
+
+# Yields (number, question text, [(letter, option text), ...]) for every Part I question. Rows keep
+# their line breaks until clean has run, so line-based cleanup rules (page headers, exam codes)
+# still drop page furniture that lands inside a question.
+def mcq_blocks(pdf_path, first_page, last_page, clean=lambda text: text):
+    last_page = min(last_page, pdf_pages.page_count(pdf_path))
+    number_x = None
+    current = None
+
+    def finish(question):
+        number, text, options = question
+        parts = ["\n".join(" ".join(row) for row in rows) for rows in [text] + [option[2] for option in options]]
+        cleaned = clean(SEPARATOR.join(parts)).split(SEPARATOR.strip())
+        if len(cleaned) != len(parts):
+            cleaned = [clean(part) for part in parts]  # a rule reached across the separator
+        cleaned = [" ".join(part.split()) for part in cleaned]
+        return number, cleaned[0], [(option[0], part) for option, part in zip(options, cleaned[1:])]
+
+    for row in rows(pdf_path, range(first_page - 1, last_page)):
+        first = row[0]
+        if PART_II.search(" ".join(word[4] for word in row)):
+            break
+        if QUESTION_NUMBER.fullmatch(first[4]) and (number_x is None or abs(first[0] - number_x) <= NUMBER_TOLERANCE):
+            if current:
+                yield finish(current)
+            number_x = first[0]
+            current = (first[4][:2], [], [])
+            row = row[1:]
+        if current is None:
+            continue
+
+        _, text, options = current
+        previous_x1 = None
+        line = None  # words of this row going to the current target
+        touched = set()
+        for x0, _, x1, _, word in row:
+            if previous_x1 is not None and x0 - previous_x1 < OPTION_GAP:
+                line.append(word)  # same phrase as the word before it
+                previous_x1 = x1
+                continue
+            previous_x1 = x1
+            if len(options) < len(LETTERS) and word == LETTERS[len(options)]:
+                options.append((word, x0, [[]]))
+                line = options[-1][2][-1]
+                touched.add(id(options[-1][2]))
+                continue
+            if options:
+                # Wrapped option text belongs to the nearest option column to its left
+                column = [option for option in options if option[1] <= x0 + ROW_TOLERANCE] or options[:1]
+                target = max(column, key=lambda option: (option[1], options.index(option)))[2]
+            else:
+                target = text
+            if id(target) not in touched:
+                touched.add(id(target))
+                target.append([])
+            line = target[-1]
+            line.append(word)
+
+    if current:
+        yield finish(current)
@@ -1,11 +1,16 @@
 import keyboard
-import requests
-import base64
 import os
-from PIL import ImageGrab
-from openpyxl import Workbook, load_workbook
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageGrab
 import win32com.client
 
+import mathpix
+import question_ids
+from workbook import WorkbookSession
+
 # Mathpix credentials
 APP_ID = "..."
 APP_KEY = "..."
@@ -13,11 +18,41 @@ APP_KEY = "..."
 # Image save settings
 SAVE_DIR = "images"
 EXCEL_FILE = "MatematikaPaveiksl.xlsx"
+
+# Start OCR as soon as a new snip lands on the clipboard, before any key is pressed. Off by
+# default: every snip then costs a Mathpix request, even ones only saved as images
+PREFETCH = False
+CLIPBOARD_POLL = 0.3  # seconds
+OCR_LRU_SIZE = 32  # recent snips whose OCR result (or request in flight) is kept
+FIRST_QID = 1702  # lowest id to hand out; ids come from question_ids.py, keyed by sheet row
+FIRST_ROW = 6  # first sheet row with a question
 os.makedirs(SAVE_DIR, exist_ok=True)
 
-current_qid = 1702
+# The sheet stays in memory; every change goes to MatematikaPaveiksl.xlsx.journal immediately
+# and the .xlsx is rewritten in the background
+book = WorkbookSession(EXCEL_FILE, ["id", "category_id", "question", "correct_answer", "false_answer1", "false_answer2", "false_answer3", "fa_check", "image"]).start()
+
+# Picks up at the row an earlier session was on; a row keeps its id when revisited
+SHEET = os.path.basename(EXCEL_FILE)
+
+def question_id(row):
+    return question_ids.assign("Mat", SHEET, [row], FIRST_QID)[str(row)]
+
+# OCR and image saving run on worker threads so the keyboard hook returns at once. Results are
+# written by a single writer thread in key-press order, to the row that was active at the press.
+# Ids are written to the id store by their own thread too: current_qid is a Future, resolved by
+# whoever needs the number, never by the hook.
+workers = ThreadPoolExecutor(max_workers=mathpix.CONCURRENCY)
+writer = ThreadPoolExecutor(max_workers=1)
+id_writer = ThreadPoolExecutor(max_workers=1)
+
+active_row = max(map(int, question_ids.lookup("Mat", SHEET)), default=FIRST_ROW)
+current_qid = id_writer.submit(question_id, active_row)
 answer_index = 1
-active_row = 6
+
+ocr_jobs = OrderedDict()  # image hash -> Future of the Mathpix text, least recently used first
+ocr_jobs_lock = threading.Lock()
+stop_watching = threading.Event()
 
 def get_clipboard_image():
     image = ImageGrab.grabclipboard()
@@ -27,38 +62,52 @@ def get_clipboard_image():
     return image
 
 def send_to_mathpix(image):
-    buffered = image_to_base64(image)
-    response = requests.post(
-        "https://api.mathpix.com/v3/text",
-        headers={
-            "app_id": APP_ID,
-            "app_key": APP_KEY,
-            "Content-type": "application/json"
-        },
-        json={
-            "src": f"data:image/png;base64,{buffered}",
-            "formats": ["text", "data"],
-            "math_inline_delimiters": ["$$", "$$"],
-            "math_display_delimiters": ["$$", "$$"]
-        }
-    )
-    if response.ok:
-        result = response.json()
+    result = mathpix.ocr_png(image_to_png_bytes(image), APP_ID, APP_KEY)
+    if result is not None:
         print("\nMathpix OCR Result:")
         print(result.get("text"))
         return result.get("text")
     else:
-        print("Error:", response.text)
         return None
 
-def image_to_base64(image):
+def image_hash(image):
+    return hashlib.sha256(f"{image.mode}{image.size}".encode() + image.tobytes()).hexdigest()
+
+# Same snip -> same job: a finished result is reused, an in-flight request is joined
+def ocr_job(image):
+    key = image_hash(image)
+    with ocr_jobs_lock:
+        job = ocr_jobs.get(key)
+        if job is None or (job.done() and (job.exception() or job.result() is None)):
+            job = workers.submit(send_to_mathpix, image)  # new snip, or the last attempt failed
+        ocr_jobs[key] = job
+        ocr_jobs.move_to_end(key)
+        while len(ocr_jobs) > OCR_LRU_SIZE:
+            ocr_jobs.popitem(last=False)
+    return job
+
+def watch_clipboard():
+    last_hash = None
+    while not stop_watching.is_set():
+        try:
+            image = ImageGrab.grabclipboard()
+        except OSError:
+            image = None  # clipboard busy in another program
+        if isinstance(image, Image.Image):
+            key = image_hash(image)
+            if key != last_hash:
+                last_hash = key
+                print("🔎 New snip on clipboard, OCR started in the background")
+                ocr_job(image)
+        stop_watching.wait(CLIPBOARD_POLL)
+
+def image_to_png_bytes(image):
     import io
     buffered = io.BytesIO()
     image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+    return buffered.getvalue()
 
-def save_image(filename):
-    image = get_clipboard_image()
+def save_image(image, filename):
     if image:
         filepath = os.path.join(SAVE_DIR, filename)
         image.save(filepath)
@@ -67,81 +116,97 @@ def save_image(filename):
         print("Clipboard does not contain an image.")
 
 
-def log_to_excel(qid, latex, typeLatex):
-    global active_row
-    if not os.path.exists(EXCEL_FILE):
-        wb = Workbook()
-        ws = wb.active
-        ws.append(["id", "category_id", "question", "correct_answer", "false_answer1", "false_answer2", "false_answer3", "fa_check", "image"])
-    else:
-        wb = load_workbook(EXCEL_FILE)
-        ws = wb.active
-
-
-
+def log_to_excel(qid, latex, typeLatex, row):
     match typeLatex:
         case "question":
-            ws.cell(row=active_row, column=1).value = qid  # id
-            ws.cell(row=active_row, column=3).value = latex  # question
+            book.set(row, 1, qid)  # id
+            book.set(row, 3, latex)  # question
         case "correct_answer":
-            ws.cell(row=active_row, column=4).value = latex  # correct_answer
-            ws.cell(row=active_row, column=7).value = True  # correct_answer
+            book.set(row, 4, latex)  # correct_answer
+            book.set(row, 7, True)  # correct_answer
         case "false_answer":
-            ws.cell(row=active_row, column=7).value = False  # correct_answer
+            book.set(row, 7, False)  # correct_answer
             for col in range(5, 8):
-                if ws.cell(row=active_row, column=col).value in [None, ""]:
-                    ws.cell(row=active_row, column=col).value = latex
+                if book.get(row, col) in [None, ""]:
+                    book.set(row, col, latex)
                     print(f"🟡 Logged false answer in column {col}")
                     break
         case "image":
-            ws.cell(row=active_row, column=9).value = "https://exvpdduqmfmvkvpmbpvp.supabase.co/storage/v1/object/public/task-pictures//" + latex
+            book.set(row, 9, "https://exvpdduqmfmvkvpmbpvp.supabase.co/storage/v1/object/public/task-pictures//" + latex)
         case "image_answer":
-            ws.cell(row=active_row, column=7).value = True  # correct_answer
+            book.set(row, 7, True)  # correct_answer
             for col in range(5, 8):
-                if ws.cell(row=active_row, column=col).value in [None, ""]:
-                    ws.cell(row=active_row, column=col).value = "https://exvpdduqmfmvkvpmbpvp.supabase.co/storage/v1/object/public/task-pictures//" + latex
+                if book.get(row, col) in [None, ""]:
+                    book.set(row, col, "https://exvpdduqmfmvkvpmbpvp.supabase.co/storage/v1/object/public/task-pictures//" + latex)
                     print(f"🟡 Logged false answer in column {col}")
                     break
 
-    wb.save(EXCEL_FILE)
-    print(f"📗 Logged to Excel: {EXCEL_FILE}")
+    print(f"📗 Logged to Excel: {EXCEL_FILE} (question {qid})")
 
-def ocr_clipboard_image_question_text():
+# Logs the job's result for the question/row captured at key-press time, once it is ready
+def in_background(job, typeLatex):
+    qid, row = current_qid, active_row
+
+    def write():
+        try:
+            value = job.result()
+        except Exception as e:
+            print(f"❌ {typeLatex} for row {row} failed: {e}")
+            return
+        log_to_excel(qid.result(), value, typeLatex, row)
+
+    writer.submit(write)
+
+def ocr_in_background(typeLatex):
     image = get_clipboard_image()
     if image:
-        result = send_to_mathpix(image)
-        log_to_excel(current_qid, result, "question")
+        in_background(ocr_job(image), typeLatex)
+
+def ocr_clipboard_image_question_text():
+    ocr_in_background("question")
 
 def ocr_clipboard_image_answer_text():
-    image = get_clipboard_image()
-    if image:
-        result = send_to_mathpix(image)
-        log_to_excel(current_qid, result, "correct_answer")
+    ocr_in_background("correct_answer")
 
 def ocr_clipboard_image_false_answer_text():
-    image = get_clipboard_image()
-    if image:
-        result = send_to_mathpix(image)
-        log_to_excel(current_qid, result, "false_answer")
+    ocr_in_background("false_answer")
 
 def save_question_image():
-    save_image(f"{current_qid}.png")
-    log_to_excel(current_qid, f'{current_qid}.png', "image")
+    image = ImageGrab.grabclipboard()
+    qid = current_qid
+
+    def work():
+        filename = f"{qid.result()}.png"
+        save_image(image, filename)
+        return filename
+
+    in_background(workers.submit(work), "image")
 
 def save_answer_image():
     global answer_index
-    save_image(f"{current_qid}-{answer_index}.png")
-    log_to_excel(current_qid, f'{current_qid}.png', "image_answer")
+    image = ImageGrab.grabclipboard()
+    qid, index = current_qid, answer_index
+
+    def work():
+        save_image(image, f"{qid.result()}-{index}.png")
+        return f"{qid.result()}.png"
+
+    in_background(workers.submit(work), "image_answer")
     answer_index += 1
     if answer_index > 4:
         answer_index = 1
 
 def finalize_question():
     global current_qid, answer_index, active_row
-    current_qid += 1
     active_row += 1
+    current_qid = id_writer.submit(next_question_id, active_row)
     answer_index = 1
-    print(f"✅ Finished question. Moving to next: {current_qid}")
+    writer.submit(book.flush_soon)  # after everything logged for the finished question
+
+def next_question_id(row):
+    qid = question_id(row)
+    print(f"✅ Finished question. Moving to next: {qid}")
+    return qid
 
 # Hotkeys
 keyboard.add_hotkey("q", ocr_clipboard_image_question_text)  # OCR question text
@@ -151,6 +216,10 @@ keyboard.add_hotkey("s", save_question_image)        # Save question image
 keyboard.add_hotkey("1", save_answer_image)          # Save answer image
 keyboard.add_hotkey("n", finalize_question) #Next question
 
+watcher = threading.Thread(target=watch_clipboard, daemon=True)
+if PREFETCH:
+    watcher.start()
+
 print("🟢 Tool running. Use Win+Shift+S to snip, then:")
 print("🔹 Q → OCR question text via Mathpix")
 print("🔹 A → OCR answer text via Mathpix")
@@ -161,3 +230,14 @@ print("🔹 N → Next question")
 print("🔺 Press ESC to quit.")
 
 keyboard.wait("esc")
+# Nothing may submit to the pools once they start shutting down
+keyboard.unhook_all_hotkeys()
+stop_watching.set()
+if watcher.is_alive():
+    watcher.join()
+print("⏳ Waiting for OCR still in progress...")
+workers.shutdown(wait=True)
+writer.shutdown(wait=True)
+id_writer.shutdown(wait=True)
+book.close()
+print(f"📗 Saved {EXCEL_FILE}")
@@ -0,0 +1,177 @@
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# ---------------------
+MATHPIX_URL = os.environ.get("MATHPIX_URL", "https://api.mathpix.com/v3/text")
+CACHE_FILE = ".cache/mathpix.sqlite"
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+CONCURRENCY = 4          # requests in flight at once
+RATE_LIMIT = 5.0         # requests started per second
+MAX_RETRIES = 5          # for 429 / 5xx / connection errors
+BACKOFF = 1.0            # seconds, doubled after every retry
+TIMEOUT = 60
+# ---------------------
+
+DEFAULT_OPTIONS = {
+    "formats": ["text", "data"],
+    "math_inline_delimiters": ["$$", "$$"],
+    "math_display_delimiters": ["$$", "$$"],
+}
+
+_connection = None
+_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+_rate_lock = threading.Lock()
+_next_slot = 0.0
+
+
+def _db():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(CACHE_FILE) or ".", exist_ok=True)
+        _connection = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS ocr ("
+            " key TEXT PRIMARY KEY, result TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        _connection.execute("CREATE INDEX IF NOT EXISTS ocr_last_used ON ocr (last_used)")
+        _connection.commit()
+    return _connection
+
+
+# Same PNG bytes + same request options -> same Mathpix answer
+def cache_key(png_bytes, options):
+    options_json = json.dumps(options, sort_keys=True)
+    return hashlib.sha256(png_bytes).hexdigest() + "-" + hashlib.sha256(options_json.encode()).hexdigest()[:16]
+
+
+def cache_get(key):
+    with _lock:
+        db = _db()
+        row = db.execute("SELECT result FROM ocr WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        db.execute("UPDATE ocr SET last_used = ? WHERE key = ?", (time.time(), key))
+        db.commit()
+    return json.loads(row[0])
+
+
+def cache_put(key, result, max_bytes=None):
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    result_json = json.dumps(result, ensure_ascii=False)
+    with _lock:
+        db = _db()
+        db.execute(
+            "INSERT OR REPLACE INTO ocr (key, result, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, result_json, len(result_json.encode()), time.time()),
+        )
+        # Drop least recently used results once the cache grows past max_bytes
+        db.execute(
+            "DELETE FROM ocr WHERE key IN ("
+            " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS total FROM ocr)"
+            " WHERE total > ?)",
+            (max_bytes,),
+        )
+        db.commit()
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=CONCURRENCY)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+    return _session
+
+
+# Spaces request starts 1/RATE_LIMIT seconds apart across all threads
+def _wait_for_slot(rate_limit):
+    global _next_slot
+    if not rate_limit:
+        return
+    with _rate_lock:
+        now = time.monotonic()
+        slot = max(now, _next_slot)
+        _next_slot = slot + 1.0 / rate_limit
+    if slot > now:
+        time.sleep(slot - now)
+
+
+def _post(payload, headers, rate_limit=None, max_retries=None):
+    rate_limit = RATE_LIMIT if rate_limit is None else rate_limit
+    max_retries = MAX_RETRIES if max_retries is None else max_retries
+    delay = BACKOFF
+    for attempt in range(max_retries + 1):
+        _wait_for_slot(rate_limit)
+        try:
+            response = _get_session().post(MATHPIX_URL, headers=headers, json=payload, timeout=TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            print(f"Mathpix request failed ({e}), retrying in {delay:.1f}s...")
+        else:
+            if (response.status_code != 429 and response.status_code < 500) or attempt == max_retries:
+                metrics.count("ocr_bytes_received", len(response.content))
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            print(f"Mathpix API busy ({response.status_code}), retrying in {delay:.1f}s...")
+        metrics.count("ocr_retries")
+        time.sleep(delay)
+        delay *= 2
+
+
+# Returns the Mathpix JSON for a PNG, or None if the API call failed (failures are not cached)
+def ocr_png(png_bytes, app_id, app_key, options=None, use_cache=True):
+    options = DEFAULT_OPTIONS if options is None else options
+    key = cache_key(png_bytes, options)
+    if use_cache:
+        cached = cache_get(key)
+        if cached is not None:
+            metrics.count("ocr_cache_hits")
+            return cached
+        metrics.count("ocr_cache_misses")
+
+    img_base64 = base64.b64encode(png_bytes).decode()
+    headers = {
+        "app_id": app_id,
+        "app_key": app_key,
+        "Content-type": "application/json",
+    }
+    metrics.count("ocr_bytes_sent", len(img_base64))
+    try:
+        with metrics.timer("ocr_request"):
+            response = _post({"src": f"data:image/png;base64,{img_base64}", **options}, headers)
+    except requests.RequestException as e:
+        print(f"Mathpix API error: {e}")
+        metrics.count("ocr_failures")
+        return None
+
+    if response.status_code != 200:
+        print(f"Mathpix API error: {response.status_code} - {response.text}")
+        metrics.count("ocr_failures")
+        return None
+
+    result = response.json()
+    if "error" in result:
+        print(f"Mathpix API error: {result['error']}")
+        metrics.count("ocr_failures")
+        return None
+    if use_cache:
+        cache_put(key, result)
+    return result
+
@@ -0,0 +1,226 @@
+import atexit
+import contextlib
+import functools
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+# ---------------------
+METRICS = os.environ.get("METRICS", "")  # "1" prints a summary at exit; a .json / .prom path also writes it there
+PROFILE = os.environ.get("PROFILE", "")  # "cprofile" or "pyinstrument": profile the whole run, report at exit
+PROFILE_TOP = 25                         # functions listed in the cProfile summary
+# ---------------------
+
+# Opt-in timers and counters for the hot paths (PDF open and page extraction, every cleanup rule,
+# block splitting, option parsing, Mathpix requests, export). Off unless METRICS is set, and then
+# the instrumented code only pays for one attribute check. Every sample carries the labels of the
+# current context (batch sets the exam), so a slow exam shows up with the stage that slowed it.
+
+ENABLED = bool(METRICS)
+
+_timers = {}    # (name, labels) -> [calls, seconds, max seconds]
+_counters = {}  # (name, labels) -> value
+_context = {}
+_lock = threading.Lock()
+
+
+def _key(name, labels):
+    return name, tuple(sorted({**_context, **labels}.items()))
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        entry = _timers.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+
+def count(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timed(name, **labels):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, **labels)
+
+        return wrapper
+
+    return decorate
+
+
+# Labels added to everything recorded in this process until the block ends (threads included)
+@contextlib.contextmanager
+def context(**labels):
+    previous = dict(_context)
+    _context.update(labels)
+    try:
+        yield
+    finally:
+        _context.clear()
+        _context.update(previous)
+
+
+def snapshot():
+    with _lock:
+        return {
+            "timers": [{"name": name, "labels": dict(labels), "calls": calls, "seconds": seconds, "max_seconds": longest}
+                       for (name, labels), (calls, seconds, longest) in sorted(_timers.items())],
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(_counters.items())],
+        }
+
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+# Adds a snapshot taken in another process (a batch or page worker) to this one's totals; samples
+# also get this process's current labels, so pages done for an exam are counted under that exam
+def merge(data):
+    with _lock:
+        for timer_data in data["timers"]:
+            entry = _timers.setdefault(_key(timer_data["name"], timer_data["labels"]), [0, 0.0, 0.0])
+            entry[0] += timer_data["calls"]
+            entry[1] += timer_data["seconds"]
+            entry[2] = max(entry[2], timer_data["max_seconds"])
+        for counter in data["counters"]:
+            key = _key(counter["name"], counter["labels"])
+            _counters[key] = _counters.get(key, 0) + counter["value"]
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def to_prometheus(data=None):
+    data = data or snapshot()
+    lines = []
+    typed = set()
+    for timer_data in data["timers"]:
+        base = "exams_" + timer_data["name"]
+        if base not in typed:
+            typed.add(base)
+            lines += [f"# TYPE {base}_seconds_total counter", f"# TYPE {base}_calls_total counter",
+                      f"# TYPE {base}_seconds_max gauge"]
+        labels = _prometheus_labels(timer_data["labels"])
+        lines += [f"{base}_seconds_total{labels} {timer_data['seconds']:.6f}",
+                  f"{base}_calls_total{labels} {timer_data['calls']}",
+                  f"{base}_seconds_max{labels} {timer_data['max_seconds']:.6f}"]
+    for counter in data["counters"]:
+        base = "exams_" + counter["name"] + "_total"
+        if base not in typed:
+            typed.add(base)
+            lines.append(f"# TYPE {base} counter")
+        lines.append(f"{base}{_prometheus_labels(counter['labels'])} {counter['value']}")
+    return "\n".join(lines) + "\n"
+
+
+def write(path, data=None):
+    data = data or snapshot()
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith(".prom"):
+            f.write(to_prometheus(data))
+        else:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+    print(f" Metrics written to {path}")
+
+
+def report(data=None, top=30):
+    data = data or snapshot()
+    print(" Slowest timers:")
+    for timer_data in sorted(data["timers"], key=lambda t: -t["seconds"])[:top]:
+        labels = " ".join(f"{name}={value}" for name, value in timer_data["labels"].items())
+        print(f"   {timer_data['name']:<16}{timer_data['seconds'] * 1000:>10.1f} ms{timer_data['calls']:>7} calls"
+              f"{timer_data['max_seconds'] * 1000:>9.1f} ms max  {labels}")
+    if data["counters"]:
+        print(" Counters:")
+        for counter in data["counters"]:
+            labels = " ".join(f"{name}={value}" for name, value in counter["labels"].items())
+            print(f"   {counter['name']:<24}{counter['value']:>12}  {labels}")
+
+
+# Profiles the block with cProfile (or pyinstrument, if installed); output is a .prof / .html file
+@contextlib.contextmanager
+def profile(output=None, tool="cprofile"):
+    if tool == "pyinstrument":
+        try:
+            import pyinstrument
+        except ImportError:
+            print("⚠️ pyinstrument is not installed, using cProfile")
+            tool = "cprofile"
+    if tool == "pyinstrument":
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            print(profiler.output_text(unicode=True, color=False))
+            if output:
+                with open(output, "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+                print(f" Profile written to {output}")
+        return
+
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        if output:
+            profiler.dump_stats(output)
+            print(f" Profile written to {output}")
+
+
+def _at_exit():
+    if METRICS not in ("1", "true"):
+        write(METRICS)
+    report()
+
+
+# Environment switches only act in the process that was started; batch workers hand their numbers back
+if multiprocessing.parent_process() is None:
+    if ENABLED:
+        atexit.register(_at_exit)
+    if PROFILE:
+        _whole_run = profile(f"profile-{os.getpid()}.{'html' if PROFILE == 'pyinstrument' else 'prof'}", PROFILE)
+        _whole_run.__enter__()
+        atexit.register(_whole_run.__exit__, None, None, None)
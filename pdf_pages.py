@@ -0,0 +1,193 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pymupdf
+
+import metrics
+
+# ---------------------
+CACHE_DIR = ".cache/pages"
+WORKERS = int(os.environ.get("PAGE_WORKERS", "0")) or os.cpu_count()  # processes for page work; 1 keeps it in this one
+PARALLEL_PAGES = 4  # fewer pages than this are done in this process; the round trip costs more
+# ---------------------
+
+# One open handle and one loaded cache entry per PDF for the life of the process
+_documents = {}
+_hashes = {}
+_entries = {}
+_render_lock = threading.Lock()  # MuPDF documents are not safe to use from two threads at once
+_pool = None
+
+# Page-level work (text extraction, rendering, figure crops) is CPU-bound MuPDF code, so it fans
+# out over one process pool, started on first use and kept for the rest of the run. Workers are
+# started fresh (forkserver, or spawn on Windows) rather than forked from a process that may have
+# OCR threads holding locks, so every worker opens its own document handles. Results come back in
+# the order the pages were given: text is joined page by page exactly as before, and a question
+# running over a page break is split from the joined text, never from one page on its own.
+
+
+def _worker_init():
+    global WORKERS
+    WORKERS = 1  # no pools inside the pool
+
+
+def pool():
+    global _pool
+    if _pool is None:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context(method),
+                                    initializer=_worker_init)
+    return _pool
+
+
+# Stops the page pool; the next page task starts a new one with the WORKERS set then
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def _task(fn, args):
+    value = fn(*args)
+    page_metrics = None
+    if metrics.ENABLED:
+        page_metrics = metrics.snapshot()
+        metrics.reset()
+    return value, page_metrics
+
+
+def _collect(result):
+    value, page_metrics = result
+    if page_metrics:
+        metrics.merge(page_metrics)
+    return value
+
+
+# [fn(*args) for args in arguments], in the page pool when there are enough of them; fn must be
+# a module-level function so the workers can import it
+def map_pages(fn, arguments):
+    arguments = list(arguments)
+    if WORKERS <= 1 or len(arguments) < PARALLEL_PAGES:
+        return [fn(*args) for args in arguments]
+    return [_collect(result) for result in pool().map(_task, [fn] * len(arguments), arguments)]
+
+
+# fn(*args) in a pool worker, for callers that already work on pages from several threads
+def run_page(fn, *args):
+    if WORKERS <= 1:
+        return fn(*args)
+    return _collect(pool().submit(_task, fn, args).result())
+
+
+def file_hash(pdf_path):
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+    if key not in _hashes:
+        sha = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        _hashes[key] = sha.hexdigest()
+    return _hashes[key]
+
+
+def open_pdf(pdf_path):
+    digest = file_hash(pdf_path)
+    if digest not in _documents:
+        with metrics.timer("pdf_open"):
+            _documents[digest] = pymupdf.open(pdf_path)
+        metrics.count("pdf_opened")
+    return _documents[digest]
+
+
+def _cache_file(digest):
+    return os.path.join(CACHE_DIR, digest + ".json")
+
+
+def _entry(pdf_path):
+    digest = file_hash(pdf_path)
+    if digest not in _entries:
+        entry = None
+        if os.path.exists(_cache_file(digest)):
+            try:
+                with open(_cache_file(digest), encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                print(f"⚠️ Ignoring unreadable page cache for {pdf_path}")
+        if entry is None:
+            entry = {"page_count": len(open_pdf(pdf_path)), "pages": {}}
+        _entries[digest] = entry
+    return digest, _entries[digest]
+
+
+def _save(digest, entry):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_file = _cache_file(digest) + f".{os.getpid()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_file, _cache_file(digest))
+
+
+def page_count(pdf_path):
+    return _entry(pdf_path)[1]["page_count"]
+
+
+# Text, blocks and words of each page are pulled out of MuPDF together and only once per file content
+def load_pages(pdf_path, page_numbers):
+    digest, entry = _entry(pdf_path)
+    pages = entry["pages"]
+    missing = [n for n in page_numbers if "words" not in pages.get(str(n), {})]  # older entries lack words
+    metrics.count("pdf_page_cache_hits", len(page_numbers) - len(missing))
+    if missing:
+        with metrics.timer("pdf_extract"):
+            for n, page in zip(missing, map_pages(_extract, [(pdf_path, n) for n in missing])):
+                pages[str(n)] = page
+        metrics.count("pdf_pages_extracted", len(missing))
+        _save(digest, entry)
+    return [pages[str(n)] for n in page_numbers]
+
+
+def _extract(pdf_path, page_number):
+    page = open_pdf(pdf_path)[page_number]
+    return {
+        "text": page.get_text(),
+        "blocks": [list(block) for block in page.get_text("blocks")],
+        "words": [list(word[:5]) for word in page.get_text("words")],
+    }
+
+
+def page_texts(pdf_path, page_numbers):
+    return [page["text"] for page in load_pages(pdf_path, page_numbers)]
+
+
+def page_text(pdf_path, page_number):
+    return page_texts(pdf_path, [page_number])[0]
+
+
+def page_blocks(pdf_path, page_number):
+    return load_pages(pdf_path, [page_number])[0]["blocks"]
+
+
+# [x0, y0, x1, y1, word] in page coordinates
+def page_words(pdf_path, page_number):
+    return load_pages(pdf_path, [page_number])[0]["words"]
+
+
+# Renders straight to PNG bytes; clip is in page coordinates so nothing outside it is rasterised
+def render_png(pdf_path, page_number, zoom=2.0, clip=None):
+    with _render_lock, metrics.timer("pdf_render"):
+        page = open_pdf(pdf_path)[page_number]
+        pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), clip=clip)
+        return pix.tobytes("png")
+
+
+# PNG bytes of several pages rendered in parallel, in page order; clips: one per page or None
+def render_pngs(pdf_path, page_numbers, zoom=2.0, clips=None):
+    page_numbers = list(page_numbers)
+    clips = [None] * len(page_numbers) if clips is None else [tuple(clip) if clip is not None else None for clip in clips]
+    return map_pages(render_png, [(pdf_path, n, zoom, clip) for n, clip in zip(page_numbers, clips)])
@@ -1,20 +1,36 @@
 import pymupdf # PyMuPDF
-import pandas as pd
-import requests
-import base64
+import argparse
 import os
-from PIL import Image
-import io
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import answer_keys
+import checkpoints
+import cleanup
+import keywords
+import mathpix
+import metrics
+import pdf_pages
+import question_ids
+import questions
+import stages
+import tokenizer
 
 # ---------------------
 APP_ID = "oops"
 APP_KEY = "oops"
+SUBJECT = "Fiz"  # answer keys and question ids are kept per subject
 PDF_FILE = "egzai/2009.pdf"
 OUTPUT_EXCEL = "surinkti/2009.xlsx"
 ANSWER_FILE = "egzai/2009_ats.pdf"
+PAGES = range(2, 9)  # Customize page range
+CROP = (100, 165, 180)  # pixels cut from the rendered page: left, top, bottom
 # ---------------------
 
+# Excel columns, in order
+FIELDS = ("number", "category_no", "question", "correct", "wrong1", "wrong2", "wrong3", "temp_num")
+
 # Fix OCR misrecognized characters
 char_fixes = {
     'è': 'ė', 'ė̀': 'ė', 'ė́': 'ė', 'ė̃': 'ė', 'ě':'ė' ,
@@ -25,6 +41,8 @@ char_fixes = {
     'ivair': 'įvair', '$${ }^{1}$$': '', '$${ }^{2}$$': '', '$${ }^{3}$$': '',
     'ijungiami': 'įjungiami', "It ": "Į", 'ú': 'ų', 'ş':'š', 'igyja':'įgyja', 'ittempimo':'įtempimo'
 }
+# Same result as applying char_fixes one by one in order; a single scan unless fixes sit close together
+fix_chars = cleanup.compile_replacements(char_fixes)
 category_map = {
     "Mechanika": 18,
     "Molekulinė fizika": 19,
@@ -38,72 +56,55 @@ skip_keywords = [
     "žr. pav", "pav.", "paveiksl", "Paveiksl", "lentel", "1 pav", "2 pav", "3 pav", "pavaizduot", " eiga", "Sinusai",
     "Grafik", "grafik", "tašką O", "Taške", "taške",
 ]
+skip_matcher = keywords.KeywordMatcher({"skip": skip_keywords})
 
-def get_mcq_answers(pdf_path):
-    doc = pymupdf.open(pdf_path)
-    first_page_text = doc[0].get_text()
-
-    # Find all standalone capital letters A–D (answer choices)
-    answers = re.findall(r"\b([ABCD])\b", first_page_text)
+def get_mcq_answers(pdf_path, subject=SUBJECT, year=None):
+    answers, _ = answer_keys.lookup(pdf_path, subject, year)
 
-    if len(answers) < 30:
-        print(f"⚠️ Warning: Only found {len(answers)} answers (expected 30).")
+    if len(answers) < answer_keys.MCQ_COUNT:
+        print(f"⚠️ Warning: Only found {len(answers)} answers (expected {answer_keys.MCQ_COUNT}).")
     else:
-        print("✅ Found 30 MCQ answers.")
+        print(f"✅ Found {answer_keys.MCQ_COUNT} MCQ answers.")
 
     # Return a dictionary like {'01': 'C', '02': 'D', ...}
-    return {str(i + 1).zfill(2): answers[i] for i in range(min(30, len(answers)))}
+    return answers
 
 
 
 
 def clean_text(text):
-    for wrong, correct in char_fixes.items():
-        text = text.replace(wrong, correct)
-    return text
-
-def image_to_latex(image_path, app_id, app_key):
-    with open(image_path, "rb") as image_file:
-        img_base64 = base64.b64encode(image_file.read()).decode()
-
-    headers = {
-        "app_id": app_id,
-        "app_key": app_key,
-        "Content-type": "application/json",
-    }
-
-    data = {
-        "src": f"data:image/png;base64,{img_base64}",
-        "formats": ["text", "data"],
-        "math_inline_delimiters": ["$$", "$$"],
-        "math_display_delimiters": ["$$", "$$"],
-    }
-
-    response = requests.post("https://api.mathpix.com/v3/text", headers=headers, json=data)
-
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Mathpix API error: {response.status_code} - {response.text}")
-        return {"text": ""}
-
-def save_pdf_pages_as_images(pdf_path, output_folder="ocr_pages", zoom=2.0):
-    os.makedirs(output_folder, exist_ok=True)
-    doc = pymupdf.open(pdf_path)
-    image_paths = []
-
-    for page_num in range(2, 9):  # Customize page range
-        page = doc.load_page(page_num)
-        mat = pymupdf.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat)
-        img = Image.open(io.BytesIO(pix.tobytes("png")))
-        width, height = img.size
-        cropped_img = img.crop((100, 165, width, height - 180))  # crop top/bottom
-        image_path = os.path.join(output_folder, f"page_{page_num+1}.png")
-        cropped_img.save(image_path)
-        image_paths.append(image_path)
-
-    return image_paths
+    return fix_chars(text)
+
+def page_clip(page, zoom=2.0):
+    left, top, bottom = CROP
+    rect = page.rect
+    return pymupdf.Rect(rect.x0 + left / zoom, rect.y0 + top / zoom, rect.x1, rect.y1 - bottom / zoom)
+
+
+def page_png_file(output_folder, page_num):
+    return os.path.join(output_folder, f"page_{page_num+1}.png")
+
+
+# Each page is clipped at render time and kept as PNG bytes; writing them to output_folder is optional.
+# The pages are rendered in parallel by the page pool and come back in page order.
+def render_pdf_pages(pdf_path, output_folder=None, zoom=2.0, pages=PAGES):
+    if output_folder:
+        os.makedirs(output_folder, exist_ok=True)
+    doc = pdf_pages.open_pdf(pdf_path)
+    start = time.perf_counter()
+    png_pages = pdf_pages.render_pngs(pdf_path, pages, zoom, [page_clip(doc[page_num], zoom) for page_num in pages])
+    elapsed = time.perf_counter() - start
+
+    for page_num, png in zip(pages, png_pages):
+        if output_folder:
+            with open(page_png_file(output_folder, page_num), "wb") as f:
+                f.write(png)
+        print(f"   Page {page_num + 1}: {len(png) // 1024} KB PNG")
+    print(f"   {len(png_pages)} pages rendered in {elapsed * 1000:.0f} ms")
+
+    return png_pages
+
+
 def assign_categories(text):
     current_category = 18  # Assume "Judėjimas ir jėgos" at the start
     q_to_category = {}
@@ -126,87 +127,178 @@ def assign_categories(text):
 
 
 
-# === OCR all pages ===
-print(" Converting PDF to images...")
-image_paths = save_pdf_pages_as_images(PDF_FILE)
-
-
-print("📤 Sending images to Mathpix...")
-all_text = ""
-for idx, img_path in enumerate(image_paths):
-    print(f"   Processing page {idx + 2}...")
-    ocr_result = image_to_latex(img_path, APP_ID, APP_KEY)
-    text_block = ocr_result.get("text", "")
-    all_text += "\n" + ocr_result.get("text", "")
-
-all_text = re.sub(r"\\begin{tabular}.*?\\end{tabular}", "", all_text, flags=re.DOTALL)
-all_text = re.sub(r'[ \t]+', ' ', all_text)
-all_text = re.sub(r'\n+', '\n', all_text)
-with open("output.txt", "w", encoding="utf-8") as f:
-    f.write(all_text.strip())
-# === Extract questions ===
-print(" Parsing questions...")
-
-
-
-answer_key = get_mcq_answers(ANSWER_FILE)
-category_per_question = assign_categories(all_text)
-# After assigning categories
-for category in category_map:
-    all_text = all_text.replace(clean_text(category), "")
-
-
-
-question_blocks = re.split(r"(?=\d{2}\.\s)", all_text)
-
-data = []
-
-for block in question_blocks:
-    block = block.strip()
-    if not block:
-        continue
-
-    match = re.match(r"(?P<num>\d{2})\.\s(?P<question>.+?)(?=(\nA\s|$))", block, flags=re.DOTALL)
-    if not match:
-        continue
-
-    q = match.groupdict()
-    question_number = q["num"]
-    raw_question_text = clean_text(re.sub(r"\s+", " ", q["question"].strip()))
-
-    if any(keyword in raw_question_text.lower() for keyword in skip_keywords):
-        print(f"⏭ Skipping question {question_number} due to image/table reference")
-        continue
-
-    # 🧠 Now extract options manually
-    options = re.findall(r"(?:^|\n)([A-D])\s+(.*?)(?=(?:\n[A-D]\s|$))", block, flags=re.DOTALL)
-
-    if len(options) < 4:
-        print(f"⚠️ Skipping question {question_number} — not enough options found ({len(options)}).")
-        continue
-
-    options_dict = {letter: clean_text(text.strip()) for letter, text in options}
-
-    correct_letter = answer_key.get(question_number, "")
-    correct_answer = options_dict.get(correct_letter, "")
-    wrong_answers = [ans for key, ans in options_dict.items() if key != correct_letter]
-
-    while len(wrong_answers) < 3:
-        wrong_answers.append("")
-
-    data.append({
-        "Question No.": question_number,
-        "Category No.": category_per_question.get(question_number, ""),
-        "Question": raw_question_text,
-        "Correct Answer": correct_answer,
-        "Wrong Option 1": wrong_answers[0],
-        "Wrong Option 2": wrong_answers[1],
-        "Wrong Option 3": wrong_answers[2],
-    })
-
-
-# === Save to Excel ===
-df = pd.DataFrame(data)
-df.to_excel(OUTPUT_EXCEL, index=False)
-
-print(f" {len(data)} questions saved to: {OUTPUT_EXCEL}")
+OCR_RULES = cleanup.CleanupRules([
+    cleanup.rule("tabular", r"\\begin{tabular}.*?\\end{tabular}", "", re.DOTALL),
+    cleanup.rule("spaces", r"[ \t]+", " "),
+    cleanup.rule("blank lines", r"\n+", "\n"),
+])
+
+
+# Extract: one page rendered inside clip (in a page pool worker, so the OCR threads render in
+# parallel) and read by Mathpix; None if the OCR call failed. A page Mathpix has read is
+# checkpointed at once and never sent again, whatever happens to the rest of the run. The
+# checkpoint is the only store of page OCR (no stage or Mathpix cache), so clearing it really
+# sends every page again. The rendered PNG also goes to png_file, if given.
+def page_ocr(pdf_path, page_num, zoom, clip, png_file=None):
+    result = checkpoints.page_result(pdf_path, page_num, zoom, clip)
+    if result is None:
+        png = pdf_pages.run_page(pdf_pages.render_png, pdf_path, page_num, zoom, clip)
+        if png_file:
+            with open(png_file, "wb") as f:
+                f.write(png)
+        result = mathpix.ocr_png(png, APP_ID, APP_KEY, use_cache=False)
+        if result is None:
+            return None
+        checkpoints.save_page(pdf_path, page_num, zoom, clip, png, result)
+    return result.get("text", "")
+
+
+# Some pages could not be read; the ones that were are checkpointed and the next run only
+# sends the rest
+class OCRIncomplete(RuntimeError):
+    def __init__(self, pdf_file, pages):
+        super().__init__(pdf_file, pages)  # as args, so batch workers can send it back
+        self.pdf_file = pdf_file
+        self.pages = pages
+
+    def __str__(self):
+        pages = "page" + "s" * (len(self.pages) > 1)
+        return f"OCR failed for {pages} {checkpoints.page_ranges(self.pages)} of {self.pdf_file}; run again to resume"
+
+
+# Done / outstanding pages of this exam, without calling Mathpix
+def ocr_status(pdf_file, zoom=2.0):
+    doc = pdf_pages.open_pdf(pdf_file)
+    clips = [tuple(page_clip(doc[page_num], zoom)) for page_num in PAGES]
+    return checkpoints.page_status(pdf_file, PAGES, zoom, clips)
+
+
+# Split + parse + answer-join on the cleaned OCR text
+@stages.stage
+def ocr_questions(all_text, answer_key):
+    category_per_question = assign_categories(all_text)
+    # After assigning categories
+    for category in category_map:
+        all_text = all_text.replace(clean_text(category), "")
+
+    data = []
+    skipped_with_images = []
+
+    with metrics.timer("split"):
+        blocks = list(tokenizer.question_blocks(all_text))
+
+    for question_number, question_text, options in blocks:
+        raw_question_text = clean_text(question_text)
+
+        if skip_matcher.find(raw_question_text.lower()):
+            print(f"⏭ Skipping question {question_number} due to image/table reference")
+            skipped_with_images.append(question_number)
+            continue
+
+        if len(options) < 4:
+            print(f"⚠️ Skipping question {question_number} — not enough options found ({len(options)}).")
+            continue
+
+        options_dict = {letter: clean_text(text.strip()) for letter, text in options}
+
+        correct_letter = answer_key.get(question_number, "")
+        correct_answer = options_dict.get(correct_letter, "")
+        wrong_answers = [ans for key, ans in options_dict.items() if key != correct_letter]
+
+        while len(wrong_answers) < 3:
+            wrong_answers.append("")
+
+        data.append(questions.Question(
+            number=question_number,
+            category_no=category_per_question.get(question_number, ""),
+            question=raw_question_text,
+            correct=correct_answer,
+            wrong1=wrong_answers[0],
+            wrong2=wrong_answers[1],
+            wrong3=wrong_answers[2],
+        ))
+
+    return data, skipped_with_images
+
+
+def extract_exam(pdf_file, answer_file, output_folder=None, dump_file="output.txt", zoom=2.0, allow_partial=False,
+                 subject=SUBJECT, year=None):
+    # === OCR all pages ===
+    # Pages sent to Mathpix are saved to output_folder as they are rendered for it
+    png_files = [page_png_file(output_folder, page_num) if output_folder else None for page_num in PAGES]
+    if output_folder:
+        os.makedirs(output_folder, exist_ok=True)
+
+    print("📤 Sending images to Mathpix...")
+    doc = pdf_pages.open_pdf(pdf_file)
+    clips = [tuple(page_clip(doc[page_num], zoom)) for page_num in PAGES]
+    with ThreadPoolExecutor(max_workers=mathpix.CONCURRENCY) as pool:
+        ocr_texts = list(pool.map(lambda page_num, clip, png_file: page_ocr(pdf_file, page_num, zoom, clip, png_file),
+                                  PAGES, clips, png_files))
+    # Pages read in an earlier run were not rendered this time
+    unsaved = [page_num for page_num, png_file in zip(PAGES, png_files) if png_file and not os.path.exists(png_file)]
+    if unsaved:
+        print(" Converting PDF to images...")
+        render_pdf_pages(pdf_file, output_folder, zoom, unsaved)
+
+    all_text = ""
+    failed_pages = []
+    for page_num, ocr_text in zip(PAGES, ocr_texts):
+        if ocr_text is None:
+            failed_pages.append(page_num + 1)
+            continue
+        all_text += "\n" + ocr_text
+    if failed_pages and not allow_partial:
+        raise OCRIncomplete(pdf_file, [page_num - 1 for page_num in failed_pages])
+    if failed_pages:
+        print(f"⚠️ OCR failed for pages {failed_pages}, their questions will be missing.")
+
+    all_text = OCR_RULES.apply(all_text)
+    if dump_file:
+        with open(dump_file, "w", encoding="utf-8") as f:
+            f.write(all_text.strip())
+    # === Extract questions ===
+    print(" Parsing questions...")
+    return ocr_questions(all_text, get_mcq_answers(answer_file, subject, year))
+
+
+# Gives every question its global id (by subject, year and tempNum, so a re-run gets the same ones);
+# the number it has in the exam moves to tempNum
+def number_questions(rows, subject, year, floor=question_ids.FIRST_ID):
+    for row in rows:
+        row.temp_num = row.temp_num or str(row.number)
+    keys = question_ids.row_keys(rows)
+    ids = question_ids.assign(subject, year, keys, floor)
+    for row, key in zip(rows, keys):
+        row.number = ids[key]
+
+
+@stages.stage(outputs=("output_excel",))
+def save_questions(rows, output_excel):
+    # === Save to Excel ===
+    questions.save(rows, FIELDS, output_excel)
+
+    print(f" {len(rows)} questions saved to: {output_excel}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OCR the exam's pages with Mathpix; pages read before are not sent again")
+    parser.add_argument("--status", action="store_true", help="list the pages read and still outstanding, then stop")
+    parser.add_argument("--restart", action="store_true", help="forget the pages read before and send every page to Mathpix again")
+    parser.add_argument("--partial", action="store_true", help="save the questions even if some pages could not be read")
+    args = parser.parse_args()
+    if args.restart:
+        checkpoints.clear_pages(PDF_FILE)
+    done, outstanding = ocr_status(PDF_FILE)
+    print(f" OCR pages read: {checkpoints.page_ranges(done) or 'none'}; outstanding: {checkpoints.page_ranges(outstanding) or 'none'}")
+    if args.status:
+        raise SystemExit(0)
+    try:
+        rows, skipped_with_images = extract_exam(PDF_FILE, ANSWER_FILE, allow_partial=args.partial)
+    except OCRIncomplete as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    number_questions(rows, SUBJECT, answer_keys.exam_year(PDF_FILE))
+    save_questions(rows, OUTPUT_EXCEL)
+    print(" Stage cache:")
+    stages.report()
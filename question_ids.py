@@ -0,0 +1,125 @@
+import argparse
+import csv
+import os
+import sqlite3
+import threading
+
+# ---------------------
+ID_FILE = ".cache/question_ids.sqlite"
+FIRST_ID = 1658  # where the global sequence starts; scripts may raise it with their own floor
+# ---------------------
+
+# Question ids are also the image names on Supabase ({id}.png, {id}-2.png, ...), so they must never
+# be handed out twice. One sqlite file keeps the next free id and which (subject, year, tempNum)
+# got which id. An exam's new questions take exactly as many ids as they need off the shared
+# counter, in the same IMMEDIATE transaction that records them, so no ids are left unused; a
+# question that already has an id gets the same one back, so re-running an exam, or running exams
+# in parallel in any order, keeps every id and image name stable.
+
+_connection = None
+_lock = threading.Lock()
+_pid = None
+
+
+def _db():
+    global _connection, _pid
+    if _connection is None or _pid != os.getpid():  # a forked worker needs its own connection
+        os.makedirs(os.path.dirname(ID_FILE) or ".", exist_ok=True)
+        _connection = sqlite3.connect(ID_FILE, timeout=60, isolation_level=None, check_same_thread=False)
+        _connection.execute("CREATE TABLE IF NOT EXISTS counter (name TEXT PRIMARY KEY, next INTEGER NOT NULL)")
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS ids ("
+            " subject TEXT NOT NULL, year TEXT NOT NULL, temp_num TEXT NOT NULL, id INTEGER NOT NULL UNIQUE,"
+            " PRIMARY KEY (subject, year, temp_num))"
+        )
+        _pid = os.getpid()
+    return _connection
+
+
+def _reserve(db, count, floor):
+    # Inside a write transaction
+    row = db.execute("SELECT next FROM counter WHERE name = 'question'").fetchone()
+    first = max(row[0] if row else floor, floor)
+    db.execute("INSERT OR REPLACE INTO counter VALUES ('question', ?)", (first + count,))
+    return range(first, first + count)
+
+
+# Takes count ids off the shared counter (never below floor); returns them as a range
+def reserve(count, floor=FIRST_ID):
+    with _lock:
+        db = _db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            block = _reserve(db, count, floor)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+    return block
+
+
+# {key: id} for one exam's questions, keys being their tempNums; new keys get the next free ids,
+# known keys keep the id they were given before
+def assign(subject, year, keys, floor=FIRST_ID):
+    subject, year, keys = str(subject), str(year), [str(key) for key in keys]
+    ids = lookup(subject, year)
+    missing = [key for key in dict.fromkeys(keys) if key not in ids]
+    if missing:
+        with _lock:
+            db = _db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have numbered some of them since the lookup
+                known = {key for key, in db.execute("SELECT temp_num FROM ids WHERE subject = ? AND year = ?", (subject, year))}
+                missing = [key for key in missing if key not in known]
+                for key, new_id in zip(missing, _reserve(db, len(missing), floor)):
+                    db.execute("INSERT INTO ids VALUES (?, ?, ?, ?)", (subject, year, key, new_id))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        ids = lookup(subject, year)
+    return {key: ids[key] for key in keys}
+
+
+def lookup(subject, year):
+    with _lock:
+        rows = _db().execute("SELECT temp_num, id FROM ids WHERE subject = ? AND year = ?", (str(subject), str(year))).fetchall()
+    return dict(rows)
+
+
+def next_free():
+    with _lock:
+        row = _db().execute("SELECT next FROM counter WHERE name = 'question'").fetchone()
+    return row[0] if row else FIRST_ID
+
+
+# tempNum per row, with "#2", "#3", ... for a number seen again in the same exam (Part I and
+# Part II both start at 1)
+def row_keys(rows):
+    seen = {}
+    keys = []
+    for position, row in enumerate(rows):
+        key = str(row.temp_num or position + 1)
+        seen[key] = seen.get(key, 0) + 1
+        keys.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+    return keys
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or export the question ids handed out so far")
+    parser.add_argument("--export", help="write every (subject, year, tempNum, id) to this CSV file")
+    args = parser.parse_args()
+    with _lock:
+        summary = _db().execute("SELECT subject, year, COUNT(*), MIN(id), MAX(id) FROM ids GROUP BY subject, year ORDER BY subject, year").fetchall()
+    for subject, year, count, low, high in summary:
+        print(f" {subject} {year}: {count} ids, {low}-{high}")
+    print(f" Next free id: {next_free()}")
+    if args.export:
+        with _lock:
+            rows = _db().execute("SELECT subject, year, temp_num, id FROM ids ORDER BY id").fetchall()
+        with open(args.export, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Subject", "Year", "tempNum", "Question No."])
+            writer.writerows(rows)
+        print(f" {len(rows)} ids written to {args.export}")
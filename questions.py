@@ -0,0 +1,121 @@
+import csv
+import json
+import os
+
+from openpyxl import Workbook
+
+import metrics
+
+# ---------------------
+PARQUET_ROW_GROUP = 10000  # rows per Parquet row group; only this many are held as columns at once
+# ---------------------
+
+# Question attribute -> Excel column header. Each script lists the attributes it exports, in order.
+HEADERS = {
+    "subject": "Subject",
+    "year": "Year",
+    "number": "Question No.",
+    "category": "Category",
+    "category_no": "Category No.",
+    "question": "Question",
+    "correct": "Correct Answer",
+    "wrong1": "Wrong Option 1",
+    "wrong2": "Wrong Option 2",
+    "wrong3": "Wrong Option 3",
+    "fa_check": "fa_check",
+    "image": "image",
+    "temp_num": "tempNum",
+    "duplicate_of": "Duplicate Of",  # set by dedup.flag in the merged bank
+}
+
+DEFAULTS = {"subject": None, "year": None, "number": None, "fa_check": "FALSE"}
+
+
+# One extracted question; slots keep a bank of tens of thousands of them small
+class Question:
+    __slots__ = tuple(HEADERS)
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, values.pop(field, DEFAULTS.get(field, "")))
+        if values:
+            raise TypeError(f"Unknown question fields: {', '.join(values)}")
+
+    def __repr__(self):
+        return f"Question({self.number!r}, {self.question[:40]!r})"
+
+
+# {header: [values]} for the given attributes, built column by column straight from the records
+def columns(rows, fields, pad_numbers=False):
+    table = {HEADERS[field]: [getattr(row, field) for row in rows] for field in fields}
+    if pad_numbers and "number" in fields:
+        table[HEADERS["number"]] = [str(number).zfill(2) for number in table[HEADERS["number"]]]
+    return table
+
+
+# One output row at a time, so sinks never hold more than the row they are writing
+def records(rows, fields, pad_numbers=False):
+    pad = fields.index("number") if pad_numbers and "number" in fields else None
+    for row in rows:
+        values = [getattr(row, field) for field in fields]
+        if pad is not None:
+            values[pad] = str(values[pad]).zfill(2)
+        yield values
+
+
+def _write_xlsx(rows, fields, output_file, pad_numbers):
+    # Write-only workbooks stream rows to disk instead of keeping every cell object in memory
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append([HEADERS[field] for field in fields])
+    for values in records(rows, fields, pad_numbers):
+        ws.append(values)
+    wb.save(output_file)
+
+
+def _write_csv(rows, fields, output_file, pad_numbers):
+    with open(output_file, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([HEADERS[field] for field in fields])
+        writer.writerows(records(rows, fields, pad_numbers))
+
+
+def _write_jsonl(rows, fields, output_file, pad_numbers):
+    headers = [HEADERS[field] for field in fields]
+    with open(output_file, "w", encoding="utf-8") as f:
+        for values in records(rows, fields, pad_numbers):
+            f.write(json.dumps(dict(zip(headers, values)), ensure_ascii=False) + "\n")
+
+
+def _write_parquet(rows, fields, output_file, pad_numbers):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)") from None
+
+    # Columns mix numbers and text (e.g. Category is 25 or "null"), so everything is stored as text
+    schema = pa.schema([(HEADERS[field], pa.string()) for field in fields])
+    with pq.ParquetWriter(output_file, schema) as writer:
+        for start in range(0, len(rows), PARQUET_ROW_GROUP):
+            chunk = columns(rows[start:start + PARQUET_ROW_GROUP], fields, pad_numbers)
+            arrays = [pa.array([None if v is None else str(v) for v in values], pa.string()) for values in chunk.values()]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+
+SINKS = {
+    ".xlsx": _write_xlsx,
+    ".csv": _write_csv,
+    ".jsonl": _write_jsonl,
+    ".parquet": _write_parquet,
+}
+
+
+# The output format follows the file extension
+def save(rows, fields, output_file, pad_numbers=False):
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension not in SINKS:
+        raise ValueError(f"Unsupported output format {extension!r}; use one of {', '.join(SINKS)}")
+    with metrics.timer("export", format=extension[1:]):
+        SINKS[extension](rows, fields, output_file, pad_numbers)
+    metrics.count("export_rows", len(rows), format=extension[1:])
@@ -0,0 +1,229 @@
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import re
+import sys
+import threading
+import types
+
+import metrics
+import pdf_pages
+
+# ---------------------
+CACHE_DIR = ".cache/stages"
+ENABLED = os.environ.get("STAGE_CACHE", "1") != "0"  # STAGE_CACHE=0 recomputes everything
+# ---------------------
+
+# Pipeline steps (extract -> clean -> split -> parse -> answer-join -> export) are plain functions
+# wrapped with @stage. A stage's result is kept on disk under a key made of
+#   - its arguments (input files by content hash, everything else by value),
+#   - its own code and the code of every project function it calls,
+#   - the module-level settings those functions read (cleanup rules, keyword lists, ...),
+# so editing one rule or keyword reruns only the stages that read it; everything upstream is
+# loaded from the cache. Results are never shared between different inputs, and a stage that
+# returns None (a failed OCR call, say) is not cached. Delete .cache/stages to start over.
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+NEUTRAL_MODULES = ("metrics",)  # instrumentation never changes a result, so it is left out of keys
+CODE_TYPES = (types.FunctionType, type, functools._lru_cache_wrapper, functools.partial)
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class _Opaque(Exception):
+    pass
+
+
+def _project_file(module_name):
+    if module_name in NEUTRAL_MODULES:
+        return False
+    path = getattr(sys.modules.get(module_name), "__file__", None) or ""
+    return os.path.dirname(os.path.abspath(path)) == PROJECT_DIR if path else False
+
+
+def _module_label(module_name):
+    # "__main__" and the imported module are the same script, so both get the file name
+    path = getattr(sys.modules.get(module_name), "__file__", None)
+    return os.path.splitext(os.path.basename(path))[0] if path else module_name
+
+
+def _code_key(code):
+    # Constants through _canonical too: a frozenset's repr order changes with the hash seed
+    consts = tuple(_code_key(c) if isinstance(c, types.CodeType) else _global_key(c, set()) for c in code.co_consts)
+    return code.co_code, consts, code.co_names
+
+
+def _all_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _all_names(const)
+    return names
+
+
+def _function_key(fn, seen):
+    fn = inspect.unwrap(fn)  # lru_cache and functools.wraps wrappers
+    if not isinstance(fn, types.FunctionType):
+        return "builtin", getattr(fn, "__module__", None), getattr(fn, "__qualname__", repr(type(fn)))
+    label = (_module_label(fn.__module__), fn.__qualname__)
+    if not _project_file(fn.__module__):
+        return "library", *label
+    if id(fn) in seen:
+        return "recursive", *label
+    seen.add(id(fn))
+
+    names = sorted(_all_names(fn.__code__))
+    used = []
+    for name in names:
+        if name not in fn.__globals__:
+            continue
+        value = fn.__globals__[name]
+        if isinstance(value, types.ModuleType):
+            used.append((name, _module_key(value, names, seen)))
+        elif not name.startswith("_") or isinstance(value, CODE_TYPES):
+            # Other _private globals are runtime state (open connections, caches), callable or not
+            used.append((name, _global_key(value, seen)))
+    closure = [_global_key(cell.cell_contents, seen) for cell in fn.__closure__ or ()]
+    return (label, _code_key(fn.__code__), _global_key(fn.__defaults__, seen),
+            _global_key(fn.__kwdefaults__, seen), closure, used)
+
+
+def _module_key(module, names, seen):
+    # module.attr reads: attr is in co_names too, so look each name up on project modules
+    if not _project_file(module.__name__):
+        return "module", module.__name__
+    attributes = []
+    for name in names:
+        if name.startswith("_") or not hasattr(module, name):
+            continue
+        value = getattr(module, name)
+        if not isinstance(value, types.ModuleType):
+            attributes.append((name, _global_key(value, seen)))
+    return "module", _module_label(module.__name__), attributes
+
+
+def _global_key(value, seen):
+    try:
+        return _canonical(value, seen)
+    except _Opaque:
+        return "opaque", type(value).__qualname__
+
+
+# A nested tuple of plain values that is equal whenever the inputs would give the same result
+def _canonical(value, seen):
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return type(value).__name__, [_canonical(item, seen) for item in value]
+    if isinstance(value, dict):
+        # Insertion order kept: fix tables and keyword groups are order-sensitive
+        return "dict", [(_canonical(k, seen), _canonical(v, seen)) for k, v in value.items()]
+    if isinstance(value, (set, frozenset)):
+        return "set", sorted((_canonical(item, seen) for item in value), key=repr)
+    if isinstance(value, re.Pattern):
+        return "re", value.pattern, value.flags
+    if isinstance(value, type):
+        if not _project_file(value.__module__):
+            return "class", value.__module__, value.__qualname__
+        members = [(name, _global_key(member, seen)) for name, member in vars(value).items()
+                   if isinstance(member, types.FunctionType)]
+        return "class", _module_label(value.__module__), value.__qualname__, members
+    if hasattr(value, "cache_key"):  # objects that say what decides their output (e.g. without hit counters)
+        return _canonical(type(value), seen), _canonical(value.cache_key(), seen)
+    if isinstance(value, (types.FunctionType, types.BuiltinFunctionType, functools._lru_cache_wrapper, functools.partial)):
+        if isinstance(value, functools.partial):
+            return "partial", _function_key(value.func, seen), _canonical(value.args, seen), _canonical(value.keywords, seen)
+        return _function_key(value, seen)
+    if _project_file(type(value).__module__):
+        slots = getattr(type(value), "__slots__", ())
+        state = vars(value) if hasattr(value, "__dict__") else {name: getattr(value, name, None) for name in slots}
+        return type(value).__qualname__, _canonical(state, seen)
+    raise _Opaque(type(value).__qualname__)
+
+
+def _digest(value):
+    return hashlib.sha256(repr(value).encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _output_hashes(paths):
+    hashes = {}
+    for path in paths:
+        if not os.path.exists(path):
+            return None
+        hashes[path] = pdf_pages.file_hash(path)
+    return hashes
+
+
+def _count(name, outcome):
+    with _stats_lock:
+        _stats.setdefault(name, {"hit": 0, "run": 0})[outcome] += 1
+    metrics.count("stage_cache", stage=name, outcome=outcome)
+
+
+# Hash of a function's code, the project functions it calls and the settings they read: the part
+# of a stage key that changes when a parser or a rule does
+def fingerprint(fn):
+    return _digest(_function_key(fn, set()))
+
+
+# files: parameters holding input file paths (keyed by content, not name)
+# outputs: parameters holding paths the stage writes; a hit needs them unchanged on disk
+def stage(fn=None, *, files=(), outputs=()):
+    if fn is None:
+        return functools.partial(stage, files=files, outputs=outputs)
+
+    signature = inspect.signature(fn)
+    name = f"{_module_label(fn.__module__)}.{fn.__qualname__}"
+    code_key = []  # filled on first call, once every module the stage reads is imported
+
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        with metrics.timer("stage", stage=name):
+            return cached(*args, **kwargs)
+
+    def cached(*args, **kwargs):
+        if not ENABLED:
+            return fn(*args, **kwargs)
+        if not code_key:
+            code_key.append(fingerprint(fn))
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        for parameter in files:
+            if arguments[parameter] is not None:
+                arguments[parameter] = pdf_pages.file_hash(arguments[parameter])
+        key = _digest((code_key[0], _canonical(arguments, set())))
+        output_paths = [arguments[p] for p in outputs if arguments[p]]
+
+        cache_file = os.path.join(CACHE_DIR, name, key + ".pickle")
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, "rb") as f:
+                    entry = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+                print(f"⚠️ Ignoring unreadable stage cache {cache_file}")
+            else:
+                if _output_hashes(output_paths) == entry["outputs"]:
+                    _count(name, "hit")
+                    return entry["value"]
+
+        value = fn(*args, **kwargs)
+        _count(name, "run")
+        if value is not None or outputs:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            tmp_file = cache_file + f".{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_file, "wb") as f:
+                pickle.dump({"value": value, "outputs": _output_hashes(output_paths)}, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        return value
+
+    return timed
+
+
+def report():
+    width = max(map(len, _stats), default=0)
+    for name, counts in sorted(_stats.items()):
+        print(f"   {name:<{width}}  {counts['hit']} cached, {counts['run']} run")
@@ -0,0 +1,58 @@
+import base64
+import hashlib
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The scripts live at the repository root; appended rather than prepended so that math.py there
+# does not shadow the standard library module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+
+def mathpix_text(png):
+    return hashlib.sha256(png).hexdigest()
+
+
+# Local Mathpix stand-in: answers every image with its hash (mathpix_text) and records the images
+# it was sent. The Mathpix cache goes to the test's cache_dir.
+@pytest.fixture
+def mathpix_server(cache_dir, monkeypatch):
+    import mathpix
+
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            png = base64.b64decode(payload["src"].split(",", 1)[1])
+            received.append(png)
+            body = json.dumps({"text": mathpix_text(png)}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    monkeypatch.setattr(mathpix, "MATHPIX_URL", f"http://127.0.0.1:{stub.server_port}/")
+    monkeypatch.setattr(mathpix, "CACHE_FILE", os.path.join(cache_dir, "mathpix.sqlite"))
+    monkeypatch.setattr(mathpix, "_connection", None)
+    yield received
+    stub.shutdown()
+    if mathpix._connection is not None:
+        mathpix._connection.close()
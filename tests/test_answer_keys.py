@@ -0,0 +1,82 @@
+import os
+
+import pymupdf
+import pytest
+
+import answer_keys
+import biology1and2part
+import pdf_pages
+
+
+def key(letters, skip=()):
+    return {str(n).zfill(2): letter for n, letter in enumerate(letters, 1) if n not in skip}
+
+
+def test_cancelled_question_keeps_layout_answers(capsys):
+    letters = "ABCD" * 7 + "AB"
+    layout = key(letters, skip={15})
+    # A stray standalone letter on the page fills the hole and shifts everything after it
+    positional = key(letters[:14] + "C" + letters[15:])
+
+    mcq, method = answer_keys.choose_part1(layout, positional, "2019_ats.pdf")
+
+    assert (mcq, method) == (layout, "layout")
+    assert "differ on 15" in capsys.readouterr().out
+
+
+def test_broken_layout_falls_back_to_text():
+    letters = "DCBA" * 7 + "DC"
+    mcq, method = answer_keys.choose_part1(key(letters[:15]), key(letters), "2019_ats.pdf")
+
+    assert (mcq, method) == (key(letters), "text")
+
+
+def test_agreeing_methods_are_quiet(capsys):
+    letters = "ABCD" * 7 + "AB"
+    assert answer_keys.choose_part1(key(letters), key(letters), "2019_ats.pdf") == (key(letters), "layout")
+    assert capsys.readouterr().out == ""
+
+
+@pytest.fixture
+def index_file(cache_dir, monkeypatch):
+    monkeypatch.setattr(answer_keys, "INDEX_FILE", os.path.join(cache_dir, "answers.sqlite"))
+    monkeypatch.setattr(answer_keys, "_connection", None)
+    monkeypatch.setattr(pdf_pages, "CACHE_DIR", os.path.join(cache_dir, "pages"))
+    yield
+    if answer_keys._connection is not None:
+        answer_keys._connection.close()
+
+
+def answer_pdf(path, part2):
+    doc = pymupdf.open()
+    doc.new_page().insert_text((72, 72), "1 A 2 B 3 C\nII DALIS\n" + part2)
+    doc.save(path)
+    return str(path)
+
+
+def test_subject_comes_from_the_caller(tmp_path, index_file):
+    # Flat layout: the folder says nothing about the subject
+    answer_file = answer_pdf(tmp_path / "2017_ats.pdf", "1 Fotosinteze")
+
+    mcq, open_answers = biology1and2part.get_mcq_answers(answer_file, dump_file=None)
+
+    assert (mcq, open_answers) == ({"01": "A", "02": "B", "03": "C"}, {"01": "Fotosinteze"})
+    assert answer_keys.validation("Bio", "2017")[:2] == (3, 1)
+    assert answer_keys.validation(tmp_path.name, "2017") is None
+
+
+def test_part2_noise_is_only_stripped_for_chemistry():
+    text = "1 Vertinami ir kiti teisingi atsakymai, nenurodyti vertinimo instrukcijoje. 1 NaCl"
+
+    assert answer_keys.part2_answers(text, "Chem") == {"01": "NaCl"}
+    assert answer_keys.part2_answers(text, "Bio") == {"01": text[2:]}
+
+
+def test_answers_from_older_parsing_code_are_parsed_again(tmp_path, index_file, monkeypatch):
+    answer_file = answer_pdf(tmp_path / "2017_ats.pdf", "1 Fotosinteze")
+    answer_keys.lookup(answer_file, "Bio")
+    answer_keys._connection.close()
+    monkeypatch.setattr(answer_keys, "_connection", None)
+
+    monkeypatch.setattr(answer_keys, "PART_II_NOISE", {"Bio": ["Fotosinteze"]})
+    assert answer_keys.lookup(answer_file, "Bio")[1] == {}
@@ -0,0 +1,74 @@
+import os
+
+import pymupdf
+import pytest
+
+import answer_keys
+import batch
+import checkpoints
+import pdf_pages
+import physics1part
+import stages
+
+
+@pytest.fixture
+def exam(tmp_path, cache_dir, monkeypatch):
+    monkeypatch.setattr(checkpoints, "CHECKPOINT_FILE", os.path.join(cache_dir, "checkpoints.sqlite"))
+    monkeypatch.setattr(checkpoints, "_connection", None)
+    monkeypatch.setattr(answer_keys, "INDEX_FILE", os.path.join(cache_dir, "answers.sqlite"))
+    monkeypatch.setattr(answer_keys, "_connection", None)
+    monkeypatch.setattr(pdf_pages, "CACHE_DIR", os.path.join(cache_dir, "pages"))
+    monkeypatch.setattr(pdf_pages, "WORKERS", 1)
+    monkeypatch.setattr(stages, "CACHE_DIR", os.path.join(cache_dir, "stages"))
+    monkeypatch.setattr(physics1part, "PAGES", range(3))
+
+    pdf_file, answer_file = str(tmp_path / "2019.pdf"), str(tmp_path / "2019_ats.pdf")
+    doc = pymupdf.open()
+    for n in range(3):
+        doc.new_page().insert_text((72, 200), f"{n + 1:02d}. Kūnas juda {n + 3} m/s2 pagreičiu.")
+    doc.save(pdf_file)
+    key = pymupdf.open()
+    key.new_page().insert_text((72, 72), "1 A 2 B 3 C")
+    key.save(answer_file)
+    yield pdf_file, answer_file
+    for module in (checkpoints, answer_keys):
+        if module._connection is not None:
+            module._connection.close()
+
+
+def test_pages_read_are_not_sent_again(exam, mathpix_server):
+    pdf_file, answer_file = exam
+    physics1part.extract_exam(pdf_file, answer_file, dump_file=None)
+    assert len(mathpix_server) == 3
+    assert physics1part.ocr_status(pdf_file) == ([0, 1, 2], [])
+
+    physics1part.extract_exam(pdf_file, answer_file, dump_file=None)
+    assert len(mathpix_server) == 3
+
+
+def test_restart_sends_every_page_again(exam, mathpix_server):
+    pdf_file, answer_file = exam
+    physics1part.extract_exam(pdf_file, answer_file, dump_file=None)
+
+    checkpoints.clear_pages(pdf_file)  # what --restart does
+    assert physics1part.ocr_status(pdf_file) == ([], [0, 1, 2])
+    physics1part.extract_exam(pdf_file, answer_file, dump_file=None)
+    assert len(mathpix_server) == 6
+    assert sorted(mathpix_server[3:]) == sorted(mathpix_server[:3])  # pages are sent in parallel
+
+
+def test_exam_checkpoint_follows_the_extractor_rules(exam, monkeypatch):
+    pdf_file, answer_file = exam
+    key = batch.exam_key("Fiz", "2019", pdf_file, answer_file)
+    checkpoints.save_exam(key, "Fiz", "2019", ("Fiz", "2019", ["old rows"], [], None))
+    assert batch.exam_key("Fiz", "2019", pdf_file, answer_file) == key
+    assert checkpoints.exam_result(key)[2] == ["old rows"]
+
+    monkeypatch.setitem(physics1part.category_map, "Optika", 24)
+    changed = batch.exam_key("Fiz", "2019", pdf_file, answer_file)
+    assert changed != key
+    assert checkpoints.exam_result(changed) is None
+
+    # The newer run of the exam replaces the older one's rows
+    checkpoints.save_exam(changed, "Fiz", "2019", ("Fiz", "2019", ["new rows"], [], None))
+    assert checkpoints.exam_result(key) is None
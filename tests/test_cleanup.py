@@ -0,0 +1,87 @@
+import random
+import re
+
+import pytest
+
+import cleanup
+import physics1part
+
+
+def chain(mapping, text):
+    for old, new in mapping.items():
+        text = text.replace(old, new)
+    return text
+
+
+@pytest.mark.parametrize("text", [
+    "í$${ }^{2}$$gyja",
+    "ijungiam$${ }^{1}$$í",
+    "ı$${ }^{1}$$ttempimo",
+    "It ėjimas ittempis ì$${ }^{3}$$vair",
+    "Kūnas juda è pagreičiu, ì ir û",
+])
+def test_char_fixes_match_the_ordered_chain(text):
+    assert physics1part.fix_chars(text) == chain(physics1part.char_fixes, text)
+
+
+# Small alphabets make fixes feed, break and join each other as often as possible
+@pytest.mark.parametrize("alphabet", ["ab", "abc"])
+def test_random_tables_match_the_ordered_chain(alphabet):
+    rng = random.Random(1658)
+    for _ in range(500):
+        mapping = {}
+        for _ in range(rng.randint(1, 5)):
+            key = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4)))
+            mapping[key] = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 3)))
+        fix = cleanup.compile_replacements(mapping)
+        for _ in range(30):
+            text = "".join(rng.choice(alphabet + "x") for _ in range(rng.randint(0, 16)))
+            assert fix(text) == chain(mapping, text), (mapping, text)
+
+
+# The Chemistry noise table's shape: regex rules around a run of literals, some overlapping
+RULES = [
+    cleanup.rule("uppercase line", r"^[A-ZĄČĘĖĮŠŲŪŽ\s]{10,}$", "", re.MULTILINE),
+    cleanup.rule("number line", r"^\d{1,3}$", "", re.MULTILINE),
+    cleanup.literal("exam code", "171CHVU0"),
+    cleanup.literal("Juodraštis", "Juodraštis"),
+    cleanup.literal("title", "2017 M. CHEMIJOS VALSTYBINIO BRANDOS EGZAMINO UŽDUOTIS "),
+    cleanup.literal("ml blank", "      ml"),
+    cleanup.literal("blank", "   ", " "),
+    cleanup.literal("*", "*"),
+    cleanup.literal("no exam code", ""),
+    cleanup.rule("blank lines", r"\n\s*\n+", "\n\n"),
+    cleanup.rule("reference digits", r"(?<=[a-zA-Z])(\d+)(?!\.)"),
+]
+
+FRAGMENTS = ["Kiek molių", " ", "   ", "      ml", "*", "\n", "\n\n", "12", "Juodraštis", "171CHVU0",
+             "2017 M. CHEMIJOS VALSTYBINIO BRANDOS EGZAMINO UŽDUOTIS ", "CHEMIJA IR FIZIKA", "H2O", "Juodraš"]
+
+
+# What the extractors did before the rule tables: re.sub and str.replace, one after another
+def substitutions(rules, text):
+    for kind, _, pattern, replacement, flags in rules:
+        if kind == "regex":
+            text = re.sub(pattern, replacement, text, flags=flags)
+        elif pattern:
+            text = text.replace(pattern, replacement)
+    return text
+
+
+def test_rule_table_matches_the_substitution_chain():
+    rules = cleanup.CleanupRules(RULES)
+    rng = random.Random(1658)
+    for _ in range(2000):
+        text = "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 20)))
+        assert rules.apply(text) == substitutions(RULES, text), text
+
+
+def test_rule_table_counts_hits():
+    rules = cleanup.CleanupRules(RULES)
+    rules.apply("Juodraštis*\n12\nH2O      ml*")
+    assert rules.hits["*"] == 2
+    assert rules.hits["Juodraštis"] == 1
+    assert rules.hits["ml blank"] == 1
+    assert rules.hits["number line"] == 1
+    assert "no exam code" not in rules.hits
+    assert "title" in rules.unused()
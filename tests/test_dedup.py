@@ -0,0 +1,74 @@
+import os
+import zlib
+
+import pytest
+
+import dedup
+import questions
+
+
+@pytest.fixture(autouse=True)
+def index(cache_dir, monkeypatch):
+    monkeypatch.setattr(dedup, "INDEX_FILE", os.path.join(cache_dir, "duplicates.sqlite"))
+    monkeypatch.setattr(dedup, "_connection", None)
+    monkeypatch.setattr(dedup, "_entries", {})
+    monkeypatch.setattr(dedup, "_digests", {})
+    monkeypatch.setattr(dedup, "_buckets", {})
+    yield
+    if dedup._connection is not None:
+        dedup._connection.close()
+
+
+# Questions that differ only in their numbers, so neighbours are near duplicates of each other
+def exam(year):
+    return [
+        questions.Question(
+            subject="Chem", year=year, number=f"{number:02d}",
+            question=f"Kiek molių deguonies sunaudojama sudeginant {number} g metano? Atsakymą suapvalinkite.",
+            correct=f"{number / 8:.2f} mol", wrong1=f"{number / 4:.2f} mol",
+            wrong2=f"{number / 16:.2f} mol", wrong3=f"{number / 2:.2f} mol",
+        )
+        for number in range(1, 34)
+    ]
+
+
+def test_identical_exams_point_at_their_exact_twins():
+    older, newer = exam("2017"), exam("2018")
+    exact, near = dedup.flag([("Chem", "2017", older), ("Chem", "2018", newer)])
+
+    assert [row.duplicate_of for row in newer] == [f"Chem 2017 {row.number}" for row in older]
+    assert exact == len(newer)
+    assert near == sum(1 for row in older if row.duplicate_of)
+
+
+def test_near_duplicate_names_most_similar_question():
+    older = exam("2017")
+    newer = [questions.Question(subject="Chem", year="2018", number="01", question=older[10].question + " Kodėl?",
+                                correct=older[10].correct, wrong1=older[10].wrong1,
+                                wrong2=older[10].wrong2, wrong3=older[10].wrong3)]
+    exact, near = dedup.flag([("Chem", "2017", older), ("Chem", "2018", newer)])
+
+    assert newer[0].duplicate_of.startswith("Chem 2017 11 (~")
+    assert exact == 0
+
+
+def test_signature_matches_exact_arithmetic(monkeypatch):
+    # The largest multipliers the field allows, so every product needs all 64 bits and more
+    monkeypatch.setattr(dedup, "_A", dedup._A.copy())
+    dedup._A[:4] = [dedup.PRIME - 1, dedup.PRIME - 2, 1 << 60, (1 << 32) + 1]
+    text = dedup.normalize(exam("2017")[0])
+    hashes = {zlib.crc32(text[i:i + dedup.SHINGLE].encode("utf-8")) for i in range(len(text) - dedup.SHINGLE + 1)}
+    expected = [min((int(a) * h + int(b)) % dedup.PRIME & 0xFFFFFFFF for h in hashes)
+                for a, b in zip(dedup._A, dedup._B)]
+
+    assert dedup.signature(text).tolist() == expected
+
+
+def test_signatures_from_another_hash_are_dropped(monkeypatch):
+    dedup.index_exam("Chem", "2017", exam("2017"))
+    dedup._connection.close()
+    for name, value in (("_connection", None), ("_entries", {}), ("_digests", {}), ("_buckets", {})):
+        monkeypatch.setattr(dedup, name, value)
+
+    monkeypatch.setattr(dedup, "_B", dedup._B + 1)
+    assert dedup.clusters() == []
@@ -0,0 +1,69 @@
+import json
+import os
+
+import requests
+
+import mathpix
+from conftest import mathpix_text
+
+
+def ocr(png):
+    return mathpix.ocr_png(png, "id", "key")["text"]
+
+
+def test_cache_hit_sends_no_request(mathpix_server):
+    assert ocr(b"page 1") == mathpix_text(b"page 1")
+    assert ocr(b"page 1") == mathpix_text(b"page 1")
+    assert mathpix_server == [b"page 1"]
+
+    # Other options are another request
+    mathpix.ocr_png(b"page 1", "id", "key", options={"formats": ["text"]})
+    assert len(mathpix_server) == 2
+
+
+def test_least_recently_used_result_is_evicted(mathpix_server, monkeypatch):
+    result_size = len(json.dumps({"text": mathpix_text(b"page 1")}).encode())
+    monkeypatch.setattr(mathpix, "CACHE_MAX_BYTES", result_size * 2)
+
+    ocr(b"page 1")
+    ocr(b"page 2")
+    ocr(b"page 1")  # hit: page 2 is now the least recently used
+    ocr(b"page 3")
+    assert mathpix_server == [b"page 1", b"page 2", b"page 3"]
+
+    ocr(b"page 1")
+    ocr(b"page 3")
+    assert len(mathpix_server) == 3
+    ocr(b"page 2")
+    assert mathpix_server[3:] == [b"page 2"]
+
+
+class BusySession:
+    def __init__(self, failures):
+        self.failures = failures
+        self.posts = 0
+
+    def post(self, *args, **kwargs):
+        self.posts += 1
+        response = requests.Response()
+        response.status_code = 503 if self.posts <= self.failures else 200
+        response._content = b'{"text": "ok"}'
+        return response
+
+
+def test_retry_settings_are_read_at_call_time(cache_dir, monkeypatch):
+    session = BusySession(failures=2)
+    monkeypatch.setattr(mathpix, "_get_session", lambda: session)
+    monkeypatch.setattr(mathpix, "CACHE_FILE", os.path.join(cache_dir, "mathpix.sqlite"))
+    monkeypatch.setattr(mathpix, "_connection", None)
+    monkeypatch.setattr(mathpix, "BACKOFF", 0)
+    monkeypatch.setattr(mathpix, "RATE_LIMIT", 0)
+
+    monkeypatch.setattr(mathpix, "MAX_RETRIES", 1)
+    assert mathpix.ocr_png(b"page 1", "id", "key", use_cache=False) is None
+    assert session.posts == 2
+
+    session.posts = 0
+    monkeypatch.setattr(mathpix, "MAX_RETRIES", 2)
+    assert mathpix.ocr_png(b"page 1", "id", "key", use_cache=False) == {"text": "ok"}
+    assert session.posts == 3
@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+
+import pytest
+
+import biology1and2part
+import physics1part
+import question_ids
+import questions
+
+
+@pytest.fixture(autouse=True)
+def id_file(cache_dir, monkeypatch):
+    monkeypatch.setattr(question_ids, "ID_FILE", os.path.join(cache_dir, "question_ids.sqlite"))
+    monkeypatch.setattr(question_ids, "_connection", None)
+    yield
+    if question_ids._connection is not None:
+        question_ids._connection.close()
+
+
+def test_rerun_keeps_ids_and_new_questions_follow():
+    first = question_ids.assign("Chem", "2017", ["1", "2", "3"])
+    assert list(first.values()) == [1658, 1659, 1660]
+    assert question_ids.assign("Chem", "2017", ["3", "1", "2"]) == {"3": 1660, "1": 1658, "2": 1659}
+    assert question_ids.assign("Chem", "2017", ["1", "4"]) == {"1": 1658, "4": 1661}
+
+
+def test_new_session_takes_no_more_ids_than_it_uses():
+    question_ids.assign("Mat", "sheet.xlsx", ["6"], 1702)
+    # A later process (new connection) continues straight after the last id handed out
+    question_ids._connection.close()
+    question_ids._connection = None
+    assert question_ids.assign("Mat", "sheet.xlsx", ["7"], 1702) == {"7": 1703}
+    assert question_ids.next_free() == 1704
+
+
+def number_exam(year):
+    return question_ids.assign("Bio", year, [str(n) for n in range(1, 31)])
+
+
+def test_parallel_processes_share_one_sequence():
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        exams = pool.map(number_exam, [str(year) for year in range(2010, 2022)])
+    ids = sorted(i for exam in exams for i in exam.values())
+    assert ids == list(range(1658, 1658 + 12 * 30))
+
+
+def test_every_subject_gets_global_ids():
+    bio = [questions.Question(number=f"{n:02d}", question=f"Bio {n}") for n in (1, 2, 3)]
+    bio += [questions.Question(number=str(n), question=f"Bio II {n}", fa_check="TRUE") for n in (1, 2)]
+    fiz = [questions.Question(number=f"{n:02d}", question=f"Fiz {n}") for n in (1, 2)]
+
+    biology1and2part.number_questions(bio, "Bio", "2019")
+    physics1part.number_questions(fiz, "Fiz", "2019")
+
+    # Exam numbers move to tempNum; Question No. is unique across the merged bank
+    assert [row.temp_num for row in bio + fiz] == ["01", "02", "03", "1", "2", "01", "02"]
+    assert [row.number for row in bio + fiz] == list(range(1658, 1665))
+
+    rerun = [questions.Question(number="02", question="Bio 2")]
+    biology1and2part.number_questions(rerun, "Bio", "2019")
+    assert rerun[0].number == 1659
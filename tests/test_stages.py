@@ -0,0 +1,23 @@
+import os
+
+import checkpoints
+import physics1part
+import stages
+
+
+def test_fingerprint_ignores_open_connections(cache_dir, monkeypatch):
+    monkeypatch.setattr(checkpoints, "CHECKPOINT_FILE", os.path.join(cache_dir, "checkpoints.sqlite"))
+    monkeypatch.setattr(checkpoints, "_connection", None)
+    before = stages.fingerprint(physics1part.extract_exam)
+    checkpoints._db()  # a callable sqlite3.Connection in a _private global
+    try:
+        assert stages.fingerprint(physics1part.extract_exam) == before
+    finally:
+        checkpoints._connection.close()
+
+
+def test_fingerprint_follows_rules(monkeypatch):
+    before = stages.fingerprint(physics1part.extract_exam)
+    monkeypatch.setitem(physics1part.category_map, "Optika", 24)
+    assert stages.fingerprint(physics1part.extract_exam) != before
+
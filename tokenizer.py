@@ -0,0 +1,133 @@
+# Splits flattened exam text into question-number, option-letter and text tokens in one forward
+# pass. Same results as the lazy DOTALL regexes it replaces (noted on each function), but every
+# character is looked at a bounded number of times, so long pages of tables or formulas cannot
+# make it backtrack.
+
+NUMBER = "number"
+OPTION = "option"
+TEXT = "text"
+
+LETTERS = "ABCD"
+LETTER_SET = frozenset(LETTERS)
+
+
+def _is_number_at(text, i):
+    # "NN." followed by whitespace, with i at the first digit: what \d{2}\.\s matches
+    return text[i:i + 2].isdecimal() and len(text[i:i + 2]) == 2 and text[i + 2:i + 3] == "." and text[i + 3:i + 4].isspace()
+
+
+def _number_starts(text, start=0):
+    # Every i >= start where "NN.\s" begins, found by visiting each "." once
+    dot = text.find(".", start + 2)
+    while dot != -1:
+        if dot - 2 >= start and _is_number_at(text, dot - 2):
+            yield dot - 2
+        dot = text.find(".", dot + 1)
+
+
+def _option_end(block, i):
+    # First "\n[A-D]\s" at or after i, else the end: the lookahead that ends an option or a question
+    while True:
+        i = block.find("\n", i)
+        if i == -1:
+            return len(block)
+        if block[i + 1:i + 2] in LETTER_SET and block[i + 2:i + 3].isspace():
+            return i
+        i += 1
+
+
+# re.split(r"(?=\d{2}\.\s)", text), each piece stripped
+def split_questions(text):
+    previous = 0
+    for start in _number_starts(text):
+        yield text[previous:start].strip()  # "" when the text starts with a number, like re.split
+        previous = start
+    yield text[previous:].strip()
+
+
+# Tokens of one stripped block, as re.match(r"(?P<num>\d{2})\.\s(?P<question>.+?)(?=(\nA\s|$))")
+# and re.findall(r"(?:^|\n)([A-D])\s+(.*?)(?=(?:\n[A-D]\s|$))") read it (both DOTALL)
+def block_tokens(block):
+    if len(block) < 5 or not _is_number_at(block, 0):
+        return
+    yield NUMBER, block[:2]
+
+    end = 5
+    while True:
+        end = block.find("\nA", end)
+        if end == -1 or block[end + 2:end + 3].isspace():
+            break
+        end += 1
+    yield TEXT, block[4:len(block) if end == -1 else end]
+
+    i = 0
+    while i < len(block):
+        if i == 0 and block[:1] in LETTER_SET and block[1:2].isspace():
+            letter_at = 0
+        else:
+            i = block.find("\n", i)
+            if i == -1:
+                break
+            if not (block[i + 1:i + 2] in LETTER_SET and block[i + 2:i + 3].isspace()):
+                i += 1
+                continue
+            letter_at = i + 1
+        body = letter_at + 2
+        while body < len(block) and block[body].isspace():
+            body += 1  # \s+ is greedy and takes line breaks too
+        end = _option_end(block, body)
+        yield OPTION, block[letter_at]
+        yield TEXT, block[body:end]
+        i = end if end > i else i + 1
+
+
+def tokens(text):
+    for block in split_questions(text):
+        yield from block_tokens(block)
+
+
+# (number, question text with whitespace collapsed, [(letter, option text), ...]) per question
+def question_blocks(text):
+    question = None
+    letter = None
+    for kind, value in tokens(text):
+        if kind == NUMBER:
+            if question:
+                yield tuple(question)
+            question = [value, None, []]
+        elif kind == OPTION:
+            letter = value
+        elif question[1] is None:
+            question[1] = " ".join(value.split())
+        else:
+            question[2].append((letter, value))
+    if question:
+        yield tuple(question)
+
+
+# re.findall(r"(\d{2})\.\s(.+?)(?=(?:\n\d{2}\.\s)|(?:\n{2,}))", text, flags=re.DOTALL): a question runs
+# to the next numbered line or blank line; one with neither after it is not a question
+def paragraph_questions(text):
+    breaks = _paragraph_breaks(text)
+    end = next(breaks, None)
+    results = []
+    position = 0
+    for start in _number_starts(text):
+        if start < position:
+            continue
+        while end is not None and end < start + 5:
+            end = next(breaks, None)
+        if end is None:
+            break  # no terminator left: every later start fails too
+        results.append((text[start:start + 2], text[start + 4:end]))
+        position = end
+    return results
+
+
+def _paragraph_breaks(text):
+    # Positions of "\n\n" and of "\n" before "NN.\s", in order
+    i = text.find("\n")
+    while i != -1:
+        if text[i + 1:i + 2] == "\n" or _is_number_at(text, i + 1):
+            yield i
+        i = text.find("\n", i + 1)
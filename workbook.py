@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+
+from openpyxl import Workbook, load_workbook
+
+# ---------------------
+FLUSH_INTERVAL = 10.0  # seconds between background saves of the .xlsx while there are changes
+# ---------------------
+
+
+# Keeps one sheet in memory for a whole session. Every cell change is appended to a journal file
+# straight away; the .xlsx itself is only rewritten in the background, on flush() and on close().
+# A journal left behind by a crash is replayed the next time the workbook is opened.
+class WorkbookSession:
+    def __init__(self, path, header=None, journal=None, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.journal_path = journal or path + ".journal"
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self.journal = None
+        self.dirty = False
+        self.wake = threading.Event()
+        self.stopping = False
+        self.thread = None
+
+        if os.path.exists(path):
+            self.wb = load_workbook(path)
+            self.ws = self.wb.active
+        else:
+            self.wb = Workbook()
+            self.ws = self.wb.active
+            if header:
+                self.ws.append(header)
+            self.dirty = True
+
+        replayed = self._replay()
+        if replayed:
+            print(f"♻️ Replayed {replayed} unsaved changes from {self.journal_path}")
+        if self.dirty:
+            self.flush()
+        self.journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _replay(self):
+        if not os.path.exists(self.journal_path):
+            return 0
+        count = 0
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row, column, value = json.loads(line)
+                except ValueError:
+                    break  # a write cut short by the crash; everything before it is intact
+                self.ws.cell(row=row, column=column).value = value
+                count += 1
+        self.dirty = self.dirty or count > 0
+        return count
+
+    def get(self, row, column):
+        with self.lock:
+            return self.ws.cell(row=row, column=column).value
+
+    def set(self, row, column, value):
+        with self.lock:
+            self.ws.cell(row=row, column=column).value = value
+            self.journal.write(json.dumps([row, column, value], ensure_ascii=False) + "\n")
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.dirty = True
+
+    # Saves to a temporary file first so a crash mid-save never leaves a broken .xlsx behind;
+    # the journal is only emptied once the new file is in place
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            tmp_file = self.path + ".tmp.xlsx"
+            self.wb.save(tmp_file)
+            os.replace(tmp_file, self.path)
+            if self.journal:
+                self.journal.truncate(0)
+                self.journal.seek(0)
+            elif os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self.dirty = False
+
+    # Asks the background thread to save now instead of waiting for the next interval
+    def flush_soon(self):
+        if self.thread:
+            self.wake.set()
+        else:
+            self.flush()
+
+    def _autoflush(self):
+        while not self.stopping:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except OSError as e:  # e.g. the file is open in Excel; the journal still has everything
+                print(f"⚠️ Could not save {self.path}: {e}")
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._autoflush, daemon=True)
+            self.thread.start()
+        return self
+
+    def close(self):
+        if self.thread:
+            self.stopping = True
+            self.wake.set()
+            self.thread.join()
+            self.thread = None
+        self.flush()
+        self.journal.close()
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) == 0:
+            os.remove(self.journal_path)